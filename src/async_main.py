@@ -0,0 +1,49 @@
+import asyncio
+import logging
+import sys
+
+from dotenv import load_dotenv
+
+from .config import Config
+from .main import summarize_results
+from .pipeline import TopicPipeline
+
+logger = logging.getLogger(__name__)
+
+
+async def amain() -> int:
+    """Asyncio entry point: runs every topic on a single event loop."""
+    load_dotenv()
+
+    try:
+        config = Config.from_env()
+        logger.info("Configuration loaded successfully")
+        logger.info(f"Found {len(config.topics)} topic(s) to process")
+
+        logger.info(f"News source: {config.news_source.value}")
+
+        pipeline = TopicPipeline.from_config(config)
+
+        try:
+            results = await pipeline.run_topics_async()
+        finally:
+            pipeline.close()
+        return summarize_results(results)
+
+    except KeyError as e:
+        logger.error(f"Missing required environment variable: {e}")
+        return 1
+    except ValueError as e:
+        logger.error(f"Configuration error: {e}")
+        return 1
+    except Exception as e:
+        logger.error(f"Unexpected error: {e}", exc_info=True)
+        return 1
+
+
+def main() -> int:
+    return asyncio.run(amain())
+
+
+if __name__ == "__main__":
+    sys.exit(main())
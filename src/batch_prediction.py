@@ -0,0 +1,305 @@
+import itertools
+import json
+import logging
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime
+from urllib.parse import quote
+
+from google import genai
+from google.genai import types
+
+from .deadline import Deadline
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POLL_SECONDS = 30.0
+DEFAULT_TIMEOUT_SECONDS = 60 * 60
+# 他のフラグ付きトピックの合流を待つ最大時間（秒）
+DEFAULT_LINGER_SECONDS = 60.0
+# 出力の各行に含まれるリクエストから、どのトピックの応答かを特定するためのラベル
+REQUEST_KEY_LABEL = "news_curator_key"
+
+GCS_API = "https://storage.googleapis.com/storage/v1"
+GCS_UPLOAD_API = "https://storage.googleapis.com/upload/storage/v1"
+GCS_TIMEOUT = 60
+
+TERMINAL_STATES = {
+    types.JobState.JOB_STATE_SUCCEEDED,
+    types.JobState.JOB_STATE_PARTIALLY_SUCCEEDED,
+    types.JobState.JOB_STATE_FAILED,
+    types.JobState.JOB_STATE_CANCELLED,
+    types.JobState.JOB_STATE_EXPIRED,
+}
+SUCCEEDED_STATES = {types.JobState.JOB_STATE_SUCCEEDED, types.JobState.JOB_STATE_PARTIALLY_SUCCEEDED}
+
+
+def request_line(key: str, prompt: str, config: types.GenerateContentConfig) -> dict:
+    """Render a generate_content call as a line of the batch prediction input JSONL."""
+    request: dict = {
+        "contents": [{"role": "user", "parts": [{"text": prompt}]}],
+        "labels": {REQUEST_KEY_LABEL: key},
+    }
+    if config.system_instruction is not None:
+        request["systemInstruction"] = {"parts": [{"text": str(config.system_instruction)}]}
+    if config.tools:
+        request["tools"] = [tool.model_dump(mode="json", by_alias=True, exclude_none=True) for tool in config.tools]
+    generation_config = config.model_dump(
+        mode="json",
+        by_alias=True,
+        exclude_none=True,
+        include={"temperature", "max_output_tokens", "response_mime_type", "response_schema"},
+    )
+    if generation_config:
+        request["generationConfig"] = generation_config
+    return {"request": request}
+
+
+def parse_result_line(line: dict) -> tuple[str | None, types.GenerateContentResponse | None]:
+    """Return (request key, response) of an output line. The response is None for failed requests."""
+    key = (line.get("request", {}).get("labels") or {}).get(REQUEST_KEY_LABEL)
+    if line.get("status") or "response" not in line:
+        logger.warning(f"Batch prediction request {key} failed: {line.get('status')}")
+        return key, None
+    try:
+        return key, types.GenerateContentResponse.model_validate(line["response"])
+    except Exception as e:
+        logger.warning(f"Ignoring invalid batch prediction response for {key}: {e}")
+        return key, None
+
+
+def _split_gcs_uri(uri: str) -> tuple[str, str]:
+    if not uri.startswith("gs://"):
+        raise ValueError(f"Invalid Cloud Storage URI: {uri!r}")
+    bucket, _, path = uri[len("gs://") :].partition("/")
+    return bucket, path
+
+
+class VertexBatchPredictionClient:
+    """Submits Vertex AI batch prediction jobs whose input and output are JSONL files on Cloud Storage.
+
+    Cloud Storage は google-genai が依存する google-auth の AuthorizedSession で JSON API を直接呼び出す。
+    """
+
+    def __init__(self, client: genai.Client, gcs_uri: str, session=None):
+        self.client = client
+        self.gcs_uri = gcs_uri.rstrip("/")
+        _split_gcs_uri(self.gcs_uri)
+        self._session = session
+
+    @property
+    def session(self):
+        if self._session is None:
+            import google.auth
+            from google.auth.transport.requests import AuthorizedSession
+
+            credentials, _ = google.auth.default(scopes=["https://www.googleapis.com/auth/cloud-platform"])
+            self._session = AuthorizedSession(credentials)
+        return self._session
+
+    def _upload(self, uri: str, data: str):
+        bucket, name = _split_gcs_uri(uri)
+        response = self.session.post(
+            f"{GCS_UPLOAD_API}/b/{bucket}/o",
+            params={"uploadType": "media", "name": name},
+            data=data.encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+            timeout=GCS_TIMEOUT,
+        )
+        response.raise_for_status()
+
+    def _list(self, uri: str) -> list[str]:
+        bucket, prefix = _split_gcs_uri(uri)
+        names, page_token = [], None
+        while True:
+            params = {"prefix": prefix, "fields": "items(name),nextPageToken"}
+            if page_token:
+                params["pageToken"] = page_token
+            response = self.session.get(f"{GCS_API}/b/{bucket}/o", params=params, timeout=GCS_TIMEOUT)
+            response.raise_for_status()
+            data = response.json()
+            names.extend(f"gs://{bucket}/{item['name']}" for item in data.get("items", []))
+            page_token = data.get("nextPageToken")
+            if not page_token:
+                return names
+
+    def _download(self, uri: str) -> str:
+        bucket, name = _split_gcs_uri(uri)
+        response = self.session.get(
+            f"{GCS_API}/b/{bucket}/o/{quote(name, safe='')}", params={"alt": "media"}, timeout=GCS_TIMEOUT
+        )
+        response.raise_for_status()
+        return response.content.decode("utf-8")
+
+    def submit(self, model: str, lines: list[dict]) -> str:
+        """Upload the input JSONL and create the job. Returns the job name."""
+        prefix = f"{self.gcs_uri}/{datetime.now():%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}"
+        self._upload(f"{prefix}/input.jsonl", "\n".join(json.dumps(line, ensure_ascii=False) for line in lines))
+        job = self.client.batches.create(
+            model=model,
+            src=f"{prefix}/input.jsonl",
+            config=types.CreateBatchJobConfig(dest=f"{prefix}/output", display_name="llm-news-curator"),
+        )
+        return job.name
+
+    def state(self, name: str) -> types.JobState:
+        return self.client.batches.get(name=name).state
+
+    def results(self, name: str) -> list[dict]:
+        """Output lines of a finished job (`predictions.jsonl` under the destination)."""
+        job = self.client.batches.get(name=name)
+        lines = []
+        for uri in self._list(job.dest.gcs_uri):
+            if uri.endswith("predictions.jsonl"):
+                lines.extend(json.loads(line) for line in self._download(uri).splitlines() if line.strip())
+        return lines
+
+    def cancel(self, name: str):
+        self.client.batches.cancel(name=name)
+
+
+@dataclass
+class _Pending:
+    key: str
+    model: str
+    line: dict
+    deadline: Deadline
+    done: bool = False
+    # None: オンラインで生成する（ジョブの失敗・タイムアウト、またはそのリクエストの失敗）
+    response: types.GenerateContentResponse | None = None
+
+
+def _earliest(deadlines: list[Deadline]) -> Deadline:
+    bounded = [d.expires_at for d in deadlines if d.bounded]
+    return Deadline(min(bounded) if bounded else None)
+
+
+class BatchPredictionQueue:
+    """Collects generate_content calls of flagged topics into a batch prediction job.
+
+    Topic threads call generate() and block until the job finishes. A job is
+    submitted once every flagged topic in flight is waiting (or after the
+    linger time), so each run normally submits one job per model. Each
+    flagged topic thread must be wrapped in participant().
+
+    Args:
+        client: VertexBatchPredictionClient or a stand-in with the same methods.
+        poll_interval: Seconds between job state checks.
+        timeout: Maximum seconds to wait for a job.
+        reserve: Seconds of the topics' time budget kept back for generating
+            online when the job does not finish in time.
+        linger: Maximum seconds to wait for other flagged topics.
+    """
+
+    def __init__(
+        self,
+        client,
+        poll_interval: float = DEFAULT_POLL_SECONDS,
+        timeout: float = DEFAULT_TIMEOUT_SECONDS,
+        reserve: float = 0.0,
+        linger: float = DEFAULT_LINGER_SECONDS,
+    ):
+        self.client = client
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self.reserve = reserve
+        self.linger = linger
+        self._cond = threading.Condition()
+        self._active = 0
+        self._pending: list[_Pending] = []
+        self._keys = itertools.count(1)
+
+    @contextmanager
+    def participant(self):
+        """Mark the current flagged topic as in flight."""
+        with self._cond:
+            self._active += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._active -= 1
+                self._cond.notify_all()
+
+    def generate(
+        self, model: str, prompt: str, config: types.GenerateContentConfig, deadline: Deadline
+    ) -> types.GenerateContentResponse | None:
+        """Run a generate_content call as part of a batch prediction job.
+
+        Returns:
+            The response, or None when the caller should generate online.
+        """
+        key = f"r{next(self._keys)}"
+        request = _Pending(key, model, request_line(key, prompt, config), deadline)
+        linger_until = time.monotonic() + self.linger
+        with self._cond:
+            self._pending.append(request)
+            self._cond.notify_all()
+            while not request.done:
+                overdue = time.monotonic() >= linger_until
+                batch = self._take(force=overdue and request in self._pending)
+                if batch:
+                    self._cond.release()
+                    try:
+                        self._run(batch)
+                    finally:
+                        self._cond.acquire()
+                    continue
+                self._cond.wait(None if overdue else linger_until - time.monotonic())
+        return request.response
+
+    def _take(self, force: bool) -> list[_Pending]:
+        """Remove and return the requests of the next job (same model as the oldest request)."""
+        if not self._pending or not (force or len(self._pending) >= self._active):
+            return []
+        model = self._pending[0].model
+        batch = [r for r in self._pending if r.model == model]
+        self._pending = [r for r in self._pending if r.model != model]
+        return batch
+
+    def _run(self, batch: list[_Pending]):
+        responses: dict[str, types.GenerateContentResponse] = {}
+        try:
+            responses = self._execute(batch)
+        except Exception as e:
+            logger.warning(f"Batch prediction failed, generating {len(batch)} request(s) online: {e}")
+        with self._cond:
+            for request in batch:
+                request.done = True
+                request.response = responses.get(request.key)
+            self._cond.notify_all()
+
+    def _execute(self, batch: list[_Pending]) -> dict[str, types.GenerateContentResponse]:
+        model = batch[0].model
+        job = self.client.submit(model, [r.line for r in batch])
+        logger.info(f"Submitted batch prediction job {job} ({model}, {len(batch)} request(s))")
+
+        # オンライン生成へのフォールバックに必要な時間を残して待つ
+        wait_deadline = _earliest([r.deadline for r in batch]).child(self.timeout, reserve=self.reserve)
+        while True:
+            state = self.client.state(job)
+            if state in TERMINAL_STATES:
+                break
+            remaining = wait_deadline.remaining()
+            if remaining is not None and remaining <= 0:
+                try:
+                    self.client.cancel(job)
+                except Exception as e:
+                    logger.warning(f"Failed to cancel batch prediction job {job}: {e}")
+                raise TimeoutError(f"Batch prediction job {job} did not finish in time (state: {state})")
+            logger.debug(f"Batch prediction job {job}: {state}")
+            time.sleep(self.poll_interval if remaining is None else min(self.poll_interval, remaining))
+
+        if state not in SUCCEEDED_STATES:
+            raise RuntimeError(f"Batch prediction job {job} ended with {state}")
+
+        responses = {}
+        for line in self.client.results(job):
+            key, response = parse_result_line(line)
+            if key is not None and response is not None:
+                responses[key] = response
+        logger.info(f"Batch prediction job {job} finished: {len(responses)}/{len(batch)} response(s)")
+        return responses
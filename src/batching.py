@@ -0,0 +1,242 @@
+import asyncio
+import logging
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import dataclass
+
+from . import metrics
+from .config import TopicPriority
+from .deadline import Deadline
+from .model_router import highest_priority
+from .news_curator import NewsCurator, NewsItem
+from .x_news_client import XNewsStory
+
+logger = logging.getLogger(__name__)
+
+# 他のトピックの合流を待つ最大時間（秒）。これを過ぎたら揃った分だけで送信する
+DEFAULT_LINGER_SECONDS = 5.0
+
+
+@dataclass
+class _Request:
+    topic: str
+    stories: list[XNewsStory]
+    deadline: Deadline
+    tokens: int
+    priority: TopicPriority = TopicPriority.NORMAL
+    done: bool = False
+    # None: 単独で生成する（バッチに1件しか集まらなかった、まとめたリクエストが失敗した、応答にセクションがなかった）
+    items: list[NewsItem] | None = None
+
+
+def _linger(linger: float, deadline: Deadline) -> float:
+    remaining = deadline.remaining()
+    return linger if remaining is None else min(linger, remaining)
+
+
+def _earliest(deadlines: list[Deadline]) -> Deadline:
+    bounded = [d.expires_at for d in deadlines if d.bounded]
+    return Deadline(min(bounded) if bounded else None)
+
+
+class _BatchPlanner:
+    """Batch selection shared by the thread and asyncio batchers (not thread-safe by itself)."""
+
+    def __init__(self, max_size: int, max_tokens: int):
+        self.max_size = max_size
+        self.max_tokens = max_tokens
+        self.active = 0
+        self.pending: list[_Request] = []
+
+    def take(self, force: bool = False) -> list[_Request]:
+        """Remove and return the next batch when it is ready.
+
+        バッチは、件数かトークン数の上限に達したとき、処理中の全トピックが生成待ちになったとき、
+        または force（待ち時間切れ）のときに送る。
+        """
+        if not self.pending:
+            return []
+        ready = (
+            force
+            or len(self.pending) >= self.max_size
+            or len(self.pending) >= self.active
+            or sum(r.tokens for r in self.pending) >= self.max_tokens
+        )
+        if not ready:
+            return []
+
+        batch, tokens = [], 0
+        for request in self.pending:
+            if batch and (len(batch) >= self.max_size or tokens + request.tokens > self.max_tokens):
+                break
+            batch.append(request)
+            tokens += request.tokens
+        del self.pending[: len(batch)]
+        return batch
+
+    @staticmethod
+    def complete(batch: list[_Request], results: list[list[NewsItem] | None] | None):
+        for i, request in enumerate(batch):
+            request.done = True
+            request.items = results[i] if results is not None else None
+
+
+class GenerationBatcher:
+    """Groups fetch_news_from_articles calls of concurrently processed topics.
+
+    Topic threads call format(); topics that reach the generation stage at
+    about the same time share one Vertex AI request (and one copy of the
+    persona prompt). Each topic thread must be wrapped in participant() so the
+    batcher knows how many topics may still join.
+    """
+
+    def __init__(
+        self,
+        curator: NewsCurator,
+        max_size: int,
+        max_tokens: int,
+        linger: float = DEFAULT_LINGER_SECONDS,
+    ):
+        self.curator = curator
+        self.linger = linger
+        self._planner = _BatchPlanner(max_size, max_tokens)
+        self._cond = threading.Condition()
+
+    @contextmanager
+    def participant(self):
+        """Mark the current topic as in flight."""
+        with self._cond:
+            self._planner.active += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._planner.active -= 1
+                # 待っているトピックが揃った可能性があるので再確認させる
+                self._cond.notify_all()
+
+    def format(
+        self,
+        topic: str,
+        stories: list[XNewsStory],
+        deadline: Deadline,
+        priority: TopicPriority = TopicPriority.NORMAL,
+    ) -> list[NewsItem] | None:
+        """Format stories as part of a batch.
+
+        The shared request is routed with the highest priority among its topics.
+
+        Returns:
+            The topic's NewsItems, or None when the caller should format the
+            topic on its own (no other topic joined, the shared request failed,
+            or its section was missing).
+        """
+        request = _Request(topic, stories, deadline, self.curator.estimate_articles_tokens(topic, stories), priority)
+        linger_until = time.monotonic() + _linger(self.linger, deadline)
+        with self._cond:
+            self._planner.pending.append(request)
+            self._cond.notify_all()
+            while not request.done:
+                overdue = time.monotonic() >= linger_until
+                batch = self._planner.take(force=overdue and request in self._planner.pending)
+                if batch:
+                    self._cond.release()
+                    try:
+                        self._run(batch)
+                    finally:
+                        self._cond.acquire()
+                    continue
+                self._cond.wait(None if overdue else linger_until - time.monotonic())
+
+        if request.items is not None:
+            metrics.record(metrics.BATCHED_TOPICS)
+        return request.items
+
+    def _run(self, batch: list[_Request]):
+        results = None
+        if len(batch) > 1:
+            try:
+                results = self.curator.fetch_news_from_articles_batch(
+                    [(r.topic, r.stories) for r in batch],
+                    deadline=_earliest([r.deadline for r in batch]),
+                    priority=highest_priority([r.priority for r in batch]),
+                )
+            except Exception as e:
+                logger.warning(f"Batched generation failed, formatting {len(batch)} topics separately: {e}")
+        with self._cond:
+            _BatchPlanner.complete(batch, results)
+            self._cond.notify_all()
+
+
+class AsyncGenerationBatcher:
+    """Asyncio variant of GenerationBatcher."""
+
+    def __init__(
+        self,
+        curator: NewsCurator,
+        max_size: int,
+        max_tokens: int,
+        linger: float = DEFAULT_LINGER_SECONDS,
+    ):
+        self.curator = curator
+        self.linger = linger
+        self._planner = _BatchPlanner(max_size, max_tokens)
+        self._changed = asyncio.Event()
+
+    def _notify(self):
+        # 待機中のタスクを全て起こし、新しいイベントで次の変化を待たせる
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    @asynccontextmanager
+    async def participant(self):
+        """Mark the current topic as in flight."""
+        self._planner.active += 1
+        try:
+            yield
+        finally:
+            self._planner.active -= 1
+            self._notify()
+
+    async def format(
+        self,
+        topic: str,
+        stories: list[XNewsStory],
+        deadline: Deadline,
+        priority: TopicPriority = TopicPriority.NORMAL,
+    ) -> list[NewsItem] | None:
+        """Async variant of GenerationBatcher.format."""
+        request = _Request(topic, stories, deadline, self.curator.estimate_articles_tokens(topic, stories), priority)
+        linger_until = time.monotonic() + _linger(self.linger, deadline)
+        self._planner.pending.append(request)
+        self._notify()
+        while not request.done:
+            overdue = time.monotonic() >= linger_until
+            batch = self._planner.take(force=overdue and request in self._planner.pending)
+            if batch:
+                await self._run(batch)
+                continue
+            changed = self._changed
+            try:
+                await asyncio.wait_for(changed.wait(), None if overdue else linger_until - time.monotonic())
+            except asyncio.TimeoutError:
+                pass
+
+        if request.items is not None:
+            metrics.record(metrics.BATCHED_TOPICS)
+        return request.items
+
+    async def _run(self, batch: list[_Request]):
+        results = None
+        if len(batch) > 1:
+            try:
+                results = await self.curator.fetch_news_from_articles_batch_async(
+                    [(r.topic, r.stories) for r in batch],
+                    deadline=_earliest([r.deadline for r in batch]),
+                    priority=highest_priority([r.priority for r in batch]),
+                )
+            except Exception as e:
+                logger.warning(f"Batched generation failed, formatting {len(batch)} topics separately: {e}")
+        _BatchPlanner.complete(batch, results)
+        self._notify()
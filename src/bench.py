@@ -0,0 +1,654 @@
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import random
+import re
+import sys
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import httpx
+from google.genai import errors, types
+from slack_sdk import WebClient
+from slack_sdk.web.async_client import AsyncWebClient
+
+from .config import Config, NewsSource, TopicConfig
+from .news_curator import FILTER_INSTRUCTION, NewsCurator
+from .pipeline import TopicPipeline
+from .resilience import ResilientCaller, RetryPolicy
+from .x_news_client import XNewsClient
+
+logger = logging.getLogger(__name__)
+
+# プロンプト中のストーリー番号行（"[1] ..."）
+_STORY_LINE_PATTERN = re.compile(r"^\[(\d+)\]", re.MULTILINE)
+# X 検索クエリから取り除く演算子
+_QUERY_OPERATORS = {"or", "and", "is", "retweet"}
+# まとめて生成する場合のトピック見出し（"# トピック1: ..."）
+_BATCH_TOPIC_PATTERN = re.compile(r"^# トピック\d+: ", re.MULTILINE)
+# ストリーミング応答の1チャンクあたりの文字数
+_STREAM_CHUNK_CHARS = 64
+
+
+@dataclass
+class FakeService:
+    """Latency and failure behaviour of one stand-in service."""
+
+    latency: float = 0.0  # 平均レイテンシ（秒）
+    jitter: float = 0.5  # レイテンシの揺らぎ（平均に対する割合）
+    error_rate: float = 0.0  # 失敗させる割合（0〜1）
+
+
+@dataclass
+class BenchProfile:
+    """Shape of the fake workload."""
+
+    vertex: FakeService = field(default_factory=lambda: FakeService(latency=2.0))
+    slack: FakeService = field(default_factory=lambda: FakeService(latency=0.2))
+    x_api: FakeService = field(default_factory=lambda: FakeService(latency=0.5))
+    pages: FakeService = field(default_factory=lambda: FakeService(latency=0.3))
+    tweets_per_search: int = 50
+    urls_per_tweet: int = 1
+    page_bytes: int = 50_000
+    news_items: int = 4
+    item_chars: int = 400
+    history_messages: int = 20
+    seed: int = 0
+
+
+class _Dice:
+    """Thread-safe seeded randomness shared by the fakes."""
+
+    def __init__(self, seed: int):
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def delay(self, service: FakeService) -> float:
+        with self._lock:
+            spread = service.latency * service.jitter
+            return max(0.0, self._random.uniform(service.latency - spread, service.latency + spread))
+
+    def fails(self, service: FakeService) -> bool:
+        with self._lock:
+            return self._random.random() < service.error_rate
+
+
+def _filler(chars: int) -> str:
+    sentence = "これはベンチマーク用のダミー文章なのだ。"
+    return (sentence * (chars // len(sentence) + 1))[:chars]
+
+
+class FakeGenAIClient:
+    """Stand-in for genai.Client exposing models.generate_content, aio.models.generate_content and caches."""
+
+    def __init__(self, profile: BenchProfile, dice: _Dice):
+        self.profile = profile
+        self.dice = dice
+        self.models = SimpleNamespace(
+            generate_content=self._generate_content, generate_content_stream=self._generate_content_stream
+        )
+        self.aio = SimpleNamespace(
+            models=SimpleNamespace(
+                generate_content=self._generate_content_async,
+                generate_content_stream=self._generate_content_stream_async,
+            )
+        )
+        self.caches = SimpleNamespace(create=self._create_cache, update=self._update_cache, delete=self._delete_cache)
+        self._cached: dict[str, types.CreateCachedContentConfig] = {}
+
+    def _create_cache(self, *, model: str, config: types.CreateCachedContentConfig) -> types.CachedContent:
+        name = f"cachedContents/bench-{len(self._cached) + 1}"
+        self._cached[name] = config
+        return types.CachedContent(name=name, model=model)
+
+    def _update_cache(self, *, name: str, config=None) -> types.CachedContent:
+        if name not in self._cached:
+            raise errors.ClientError(404, {"error": {"code": 404, "message": "not found", "status": "NOT_FOUND"}})
+        return types.CachedContent(name=name)
+
+    def _delete_cache(self, *, name: str):
+        self._cached.pop(name, None)
+
+    def _generate_content(self, *, model: str, contents: str, config=None) -> types.GenerateContentResponse:
+        time.sleep(self.dice.delay(self.profile.vertex))
+        return self._respond(model, contents, config)
+
+    async def _generate_content_async(
+        self, *, model: str, contents: str, config=None
+    ) -> types.GenerateContentResponse:
+        await asyncio.sleep(self.dice.delay(self.profile.vertex))
+        return self._respond(model, contents, config)
+
+    def _generate_content_stream(self, *, model: str, contents: str, config=None):
+        delay = self.dice.delay(self.profile.vertex)
+        response = self._respond(model, contents, config)
+        chunks = self._chunks(response)
+        for chunk in chunks:
+            time.sleep(delay / len(chunks))
+            yield chunk
+
+    async def _generate_content_stream_async(self, *, model: str, contents: str, config=None):
+        delay = self.dice.delay(self.profile.vertex)
+        response = self._respond(model, contents, config)
+        chunks = self._chunks(response)
+
+        async def stream():
+            for chunk in chunks:
+                await asyncio.sleep(delay / len(chunks))
+                yield chunk
+
+        return stream()
+
+    @staticmethod
+    def _chunks(response: types.GenerateContentResponse) -> list[types.GenerateContentResponse]:
+        """Split a response into stream chunks; grounding and usage come with the last one."""
+        text = response.text
+        size = _STREAM_CHUNK_CHARS
+        pieces = [text[i : i + size] for i in range(0, len(text), size)] or [""]
+        chunks = []
+        for i, piece in enumerate(pieces):
+            last = i == len(pieces) - 1
+            chunks.append(
+                types.GenerateContentResponse(
+                    candidates=[
+                        types.Candidate(
+                            content=types.Content(role="model", parts=[types.Part(text=piece)]),
+                            grounding_metadata=response.candidates[0].grounding_metadata if last else None,
+                        )
+                    ],
+                    usage_metadata=response.usage_metadata if last else None,
+                )
+            )
+        return chunks
+
+    def _respond(self, model: str, contents: str, config) -> types.GenerateContentResponse:
+        if self.dice.fails(self.profile.vertex):
+            raise errors.ServerError(503, {"error": {"code": 503, "message": "fake overload", "status": "UNAVAILABLE"}})
+
+        story_count = len(_STORY_LINE_PATTERN.findall(contents))
+        cached = self._cached.get(config.cached_content) if config is not None and config.cached_content else None
+        cached_tokens = len(str(cached.system_instruction)) // 2 if cached else None
+        grounding = None
+        if config is not None and (config.tools or (cached and cached.tools)):
+            text, grounding = self._grounded_text()
+        elif config is not None and config.system_instruction == FILTER_INSTRUCTION:
+            text = ",".join(str(i) for i in range(1, min(story_count, 10) + 1))
+        elif config is not None and config.response_mime_type == "application/json":
+            text = self._json_text(contents)
+        elif _BATCH_TOPIC_PATTERN.search(contents):
+            sections = _BATCH_TOPIC_PATTERN.split(contents)[1:]
+            text = "\n".join(
+                f"=== トピック{n} ===\n{self._articles_text(len(_STORY_LINE_PATTERN.findall(section)))}"
+                for n, section in enumerate(sections, 1)
+            )
+        else:
+            text = self._articles_text(story_count)
+
+        return types.GenerateContentResponse(
+            candidates=[
+                types.Candidate(
+                    content=types.Content(role="model", parts=[types.Part(text=text)]),
+                    grounding_metadata=grounding,
+                )
+            ],
+            usage_metadata=types.GenerateContentResponseUsageMetadata(
+                prompt_token_count=len(contents) // 2 + (cached_tokens or 0),
+                cached_content_token_count=cached_tokens,
+                candidates_token_count=len(text) // 2,
+                total_token_count=(len(contents) + len(text)) // 2,
+            ),
+        )
+
+    def _item_text(self, i: int) -> str:
+        return f"*ダミーニュース {i + 1}*\n\nずんだもん: {_filler(self.profile.item_chars)}"
+
+    def _articles_text(self, story_count: int) -> str:
+        parts = []
+        for i in range(self.profile.news_items):
+            ref = i % story_count + 1 if story_count else 1
+            parts.append(f"{self._item_text(i)} [ref:{ref}]")
+        parts.append(f"きりたん: {_filler(80)}")
+        return f"\n{NewsCurator.SEPARATOR}\n".join(parts)
+
+    def _articles_json(self, story_count: int) -> dict:
+        items = []
+        for i in range(self.profile.news_items):
+            lines = [{"speaker": "ずんだもん", "text": _filler(self.profile.item_chars)}]
+            items.append({"title": f"ダミーニュース {i + 1}", "lines": lines, "refs": [i % story_count + 1 if story_count else 1]})
+        return {"items": items, "summary": [{"speaker": "きりたん", "text": _filler(80)}]}
+
+    def _json_text(self, contents: str) -> str:
+        if _BATCH_TOPIC_PATTERN.search(contents):
+            sections = _BATCH_TOPIC_PATTERN.split(contents)[1:]
+            data = {
+                "topics": [
+                    {"topic": n, **self._articles_json(len(_STORY_LINE_PATTERN.findall(section)))}
+                    for n, section in enumerate(sections, 1)
+                ]
+            }
+        else:
+            data = self._articles_json(len(_STORY_LINE_PATTERN.findall(contents)))
+        return json.dumps(data, ensure_ascii=False)
+
+    def _grounded_text(self) -> tuple[str, types.GroundingMetadata]:
+        parts = [self._item_text(i) for i in range(self.profile.news_items)]
+        parts.append(f"きりたん: {_filler(80)}")
+        text = f"\n{NewsCurator.SEPARATOR}\n".join(parts)
+
+        chunks, supports = [], []
+        for i, part in enumerate(parts[:-1]):
+            chunks.append(
+                types.GroundingChunk(
+                    web=types.GroundingChunkWeb(uri=f"https://news.example.com/grounded/{i}", title=f"news {i}")
+                )
+            )
+            # API と同じく UTF-8 のバイト位置で返す
+            start = len(text[: text.index(part)].encode("utf-8"))
+            segment = part[:40]
+            supports.append(
+                types.GroundingSupport(
+                    segment=types.Segment(
+                        start_index=start, end_index=start + len(segment.encode("utf-8")), text=segment
+                    ),
+                    grounding_chunk_indices=[i],
+                    confidence_scores=[0.9],
+                )
+            )
+        return text, types.GroundingMetadata(grounding_chunks=chunks, grounding_supports=supports)
+
+
+class FakeBatchPredictionClient:
+    """Stand-in for VertexBatchPredictionClient answering with FakeGenAIClient after one Vertex AI latency."""
+
+    def __init__(self, genai_client: FakeGenAIClient):
+        self.genai_client = genai_client
+        self._jobs: dict[str, tuple[float, list[dict]]] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, model: str, lines: list[dict]) -> str:
+        client = self.genai_client
+        results = []
+        for line in lines:
+            request = line["request"]
+            tools = [types.Tool.model_validate(tool) for tool in request.get("tools", [])]
+            config = types.GenerateContentConfig(
+                tools=tools or None, response_mime_type=request.get("generationConfig", {}).get("responseMimeType")
+            )
+            try:
+                response = client._respond(model, request["contents"][0]["parts"][0]["text"], config)
+                results.append(
+                    {"request": request, "response": response.model_dump(mode="json", by_alias=True, exclude_none=True)}
+                )
+            except errors.APIError as e:
+                results.append({"request": request, "status": str(e)})
+        with self._lock:
+            name = f"batchPredictionJobs/bench-{len(self._jobs) + 1}"
+            self._jobs[name] = (time.monotonic() + client.dice.delay(client.profile.vertex), results)
+        return name
+
+    def state(self, name: str) -> types.JobState:
+        if time.monotonic() < self._jobs[name][0]:
+            return types.JobState.JOB_STATE_RUNNING
+        return types.JobState.JOB_STATE_SUCCEEDED
+
+    def results(self, name: str) -> list[dict]:
+        return self._jobs[name][1]
+
+    def cancel(self, name: str):
+        self._jobs[name] = (float("inf"), [])
+
+
+def _slack_payload(profile: BenchProfile, dice: _Dice, url: str) -> dict:
+    if dice.fails(profile.slack):
+        return {"ok": False, "error": "fake_error"}
+    if url.endswith("conversations.history"):
+        messages = [
+            {
+                "blocks": [
+                    {
+                        "type": "context",
+                        # 過去に投稿済みのポスト（最初の検索結果の一部と重なる）
+                        "elements": [
+                            {
+                                "type": "mrkdwn",
+                                "text": f"🔗 <https://news.example.com/old/{i}|old {i}> <https://x.com/i/web/status/{i * 5 + 1}|X>",
+                            }
+                        ],
+                    }
+                ]
+            }
+            for i in range(profile.history_messages)
+        ]
+        return {"ok": True, "messages": messages}
+    return {"ok": True, "ts": f"{time.time():.6f}"}
+
+
+class FakeSlackClient(WebClient):
+    """WebClient whose HTTP layer is replaced by a local stand-in."""
+
+    def __init__(self, profile: BenchProfile, dice: _Dice):
+        super().__init__(token="xoxb-bench")
+        self.profile = profile
+        self.dice = dice
+
+    def _perform_urllib_http_request(self, *, url: str, args: dict) -> dict:
+        time.sleep(self.dice.delay(self.profile.slack))
+        return {"status": 200, "headers": {}, "body": json.dumps(_slack_payload(self.profile, self.dice, url))}
+
+
+class FakeAsyncSlackClient(AsyncWebClient):
+    """AsyncWebClient whose HTTP layer is replaced by a local stand-in."""
+
+    def __init__(self, profile: BenchProfile, dice: _Dice):
+        super().__init__(token="xoxb-bench")
+        self.profile = profile
+        self.dice = dice
+
+    async def _request(self, *, http_verb, api_url, req_args) -> dict:
+        await asyncio.sleep(self.dice.delay(self.profile.slack))
+        return {"data": _slack_payload(self.profile, self.dice, api_url), "headers": {}, "status_code": 200}
+
+
+class FakeXBackend:
+    """Serves X search results and linked news pages for httpx.MockTransport."""
+
+    def __init__(self, profile: BenchProfile, dice: _Dice):
+        self.profile = profile
+        self.dice = dice
+        self._ids = itertools.count(1)
+        self._ids_lock = threading.Lock()
+        body = f"<p>{_filler(200)}</p>"
+        head = "<html><head><title>bench</title><script>var x = 1;</script></head><body>"
+        repeat = max(1, (profile.page_bytes - len(head)) // len(body.encode("utf-8")))
+        self._page = (head + body * repeat + "</body></html>").encode("utf-8")
+
+    def _service(self, request: httpx.Request) -> FakeService:
+        return self.profile.x_api if request.url.host == "api.x.com" else self.profile.pages
+
+    def handle(self, request: httpx.Request) -> httpx.Response:
+        time.sleep(self.dice.delay(self._service(request)))
+        return self._respond(request)
+
+    async def handle_async(self, request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(self.dice.delay(self._service(request)))
+        return self._respond(request)
+
+    def _respond(self, request: httpx.Request) -> httpx.Response:
+        if self.dice.fails(self._service(request)):
+            return httpx.Response(503, json={"title": "Service Unavailable"}, request=request)
+        if request.url.host == "api.x.com":
+            return httpx.Response(200, json=self._search_payload(request.url.params.get("query", "")), request=request)
+        return httpx.Response(
+            200, headers={"content-type": "text/html; charset=utf-8"}, content=self._page, request=request
+        )
+
+    def _search_payload(self, query: str) -> dict:
+        # 共有検索でもトピックごとに振り分けられるよう、クエリ中の語を順番にツイートへ含める
+        words = [w for w in re.findall(r"\w+", query) if w.lower() not in _QUERY_OPERATORS] or ["news"]
+        with self._ids_lock:
+            ids = [next(self._ids) for _ in range(self.profile.tweets_per_search)]
+        tweets = []
+        now = datetime.now(timezone.utc)
+        for n, tweet_id in enumerate(ids):
+            word = words[n % len(words)]
+            urls = [
+                {"expanded_url": f"https://news.example.com/{word}/{tweet_id}/{k}", "title": f"{word} news {tweet_id}"}
+                for k in range(self.profile.urls_per_tweet)
+            ]
+            tweets.append(
+                {
+                    "id": str(tweet_id),
+                    "text": f"{word} {_filler(100)}",
+                    "author_id": str(tweet_id),
+                    # 事前ランキングに差が出るよう、反応数と投稿時刻をツイートごとにばらつかせる
+                    "public_metrics": {"like_count": 10 + tweet_id * 37 % 500, "retweet_count": tweet_id * 13 % 50},
+                    "created_at": (now - timedelta(minutes=tweet_id * 53 % 1440)).isoformat(),
+                    "entities": {"urls": urls},
+                }
+            )
+        users = [{"id": t["author_id"], "username": f"user{t['author_id']}"} for t in tweets]
+        return {"data": tweets, "includes": {"users": users}}
+
+
+def build_pipeline(config: Config, profile: BenchProfile) -> TopicPipeline:
+    """Build a TopicPipeline whose Vertex AI, Slack and X backends are local fakes."""
+    dice = _Dice(profile.seed)
+    backend = FakeXBackend(profile, dice)
+    genai_client = FakeGenAIClient(profile, dice)
+    # フォールバックリージョンも同じレイテンシ・エラー率のスタブにする
+    caller = ResilientCaller(
+        [(config.gcp_location, genai_client)]
+        + [(location, FakeGenAIClient(profile, dice)) for location in config.gcp_fallback_locations],
+        policy=RetryPolicy(max_attempts=config.vertex_max_attempts, base_delay=0.1),
+        hedge_percentile=config.vertex_hedge_percentile,
+    )
+    return TopicPipeline(
+        config,
+        curator=NewsCurator(config, client=genai_client, caller=caller),
+        x_client=XNewsClient(
+            config.x_bearer_token,
+            extract_processes=config.page_extract_processes,
+            transport=httpx.MockTransport(backend.handle),
+            async_transport=httpx.MockTransport(backend.handle_async),
+        ),
+        slack_client=FakeSlackClient(profile, dice),
+        slack_async_client=FakeAsyncSlackClient(profile, dice),
+        batch_client=FakeBatchPredictionClient(genai_client) if config.batch_prediction_gcs_uri else None,
+    )
+
+
+def _percentile(values: list[float], p: float) -> float:
+    """Nearest-rank percentile."""
+    ordered = sorted(values)
+    rank = max(1, round(p / 100 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def _summary(values: list[float]) -> dict:
+    if not values:
+        return {}
+    return {
+        "count": len(values),
+        "p50": _percentile(values, 50),
+        "p90": _percentile(values, 90),
+        "p99": _percentile(values, 99),
+        "max": max(values),
+    }
+
+
+def run_benchmark(
+    pipeline: TopicPipeline, runs: int, mode: str = "threads", warmup: int = 1
+) -> dict:
+    """Run the pipeline repeatedly and aggregate throughput and latency percentiles.
+
+    Args:
+        pipeline: Pipeline built by build_pipeline.
+        runs: Number of measured runs (each processes every configured topic).
+        mode: "threads" (run_topics) or "asyncio" (run_topics_async).
+        warmup: Unmeasured runs first (process pool start-up, imports).
+
+    Returns:
+        Aggregated results as a JSON-serializable dict.
+    """
+    run_walls: list[float] = []
+    topic_latencies: list[float] = []
+    stage_latencies: dict[str, list[float]] = {}
+    succeeded = failed = 0
+
+    for i in range(warmup + runs):
+        start = time.perf_counter()
+        if mode == "asyncio":
+            results = asyncio.run(pipeline.run_topics_async())
+        else:
+            results = pipeline.run_topics()
+        wall = time.perf_counter() - start
+        if i < warmup:
+            continue
+
+        run_walls.append(wall)
+        succeeded += sum(1 for r in results if r.success)
+        failed += sum(1 for r in results if not r.success)
+        report = pipeline.last_report
+        for topic_metrics in [report.shared, *report.topics.values()]:
+            if topic_metrics is not report.shared and topic_metrics.wall_seconds is not None:
+                topic_latencies.append(topic_metrics.wall_seconds)
+            for stage, seconds in topic_metrics.stages.items():
+                stage_latencies.setdefault(stage, []).append(seconds)
+
+    total_wall = sum(run_walls)
+    return {
+        "mode": mode,
+        "runs": runs,
+        "topics_per_run": len(pipeline.config.topics),
+        "succeeded": succeeded,
+        "failed": failed,
+        "throughput_topics_per_second": (succeeded + failed) / total_wall if total_wall else None,
+        "run_seconds": _summary(run_walls),
+        "topic_seconds": _summary(topic_latencies),
+        "stage_seconds": {stage: _summary(values) for stage, values in stage_latencies.items()},
+    }
+
+
+def _format_results(results: dict) -> str:
+    lines = [
+        f"mode={results['mode']} runs={results['runs']} topics/run={results['topics_per_run']} "
+        f"succeeded={results['succeeded']} failed={results['failed']}",
+        f"throughput: {results['throughput_topics_per_second']:.2f} topics/s",
+        f"{'':<22}{'p50':>9}{'p90':>9}{'p99':>9}{'max':>9}",
+    ]
+    rows = [("run", results["run_seconds"]), ("topic", results["topic_seconds"])]
+    rows += [(f"stage.{stage}", summary) for stage, summary in results["stage_seconds"].items()]
+    for label, summary in rows:
+        if summary:
+            lines.append(
+                f"{label:<22}{summary['p50']:>9.3f}{summary['p90']:>9.3f}{summary['p99']:>9.3f}{summary['max']:>9.3f}"
+            )
+    return "\n".join(lines)
+
+
+def _service_args(parser: argparse.ArgumentParser, name: str, default: FakeService):
+    parser.add_argument(f"--{name}-latency", type=float, default=default.latency, help="Mean latency in seconds")
+    parser.add_argument(f"--{name}-error-rate", type=float, default=default.error_rate, help="Failure ratio (0-1)")
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Entry point: `python -m src.bench` runs the pipeline against local fakes (no network)."""
+    defaults = BenchProfile()
+    parser = argparse.ArgumentParser(prog="python -m src.bench", description="Offline pipeline benchmark")
+    parser.add_argument("--topics", type=int, default=4, help="Number of topics per run")
+    parser.add_argument("--runs", type=int, default=3, help="Number of measured runs")
+    parser.add_argument("--warmup", type=int, default=1, help="Number of unmeasured warm-up runs")
+    parser.add_argument("--mode", choices=["threads", "asyncio"], default="threads")
+    parser.add_argument("--source", choices=[s.value for s in NewsSource], default=NewsSource.X_NEWS.value)
+    parser.add_argument("--concurrency", type=int, default=4, help="TOPIC_CONCURRENCY")
+    parser.add_argument("--no-shared-search", action="store_true", help="Search X per topic")
+    parser.add_argument("--extract-processes", type=int, default=0, help="PAGE_EXTRACT_PROCESSES")
+    parser.add_argument("--run-time-budget", type=float, default=None, help="RUN_TIME_BUDGET_SECONDS")
+    parser.add_argument("--no-context-cache", action="store_true", help="VERTEX_CONTEXT_CACHE=false")
+    parser.add_argument("--stream", action="store_true", help="STREAM_DELIVERY=true")
+    parser.add_argument("--structured-output", action="store_true", help="STRUCTURED_OUTPUT=true")
+    parser.add_argument("--articles-max-tokens", type=int, default=12000, help="ARTICLES_MAX_TOKENS")
+    parser.add_argument("--max-attempts", type=int, default=3, help="VERTEX_MAX_ATTEMPTS")
+    parser.add_argument("--fallback-regions", type=int, default=0, help="Number of GCP_FALLBACK_LOCATIONS")
+    parser.add_argument("--hedge-percentile", type=float, default=None, help="VERTEX_HEDGE_PERCENTILE (asyncio mode only)")
+    parser.add_argument("--model-routing", action="store_true", help="MODEL_ROUTING=true")
+    parser.add_argument("--filter-candidates", type=int, default=20, help="FILTER_CANDIDATES")
+    parser.add_argument("--batch-size", type=int, default=1, help="GENERATION_BATCH_SIZE")
+    parser.add_argument(
+        "--batch-prediction", type=int, default=0, help="Number of topics flagged batch_prediction"
+    )
+    for name in ("vertex", "slack", "x-api", "pages"):
+        _service_args(parser, name, getattr(defaults, name.replace("-", "_")))
+    parser.add_argument("--jitter", type=float, default=0.5, help="Latency jitter as a fraction of the mean")
+    parser.add_argument("--tweets", type=int, default=defaults.tweets_per_search, help="Tweets per X search")
+    parser.add_argument("--urls-per-tweet", type=int, default=defaults.urls_per_tweet)
+    parser.add_argument("--page-bytes", type=int, default=defaults.page_bytes, help="Size of each linked page")
+    parser.add_argument("--news-items", type=int, default=defaults.news_items, help="News items per response")
+    parser.add_argument("--item-chars", type=int, default=defaults.item_chars, help="Characters per news item")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--report-dir", default=None, help="Also write per-run reports (for `src.report diff`)")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    parser.add_argument("--log-level", default="WARNING")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(
+        level=getattr(logging, args.log_level.upper(), logging.WARNING),
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    )
+
+    def service(name: str) -> FakeService:
+        key = name.replace("-", "_")
+        return FakeService(
+            latency=getattr(args, f"{key}_latency"), jitter=args.jitter, error_rate=getattr(args, f"{key}_error_rate")
+        )
+
+    profile = BenchProfile(
+        vertex=service("vertex"),
+        slack=service("slack"),
+        x_api=service("x-api"),
+        pages=service("pages"),
+        tweets_per_search=args.tweets,
+        urls_per_tweet=args.urls_per_tweet,
+        page_bytes=args.page_bytes,
+        news_items=args.news_items,
+        item_chars=args.item_chars,
+        seed=args.seed,
+    )
+    topics = [
+        TopicConfig(
+            f"bench{i}",
+            f"CBENCH{i}",
+            f"bench{i} ニュース",
+            f"bench{i}",
+            batch_prediction=i >= args.topics - args.batch_prediction,
+        )
+        for i in range(args.topics)
+    ]
+    config = Config(
+        gcp_project_id="bench",
+        gcp_location="local",
+        model_name="gemini-2.5-pro",
+        slack_bot_token="xoxb-bench",
+        x_bearer_token="bench",
+        news_source=NewsSource(args.source),
+        topics=topics,
+        use_emoji_names=False,
+        topic_concurrency=args.concurrency,
+        run_time_budget=args.run_time_budget,
+        stream_delivery=args.stream,
+        structured_output=args.structured_output,
+        articles_max_tokens=args.articles_max_tokens,
+        vertex_max_attempts=args.max_attempts,
+        gcp_fallback_locations=[f"fallback{i}" for i in range(args.fallback_regions)],
+        vertex_hedge_percentile=args.hedge_percentile,
+        model_routing=args.model_routing,
+        generation_batch_size=args.batch_size,
+        batch_prediction_gcs_uri="gs://bench/batch" if args.batch_prediction else None,
+        batch_prediction_poll_seconds=0.05,
+        x_shared_search=not args.no_shared_search,
+        filter_candidates=args.filter_candidates,
+        page_extract_processes=args.extract_processes,
+        state_dir=None,
+        report_dir=args.report_dir,
+        llm_cache_dir=None,
+        context_cache_ttl=None if args.no_context_cache else 60 * 60,
+    )
+
+    pipeline = build_pipeline(config, profile)
+    try:
+        results = run_benchmark(pipeline, args.runs, args.mode, args.warmup)
+    finally:
+        pipeline.close()
+
+    results["profile"] = asdict(profile)
+    print(json.dumps(results, ensure_ascii=False, indent=2) if args.json else _format_results(results))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,132 @@
+import json
+import logging
+import os
+import re
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+
+from .metrics import new_run_id
+from .news_curator import NewsItem
+from .x_news_client import XNewsStory
+
+logger = logging.getLogger(__name__)
+
+# 保持する実行ディレクトリ数（古いものから削除）
+MAX_RUNS_KEPT = 20
+
+# 各トピックのステージ名（処理順）
+STAGE_RECENT_URLS = "recent_urls"
+STAGE_STORIES = "stories"
+STAGE_FILTERED = "filtered"
+STAGE_ITEMS = "items"
+STAGE_POSTED = "posted_ts"
+# ストリーミング配信中のメッセージの ts（再開時は新規投稿せずこのメッセージを更新する）
+STAGE_STREAM_TS = "stream_ts"
+
+
+def _topic_key(name: str) -> str:
+    """File-system safe key for a topic name."""
+    safe = re.sub(r"[^\w.-]+", "_", name, flags=re.UNICODE).strip("_")
+    return safe or "topic"
+
+
+class TopicCheckpoint:
+    """Stage results of one topic, persisted as a JSON file after every stage."""
+
+    def __init__(self, path: Path | None):
+        self.path = path
+        self._lock = threading.Lock()
+        self._data: dict = {}
+        if path is not None and path.exists():
+            try:
+                self._data = json.loads(path.read_text(encoding="utf-8"))
+            except (OSError, json.JSONDecodeError) as e:
+                logger.warning(f"Ignoring unreadable checkpoint {path}: {e}")
+
+    def has(self, stage: str) -> bool:
+        return stage in self._data
+
+    def get(self, stage: str):
+        return self._data.get(stage)
+
+    def save(self, stage: str, value):
+        """Record a stage result and write it to disk atomically."""
+        with self._lock:
+            self._data[stage] = value
+            if self.path is None:
+                return
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=self.path.parent, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    json.dump(self._data, f, ensure_ascii=False)
+                os.replace(tmp, self.path)
+            except BaseException:
+                if os.path.exists(tmp):
+                    os.unlink(tmp)
+                raise
+
+    # ---- typed accessors ----
+
+    def stories(self) -> list[XNewsStory] | None:
+        data = self.get(STAGE_STORIES)
+        return None if data is None else [XNewsStory.from_dict(d) for d in data]
+
+    def save_stories(self, stories: list[XNewsStory]):
+        self.save(STAGE_STORIES, [s.to_dict() for s in stories])
+
+    def filtered(self, stories: list[XNewsStory]) -> list[XNewsStory] | None:
+        tweet_ids = self.get(STAGE_FILTERED)
+        if tweet_ids is None:
+            return None
+        by_id = {s.tweet_id: s for s in stories}
+        return [by_id[t] for t in tweet_ids if t in by_id]
+
+    def save_filtered(self, stories: list[XNewsStory]):
+        self.save(STAGE_FILTERED, [s.tweet_id for s in stories])
+
+    def items(self) -> list[NewsItem] | None:
+        data = self.get(STAGE_ITEMS)
+        return None if data is None else [NewsItem.from_dict(d) for d in data]
+
+    def save_items(self, items: list[NewsItem]):
+        self.save(STAGE_ITEMS, [item.to_dict() for item in items])
+
+
+class CheckpointStore:
+    """Per-run directory of topic checkpoints under the state directory.
+
+    Layout: `<state_dir>/runs/<run_id>/<topic>.json`
+    """
+
+    def __init__(self, state_dir: str | Path, run_id: str | None = None):
+        self.runs_dir = Path(state_dir) / "runs"
+        self.run_id = run_id or new_run_id()
+        self.run_dir = self.runs_dir / self.run_id
+
+    @classmethod
+    def latest(cls, state_dir: str | Path) -> "CheckpointStore | None":
+        """Open the most recent run, or None if there is none."""
+        runs = cls.list_runs(state_dir)
+        return cls(state_dir, runs[-1]) if runs else None
+
+    @staticmethod
+    def list_runs(state_dir: str | Path) -> list[str]:
+        runs_dir = Path(state_dir) / "runs"
+        if not runs_dir.is_dir():
+            return []
+        return sorted(p.name for p in runs_dir.iterdir() if p.is_dir())
+
+    def topic(self, name: str) -> TopicCheckpoint:
+        return TopicCheckpoint(self.run_dir / f"{_topic_key(name)}.json")
+
+    def prune(self, keep: int = MAX_RUNS_KEPT):
+        """Delete the oldest run directories beyond `keep`."""
+        runs = self.list_runs(self.runs_dir.parent)
+        for run_id in runs[:-keep] if len(runs) > keep else []:
+            if run_id == self.run_id:
+                continue
+            shutil.rmtree(self.runs_dir / run_id, ignore_errors=True)
+            logger.debug(f"Pruned checkpoint run {run_id}")
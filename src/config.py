@@ -1,7 +1,9 @@
 import json
 import os
-from dataclasses import dataclass
+import re
+from dataclasses import dataclass, field
 from enum import Enum
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 
 
 def _parse_bool(value) -> bool:
@@ -13,11 +15,63 @@ def _parse_bool(value) -> bool:
     return str(value).lower() == "true"
 
 
+def _parse_positive_int(name: str, default: int | None, minimum: int = 1) -> int | None:
+    """Parse a positive (>= minimum) integer from an environment variable."""
+    raw = os.environ.get(name, "")
+    if not raw.strip():
+        return default
+    try:
+        value = int(raw)
+    except ValueError:
+        raise ValueError(f"Invalid {name}={raw!r}. Must be an integer")
+    if value < minimum:
+        raise ValueError(f"Invalid {name}={raw!r}. Must be >= {minimum}")
+    return value
+
+
+_SCHEDULE_TIME_PATTERN = re.compile(r"^([01]?\d|2[0-3]):([0-5]\d)$")
+
+
+def _parse_schedule(value, name: str) -> list[str]:
+    """Parse schedule times ("HH:MM") from a list or comma separated string."""
+    if value is None or value == "":
+        return []
+    raw = value if isinstance(value, list) else str(value).split(",")
+    times = []
+    for t in raw:
+        t = str(t).strip()
+        match = _SCHEDULE_TIME_PATTERN.match(t)
+        if not match:
+            raise ValueError(f"Invalid {name} time {t!r}. Expected HH:MM")
+        times.append(f"{int(match.group(1)):02d}:{match.group(2)}")
+    return sorted(set(times))
+
+
+def _parse_optional_seconds(name: str) -> float | None:
+    """Parse an optional positive number of seconds from an environment variable."""
+    raw = os.environ.get(name, "")
+    if not raw.strip():
+        return None
+    try:
+        value = float(raw)
+    except ValueError:
+        raise ValueError(f"Invalid {name}={raw!r}. Must be a number of seconds")
+    if value <= 0:
+        raise ValueError(f"Invalid {name}={raw!r}. Must be > 0")
+    return value
+
+
 class NewsSource(str, Enum):
     GOOGLE_SEARCH = "google_search"
     X_NEWS = "x_news"
 
 
+class TopicPriority(str, Enum):
+    HIGH = "high"
+    NORMAL = "normal"
+    LOW = "low"
+
+
 @dataclass
 class TopicConfig:
     """Configuration for a single topic."""
@@ -28,6 +82,12 @@ class TopicConfig:
     query: str
     unfurl_links: bool = False
     unfurl_media: bool = False
+    # 即時性が不要なトピック。BATCH_PREDICTION_GCS_URI が設定されていれば Vertex AI のバッチ予測で生成する
+    batch_prediction: bool = False
+    # 時間が足りないときに生成モデルを高速モデルへ切り替える判断に使う優先度
+    priority: TopicPriority = TopicPriority.NORMAL
+    # デーモンモードでの実行時刻（HH:MM）。空の場合は DAEMON_SCHEDULE を使う
+    schedule: list[str] = field(default_factory=list)
 
     @classmethod
     def from_dict(cls, data: dict) -> "TopicConfig":
@@ -44,6 +104,14 @@ class TopicConfig:
         query = data.get("query") or name
         unfurl_links = _parse_bool(data.get("unfurl_links", False))
         unfurl_media = _parse_bool(data.get("unfurl_media", False))
+        batch_prediction = _parse_bool(data.get("batch_prediction", False))
+        raw_priority = str(data.get("priority") or TopicPriority.NORMAL.value).strip().lower()
+        try:
+            priority = TopicPriority(raw_priority)
+        except ValueError:
+            valid = ", ".join(p.value for p in TopicPriority)
+            raise ValueError(f"Invalid priority {raw_priority!r} for topic {name!r}. Valid values: {valid}")
+        schedule = _parse_schedule(data.get("schedule"), f"topic {name!r} schedule")
         return cls(
             name=name,
             channel_id=channel_id,
@@ -51,6 +119,9 @@ class TopicConfig:
             query=query,
             unfurl_links=unfurl_links,
             unfurl_media=unfurl_media,
+            batch_prediction=batch_prediction,
+            priority=priority,
+            schedule=schedule,
         )
 
 
@@ -78,6 +149,68 @@ class Config:
     # Display settings
     use_emoji_names: bool
 
+    # Google Search grounding の参照元: ニュース項目ごとの最大数と、これ未満の信頼度しかない参照元を落とす閾値
+    max_sources_per_item: int = 3
+    source_min_confidence: float = 0.5
+    # filter_stories と、時間が足りないときの会話生成に使う高速モデル
+    fast_model_name: str = "gemini-2.5-flash"
+    # 残り時間・直近のレイテンシに応じて会話生成を高速モデルに切り替えるか、
+    # MODEL_NAME の p95 レイテンシがこれ（秒）を超えたら切り替える（priority が high のトピックを除く）
+    model_routing: bool = False
+    model_latency_slo: float = 60
+
+    # Execution settings
+    topic_concurrency: int = 4
+    # 実行全体・トピック単位の時間予算（秒）。None の場合は無制限
+    run_time_budget: float | None = None
+    topic_time_budget: float | None = None
+    # 生成中の応答をストリーミングで受け取り、完成したニュースから順に Slack へ反映する
+    stream_delivery: bool = False
+    # x_news の生成プロンプトに含めるポスト・リンク先本文の推定トークン数の上限
+    articles_max_tokens: int = 12000
+    # x_news の生成結果を区切り文字ではなく response_schema による JSON で受け取る
+    structured_output: bool = False
+    # x_news で、同時に生成段階に達したトピックを1回の Vertex AI 呼び出しにまとめる最大数（1: まとめない）と
+    # まとめたリクエストのポスト部分の推定トークン数の上限
+    generation_batch_size: int = 1
+    generation_batch_max_tokens: int = 32000
+    # バッチ予測の入出力を置く Cloud Storage の場所（gs://bucket/prefix）。空の場合はバッチ予測を使わない
+    batch_prediction_gcs_uri: str | None = None
+    batch_prediction_poll_seconds: float = 30
+    batch_prediction_timeout: float = 60 * 60
+
+    # X search settings
+    x_shared_search: bool = True
+    # filter_stories の前にローカルでスコア付けし、プロンプトに入れる上位ストーリー数（0: 事前ランキングしない）
+    filter_candidates: int = 20
+
+    # リンク先HTMLのテキスト抽出に使うプロセス数（0: 取得スレッド内で抽出）
+    page_extract_processes: int = 0
+
+    # Checkpoint settings（空の場合はチェックポイントを保存しない）
+    state_dir: str | None = ".state"
+    # 実行ごとの性能レポートの保存先（空の場合は保存しない）
+    report_dir: str | None = ".state/reports"
+
+    # LLM 応答キャッシュ（空の場合はキャッシュしない）
+    llm_cache_dir: str | None = ".state/llm_cache"
+    llm_cache_ttl: float = 6 * 60 * 60
+    llm_cache_max_bytes: int = 64 * 1024 * 1024
+
+    # Vertex AI コンテキストキャッシュの TTL（秒）。None の場合は使わない
+    context_cache_ttl: float | None = 60 * 60
+
+    # Vertex AI 呼び出しの最大試行回数、再試行・ヘッジ先のリージョン（GCP_LOCATION の次に使う順）
+    vertex_max_attempts: int = 3
+    gcp_fallback_locations: list[str] = field(default_factory=list)
+    # この分位点（0〜1）のレイテンシを超えた呼び出しを次のリージョンにも送る。None の場合はヘッジしない。
+    # 負けたリクエストをキャンセルできる asyncio モードのみで有効（スレッドモードでは無視する）
+    vertex_hedge_percentile: float | None = None
+
+    # Daemon settings
+    daemon_schedule: list[str] = field(default_factory=lambda: ["13:00"])
+    daemon_timezone: str = "Asia/Tokyo"
+
     @classmethod
     def from_env(cls) -> "Config":
         """Load configuration from environment variables."""
@@ -89,11 +222,43 @@ class Config:
             gcp_project_id=os.environ["GCP_PROJECT_ID"],
             gcp_location=os.environ.get("GCP_LOCATION", "asia-northeast1"),
             model_name=os.environ.get("MODEL_NAME", "gemini-2.5-pro"),
+            max_sources_per_item=_parse_positive_int("MAX_SOURCES_PER_ITEM", 3),
+            source_min_confidence=cls._load_source_min_confidence(),
+            fast_model_name=os.environ.get("FAST_MODEL_NAME") or "gemini-2.5-flash",
+            model_routing=_parse_bool(os.environ.get("MODEL_ROUTING", False)),
+            model_latency_slo=_parse_optional_seconds("MODEL_LATENCY_SLO_SECONDS") or 60,
             slack_bot_token=os.environ["SLACK_BOT_TOKEN"],
             x_bearer_token=x_bearer_token,
             news_source=news_source,
             topics=topics,
             use_emoji_names=_parse_bool(os.environ.get("USE_EMOJI_NAMES", False)),
+            topic_concurrency=_parse_positive_int("TOPIC_CONCURRENCY", 4),
+            run_time_budget=_parse_optional_seconds("RUN_TIME_BUDGET_SECONDS"),
+            topic_time_budget=_parse_optional_seconds("TOPIC_TIME_BUDGET_SECONDS"),
+            stream_delivery=_parse_bool(os.environ.get("STREAM_DELIVERY", False)),
+            structured_output=_parse_bool(os.environ.get("STRUCTURED_OUTPUT", False)),
+            articles_max_tokens=_parse_positive_int("ARTICLES_MAX_TOKENS", 12000),
+            generation_batch_size=_parse_positive_int("GENERATION_BATCH_SIZE", 1),
+            generation_batch_max_tokens=_parse_positive_int("GENERATION_BATCH_MAX_TOKENS", 32000),
+            batch_prediction_gcs_uri=os.environ.get("BATCH_PREDICTION_GCS_URI") or None,
+            batch_prediction_poll_seconds=_parse_optional_seconds("BATCH_PREDICTION_POLL_SECONDS") or 30,
+            batch_prediction_timeout=_parse_optional_seconds("BATCH_PREDICTION_TIMEOUT_SECONDS") or 60 * 60,
+            x_shared_search=_parse_bool(os.environ.get("X_SHARED_SEARCH", True)),
+            filter_candidates=_parse_positive_int("FILTER_CANDIDATES", 20, minimum=0),
+            page_extract_processes=_parse_positive_int("PAGE_EXTRACT_PROCESSES", 0, minimum=0),
+            state_dir=os.environ.get("STATE_DIR", ".state") or None,
+            report_dir=os.environ.get("REPORT_DIR", ".state/reports") or None,
+            llm_cache_dir=os.environ.get("LLM_CACHE_DIR", ".state/llm_cache") or None,
+            llm_cache_ttl=_parse_optional_seconds("LLM_CACHE_TTL_SECONDS") or 6 * 60 * 60,
+            llm_cache_max_bytes=_parse_positive_int("LLM_CACHE_MAX_MB", 64) * 1024 * 1024,
+            context_cache_ttl=cls._load_context_cache_ttl(),
+            vertex_max_attempts=_parse_positive_int("VERTEX_MAX_ATTEMPTS", 3),
+            gcp_fallback_locations=[
+                location.strip() for location in os.environ.get("GCP_FALLBACK_LOCATIONS", "").split(",") if location.strip()
+            ],
+            vertex_hedge_percentile=cls._load_hedge_percentile(),
+            daemon_schedule=_parse_schedule(os.environ.get("DAEMON_SCHEDULE", "13:00"), "DAEMON_SCHEDULE"),
+            daemon_timezone=cls._load_timezone(),
         )
 
     @classmethod
@@ -111,6 +276,51 @@ class Config:
 
         return source
 
+    @classmethod
+    def _load_context_cache_ttl(cls) -> float | None:
+        """Load the Vertex AI context cache TTL (disabled by VERTEX_CONTEXT_CACHE=false)."""
+        if not _parse_bool(os.environ.get("VERTEX_CONTEXT_CACHE", True)):
+            return None
+        return _parse_optional_seconds("CONTEXT_CACHE_TTL_SECONDS") or 60 * 60
+
+    @classmethod
+    def _load_hedge_percentile(cls) -> float | None:
+        """Load VERTEX_HEDGE_PERCENTILE (a latency percentile between 0 and 1, empty to disable)."""
+        raw = os.environ.get("VERTEX_HEDGE_PERCENTILE", "")
+        if not raw.strip():
+            return None
+        try:
+            value = float(raw)
+        except ValueError:
+            raise ValueError(f"Invalid VERTEX_HEDGE_PERCENTILE={raw!r}. Must be a number")
+        if not 0 < value < 1:
+            raise ValueError(f"Invalid VERTEX_HEDGE_PERCENTILE={raw!r}. Must be between 0 and 1")
+        return value
+
+    @classmethod
+    def _load_source_min_confidence(cls) -> float:
+        """Load SOURCE_MIN_CONFIDENCE (a grounding confidence between 0 and 1, default 0.5)."""
+        raw = os.environ.get("SOURCE_MIN_CONFIDENCE", "")
+        if not raw.strip():
+            return 0.5
+        try:
+            value = float(raw)
+        except ValueError:
+            raise ValueError(f"Invalid SOURCE_MIN_CONFIDENCE={raw!r}. Must be a number")
+        if not 0 <= value <= 1:
+            raise ValueError(f"Invalid SOURCE_MIN_CONFIDENCE={raw!r}. Must be between 0 and 1")
+        return value
+
+    @classmethod
+    def _load_timezone(cls) -> str:
+        """Load and validate DAEMON_TIMEZONE from environment."""
+        name = os.environ.get("DAEMON_TIMEZONE", "Asia/Tokyo")
+        try:
+            ZoneInfo(name)
+        except (ZoneInfoNotFoundError, ValueError):
+            raise ValueError(f"Invalid DAEMON_TIMEZONE={name!r}")
+        return name
+
     @classmethod
     def _load_topics(cls) -> list[TopicConfig]:
         """Load topics from TOPICS_CONFIG environment variable."""
@@ -0,0 +1,142 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+from dataclasses import dataclass
+
+from google import genai
+from google.genai import types
+
+from .tokens import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL_SECONDS = 60 * 60
+# 期限切れの手前でTTLを延長する余裕（秒）
+REFRESH_MARGIN_SECONDS = 5 * 60
+# 作成に失敗した場合（最小トークン数未満、権限不足など）に再試行しない期間（秒）
+FAILURE_COOLDOWN_SECONDS = 30 * 60
+# 推定トークン数がこれ未満の system instruction は最小キャッシュサイズに届かないためキャッシュしない
+MIN_CACHEABLE_TOKENS = 1024
+
+
+@dataclass
+class _Entry:
+    name: str | None
+    expires_at: float  # time.monotonic() 基準（失敗時はクールダウン終了時刻）
+
+
+class ContextCacheManager:
+    """Keeps Vertex AI cached-content resources for static system instructions.
+
+    generate_content の設定に含まれる system_instruction（と tools）をコンテキストキャッシュに載せ、
+    リクエストではキャッシュ名だけを送る。作成できない場合は元の設定のまま送る。
+    """
+
+    def __init__(
+        self,
+        client: genai.Client,
+        ttl_seconds: float = DEFAULT_TTL_SECONDS,
+        refresh_margin: float = REFRESH_MARGIN_SECONDS,
+    ):
+        self.client = client
+        self.ttl_seconds = ttl_seconds
+        self.refresh_margin = min(refresh_margin, ttl_seconds / 2)
+        self._entries: dict[str, _Entry] = {}
+        self._locks: dict[str, threading.Lock] = {}
+        self._locks_lock = threading.Lock()
+
+    @staticmethod
+    def _key(model: str, config: types.GenerateContentConfig) -> str:
+        data = config.model_dump(mode="json", exclude_none=True, include={"system_instruction", "tools", "tool_config"})
+        payload = json.dumps({"model": model, **data}, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _lock_for(self, key: str) -> threading.Lock:
+        with self._locks_lock:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def apply(self, model: str, config: types.GenerateContentConfig) -> types.GenerateContentConfig:
+        """Return config with its static part replaced by a cached-content reference.
+
+        Blocks while a cache is created or refreshed; other topics wait on the
+        same lock instead of creating duplicates.
+        """
+        if config.system_instruction is None or config.cached_content:
+            return config
+        if estimate_tokens(str(config.system_instruction)) < MIN_CACHEABLE_TOKENS:
+            return config
+
+        key = self._key(model, config)
+        with self._lock_for(key):
+            entry = self._entries.get(key)
+            now = time.monotonic()
+            if entry is None or (entry.name is None and now >= entry.expires_at):
+                entry = self._create(key, model, config)
+            elif entry.name is not None and now >= entry.expires_at - self.refresh_margin:
+                entry = self._refresh(key, model, config, entry)
+
+        if entry.name is None:
+            return config
+        return config.model_copy(
+            update={"system_instruction": None, "tools": None, "tool_config": None, "cached_content": entry.name}
+        )
+
+    def _create(self, key: str, model: str, config: types.GenerateContentConfig) -> _Entry:
+        try:
+            cached = self.client.caches.create(
+                model=model,
+                config=types.CreateCachedContentConfig(
+                    display_name=f"news-curator-{key[:12]}",
+                    system_instruction=config.system_instruction,
+                    tools=config.tools,
+                    tool_config=config.tool_config,
+                    ttl=f"{int(self.ttl_seconds)}s",
+                ),
+            )
+            entry = _Entry(cached.name, time.monotonic() + self.ttl_seconds)
+            logger.info(f"Created context cache {cached.name} for {model}")
+        except Exception as e:
+            entry = _Entry(None, time.monotonic() + FAILURE_COOLDOWN_SECONDS)
+            logger.warning(f"Context caching unavailable for {model}, sending the full prompt: {e}")
+        self._entries[key] = entry
+        return entry
+
+    def _refresh(self, key: str, model: str, config: types.GenerateContentConfig, entry: _Entry) -> _Entry:
+        """Extend the TTL of an existing cache, re-creating it if it is gone."""
+        try:
+            self.client.caches.update(
+                name=entry.name, config=types.UpdateCachedContentConfig(ttl=f"{int(self.ttl_seconds)}s")
+            )
+            entry = _Entry(entry.name, time.monotonic() + self.ttl_seconds)
+            self._entries[key] = entry
+            logger.debug(f"Extended context cache {entry.name}")
+            return entry
+        except Exception as e:
+            logger.info(f"Failed to extend context cache {entry.name}, re-creating: {e}")
+            return self._create(key, model, config)
+
+    def invalidate(self, model: str, config: types.GenerateContentConfig):
+        """Stop using the cache for config after the server rejected it."""
+        key = self._key(model, config)
+        with self._lock_for(key):
+            entry = self._entries.get(key)
+            if entry is not None and entry.name is not None:
+                try:
+                    self.client.caches.delete(name=entry.name)
+                except Exception:
+                    pass
+            self._entries[key] = _Entry(None, time.monotonic() + FAILURE_COOLDOWN_SECONDS)
+
+    def close(self):
+        """Delete every cache created by this manager."""
+        for entry in list(self._entries.values()):
+            if entry.name is None:
+                continue
+            try:
+                self.client.caches.delete(name=entry.name)
+                logger.debug(f"Deleted context cache {entry.name}")
+            except Exception as e:
+                logger.debug(f"Failed to delete context cache {entry.name}: {e}")
+        self._entries.clear()
@@ -0,0 +1,131 @@
+import logging
+import signal
+import sys
+import threading
+from datetime import datetime, time, timedelta
+from zoneinfo import ZoneInfo
+
+from dotenv import load_dotenv
+
+from .checkpoint import CheckpointStore
+from .config import Config, TopicConfig
+from .main import summarize_results, warn_thread_mode_settings
+from .pipeline import TopicPipeline
+
+logger = logging.getLogger(__name__)
+
+
+class TopicScheduler:
+    """Computes when each topic should run next from its daily HH:MM schedule."""
+
+    def __init__(self, topics: list[TopicConfig], default_schedule: list[str], tz: ZoneInfo):
+        self.tz = tz
+        self.schedules: list[tuple[TopicConfig, list[time]]] = []
+        for topic in topics:
+            times = topic.schedule or default_schedule
+            if not times:
+                logger.warning(f"Topic {topic.name} has no schedule and will never run")
+                continue
+            self.schedules.append((topic, [time.fromisoformat(t) for t in times]))
+
+    def _next_occurrence(self, now: datetime, at: time) -> datetime:
+        candidate = datetime.combine(now.date(), at, tzinfo=self.tz)
+        if candidate <= now:
+            candidate = datetime.combine(now.date() + timedelta(days=1), at, tzinfo=self.tz)
+        return candidate
+
+    def next_run(self, now: datetime) -> tuple[datetime, list[TopicConfig]] | None:
+        """Return the next run time and every topic due at that time.
+
+        Returns:
+            (run_at, topics), or None when no topic has a schedule.
+        """
+        due: dict[datetime, list[TopicConfig]] = {}
+        for topic, times in self.schedules:
+            run_at = min(self._next_occurrence(now, t) for t in times)
+            due.setdefault(run_at, []).append(topic)
+        if not due:
+            return None
+        run_at = min(due)
+        return run_at, due[run_at]
+
+
+def run_daemon(pipeline: TopicPipeline, stop_event: threading.Event) -> int:
+    """Run scheduled topics until stop_event is set.
+
+    The pipeline (and its Vertex AI / Slack / X clients) is reused across runs.
+
+    Returns:
+        0 when stopped cleanly, 1 when nothing is scheduled.
+    """
+    config = pipeline.config
+    tz = ZoneInfo(config.daemon_timezone)
+    scheduler = TopicScheduler(config.topics, config.daemon_schedule, tz)
+
+    while not stop_event.is_set():
+        now = datetime.now(tz)
+        next_run = scheduler.next_run(now)
+        if next_run is None:
+            logger.error("No topic has a schedule. Set DAEMON_SCHEDULE or per-topic 'schedule'")
+            return 1
+
+        run_at, topics = next_run
+        names = ", ".join(t.name for t in topics)
+        logger.info(f"Next run at {run_at.isoformat()}: {names}")
+
+        if stop_event.wait(timeout=max(0.0, (run_at - now).total_seconds())):
+            break
+
+        # 実行ごとに新しいチェックポイントを使う（前回の投稿済み状態を持ち越さない）
+        if config.state_dir:
+            pipeline.checkpoints = CheckpointStore(config.state_dir)
+            pipeline.checkpoints.prune()
+
+        results = pipeline.run_topics(topics)
+        summarize_results(results)
+
+    logger.info("Daemon stopped")
+    return 0
+
+
+def main() -> int:
+    """Entry point for the resident daemon mode."""
+    load_dotenv()
+
+    try:
+        config = Config.from_env()
+        logger.info("Configuration loaded successfully")
+        warn_thread_mode_settings(config)
+        logger.info(f"Found {len(config.topics)} topic(s) to schedule")
+
+        logger.info(f"News source: {config.news_source.value}")
+
+        pipeline = TopicPipeline.from_config(config)
+
+        stop_event = threading.Event()
+
+        def handle_signal(signum, frame):
+            logger.info(f"Received signal {signum}, stopping after the current run...")
+            stop_event.set()
+
+        signal.signal(signal.SIGTERM, handle_signal)
+        signal.signal(signal.SIGINT, handle_signal)
+
+        try:
+            return run_daemon(pipeline, stop_event)
+        finally:
+            pipeline.close()
+
+    except KeyError as e:
+        logger.error(f"Missing required environment variable: {e}")
+        return 1
+    except ValueError as e:
+        logger.error(f"Configuration error: {e}")
+        return 1
+    except Exception as e:
+        logger.error(f"Unexpected error: {e}", exc_info=True)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,78 @@
+import math
+import time
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when a stage is started after its time budget has run out."""
+
+
+class Deadline:
+    """A point in (monotonic) time by which work has to finish.
+
+    `Deadline(None)` represents an unbounded budget, so callers can pass a
+    Deadline around unconditionally.
+    """
+
+    def __init__(self, expires_at: float | None = None):
+        self.expires_at = expires_at
+
+    @classmethod
+    def after(cls, seconds: float | None) -> "Deadline":
+        """Create a deadline `seconds` from now (unbounded when None)."""
+        if seconds is None:
+            return cls(None)
+        return cls(time.monotonic() + seconds)
+
+    @property
+    def bounded(self) -> bool:
+        return self.expires_at is not None
+
+    def remaining(self) -> float | None:
+        """Seconds left, or None when unbounded."""
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        remaining = self.remaining()
+        return remaining is not None and remaining <= 0
+
+    def has_at_least(self, seconds: float) -> bool:
+        """Whether at least `seconds` remain (always True when unbounded)."""
+        remaining = self.remaining()
+        return remaining is None or remaining >= seconds
+
+    def child(self, seconds: float | None, reserve: float = 0.0) -> "Deadline":
+        """Derive a sub-deadline that never outlives this one.
+
+        Args:
+            seconds: Budget for the sub-task (None to inherit this deadline).
+            reserve: Seconds to keep back from this deadline for later stages.
+        """
+        candidates = []
+        if self.expires_at is not None:
+            candidates.append(self.expires_at - reserve)
+        if seconds is not None:
+            candidates.append(time.monotonic() + seconds)
+        return Deadline(min(candidates) if candidates else None)
+
+    def timeout(self, default: float | None = None) -> float | None:
+        """Per-call timeout in seconds: the remaining budget capped by `default`.
+
+        Raises:
+            DeadlineExceeded: If the deadline has already passed.
+        """
+        remaining = self.remaining()
+        if remaining is None:
+            return default
+        if remaining <= 0:
+            raise DeadlineExceeded("Time budget exhausted")
+        return remaining if default is None else min(default, remaining)
+
+    def timeout_ms(self, default: float | None = None) -> int | None:
+        """Same as timeout() but in whole milliseconds (for google-genai HttpOptions)."""
+        seconds = self.timeout(default)
+        return None if seconds is None else max(1, math.ceil(seconds * 1000))
+
+
+NO_DEADLINE = Deadline(None)
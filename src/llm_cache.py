@@ -0,0 +1,121 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from google.genai import types
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL_SECONDS = 6 * 60 * 60
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+def cache_key(model: str, prompt: str, config: types.GenerateContentConfig | None) -> str:
+    """Hash of everything that determines a generate_content response.
+
+    http_options（タイムアウト）は応答内容に影響しないためキーから除外する。
+    """
+    config_data = {}
+    if config is not None:
+        config_data = config.model_dump(mode="json", exclude_none=True, exclude={"http_options"})
+    payload = json.dumps({"model": model, "prompt": prompt, "config": config_data}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """On-disk generate_content response cache with TTL and size-bounded LRU eviction.
+
+    Each entry is `<cache_dir>/<key>.json`; the file mtime is refreshed on
+    every hit and used as the LRU order.
+    """
+
+    def __init__(
+        self,
+        cache_dir: str | Path,
+        ttl_seconds: float = DEFAULT_TTL_SECONDS,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+    ):
+        self.cache_dir = Path(cache_dir)
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.json"
+
+    def get(self, key: str) -> types.GenerateContentResponse | None:
+        """Return the cached response, or None when missing or expired."""
+        path = self._path(key)
+        try:
+            entry = json.loads(path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return None
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning(f"Ignoring unreadable LLM cache entry {path.name}: {e}")
+            return None
+
+        if time.time() - entry.get("created_at", 0) > self.ttl_seconds:
+            path.unlink(missing_ok=True)
+            return None
+
+        try:
+            response = types.GenerateContentResponse.model_validate(entry["response"])
+        except Exception as e:
+            logger.warning(f"Ignoring invalid LLM cache entry {path.name}: {e}")
+            return None
+
+        try:
+            os.utime(path)  # LRU の参照時刻を更新
+        except OSError:
+            pass
+        return response
+
+    def put(self, key: str, response: types.GenerateContentResponse):
+        """Store a response (text, grounding metadata and usage) and evict old entries."""
+        entry = {
+            "created_at": time.time(),
+            "response": response.model_dump(mode="json", exclude_none=True),
+        }
+        with self._lock:
+            try:
+                self.cache_dir.mkdir(parents=True, exist_ok=True)
+                fd, tmp = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+                try:
+                    with os.fdopen(fd, "w", encoding="utf-8") as f:
+                        json.dump(entry, f, ensure_ascii=False)
+                    os.replace(tmp, self._path(key))
+                except BaseException:
+                    if os.path.exists(tmp):
+                        os.unlink(tmp)
+                    raise
+                self._evict()
+            except OSError as e:
+                logger.warning(f"Failed to write LLM cache entry: {e}")
+
+    def _evict(self):
+        """Delete expired entries, then least recently used ones beyond max_bytes."""
+        now = time.time()
+        entries = []
+        for path in self.cache_dir.glob("*.json"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            # mtime は作成時刻以降なので、mtime が TTL より古ければ確実に期限切れ
+            if now - stat.st_mtime > self.ttl_seconds:
+                path.unlink(missing_ok=True)
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries, key=lambda e: e[0]):
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+            logger.debug(f"Evicted LLM cache entry {path.name}")
@@ -4,10 +4,8 @@ import sys
 
 from dotenv import load_dotenv
 
-from .config import Config, NewsSource
-from .news_curator import NewsCurator
-from .slack_poster import SlackPoster
-from .x_news_client import XNewsClient
+from .config import Config
+from .pipeline import TopicPipeline, TopicResult
 
 log_level = os.environ.get("LOG_LEVEL", "INFO").upper()
 logging.basicConfig(
@@ -17,6 +15,26 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+def summarize_results(results: list[TopicResult]) -> int:
+    """Log failed topics and return the process exit code."""
+    all_success = all(result.success for result in results)
+
+    failed = [result.topic for result in results if not result.success]
+    if failed:
+        logger.error(f"{len(failed)}/{len(results)} topic(s) failed: {', '.join(failed)}")
+
+    return 0 if all_success else 1
+
+
+def warn_thread_mode_settings(config: Config):
+    """Warn about settings that only take effect in asyncio mode."""
+    if config.vertex_hedge_percentile is not None:
+        logger.warning(
+            "VERTEX_HEDGE_PERCENTILE is ignored in threads mode (synchronous calls cannot be cancelled); "
+            "use python -m src.async_main to hedge Vertex AI calls"
+        )
+
+
 def main() -> int:
     """Main entry point for the news curator."""
     load_dotenv()
@@ -24,52 +42,18 @@ def main() -> int:
     try:
         config = Config.from_env()
         logger.info("Configuration loaded successfully")
+        warn_thread_mode_settings(config)
         logger.info(f"Found {len(config.topics)} topic(s) to process")
 
         logger.info(f"News source: {config.news_source.value}")
 
-        curator = NewsCurator(config)
-        x_client = XNewsClient(config.x_bearer_token) if config.x_bearer_token else None
-        all_success = True
-
-        for topic in config.topics:
-            logger.info(f"Processing topic: {topic.name}")
-
-            poster = SlackPoster(config, topic)
-
-            # 過去の投稿からURLを取得して重複を避ける
-            logger.info("Fetching recent URLs from Slack...")
-            exclude_urls = poster.fetch_recent_urls()
-
-            if config.news_source == NewsSource.X_NEWS:
-                logger.info("Fetching news from X News API...")
-                stories = x_client.search(topic.query, max_results=50)
-                if stories:
-                    stories = curator.filter_stories(topic.name, stories)
-                    logger.info(f"Formatting {len(stories)} stories with LLM...")
-                    items = curator.fetch_news_from_articles(topic.name, stories)
-                else:
-                    logger.warning("X News API returned no results, falling back to Google Search grounding")
-                    items = curator.fetch_news(topic.query, exclude_urls=exclude_urls)
-            else:
-                logger.info("Fetching news with Google Search grounding...")
-                items = curator.fetch_news(topic.query, exclude_urls=exclude_urls)
-
-            logger.info(f"Received {len(items)} news items")
-            for i, item in enumerate(items):
-                logger.debug(f"Item {i + 1}: {item.text[:100]}...")
-                logger.debug(f"  Sources: {len(item.sources)}, Impression: {item.is_impression}")
-
-            logger.info("Posting to Slack...")
-            success = poster.post_news(items)
-
-            if success:
-                logger.info(f"News posted successfully for topic: {topic.name}")
-            else:
-                logger.error(f"Failed to post news for topic: {topic.name}")
-                all_success = False
-
-        return 0 if all_success else 1
+        pipeline = TopicPipeline.from_config(config)
+
+        try:
+            results = pipeline.run_topics()
+        finally:
+            pipeline.close()
+        return summarize_results(results)
 
     except KeyError as e:
         logger.error(f"Missing required environment variable: {e}")
@@ -0,0 +1,211 @@
+import json
+import logging
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+REPORT_VERSION = 1
+
+RUN_ID_FORMAT = "%Y%m%dT%H%M%S"
+# 同じ秒に開始した実行（並行実行など）を区別するため、実行IDの末尾に付けるランダムな接尾辞のバイト数
+RUN_ID_SUFFIX_BYTES = 3
+
+# カウンタ名（レポートのキー）
+TWEETS = "tweets"
+LINKED_URLS = "linked_urls"
+PAGES_FETCHED = "pages_fetched"
+PAGES_EXTRACTED = "pages_extracted"
+EXCLUDED_URLS = "excluded_urls"
+POSTED_TWEETS_SKIPPED = "posted_tweets_skipped"
+POSTED_LINKS_SKIPPED = "posted_links_skipped"
+STORIES_SELECTED = "stories_selected"
+STORIES_PRERANK_DROPPED = "stories_prerank_dropped"
+FILTER_SKIPPED = "filter_skipped"
+STORIES_DROPPED = "stories_dropped"
+PAGE_TOKENS_TRIMMED = "page_tokens_trimmed"
+NEWS_ITEMS = "news_items"
+GROUNDING_SOURCES_DROPPED = "grounding_sources_dropped"
+PROMPT_CHARS = "prompt_chars"
+RESPONSE_CHARS = "response_chars"
+VERTEX_CALLS = "vertex_calls"
+VERTEX_RETRIES = "vertex_retries"
+VERTEX_HEDGES = "vertex_hedges"
+MODEL_DOWNGRADES = "model_downgrades"
+LLM_CACHE_HITS = "llm_cache_hits"
+BATCHED_TOPICS = "batched_topics"
+BATCH_PREDICTIONS = "batch_predictions"
+PROMPT_TOKENS = "prompt_tokens"
+CANDIDATES_TOKENS = "candidates_tokens"
+CACHED_TOKENS = "cached_tokens"
+THOUGHTS_TOKENS = "thoughts_tokens"
+TOTAL_TOKENS = "total_tokens"
+SLACK_API_CALLS = "slack_api_calls"
+X_API_CALLS = "x_api_calls"
+
+
+def model_calls(model: str) -> str:
+    """Counter name of the Vertex AI calls made with `model`."""
+    return f"{VERTEX_CALLS}:{model}"
+
+
+# usage_metadata の属性名 -> カウンタ名
+_USAGE_FIELDS = {
+    "prompt_token_count": PROMPT_TOKENS,
+    "candidates_token_count": CANDIDATES_TOKENS,
+    "cached_content_token_count": CACHED_TOKENS,
+    "thoughts_token_count": THOUGHTS_TOKENS,
+    "total_token_count": TOTAL_TOKENS,
+}
+
+
+class StageMetrics:
+    """Wall time per stage and counters for one topic (or the shared run stage)."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.stages: dict[str, float] = {}
+        self.counters: dict[str, int] = {}
+        self.wall_seconds: float | None = None
+        self.success: bool | None = None
+        self.error: str | None = None
+        self._lock = threading.Lock()
+
+    def add(self, counter: str, amount: int = 1):
+        with self._lock:
+            self.counters[counter] = self.counters.get(counter, 0) + amount
+
+    def add_time(self, stage: str, seconds: float):
+        with self._lock:
+            self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def to_dict(self) -> dict:
+        return {
+            "success": self.success,
+            "error": self.error,
+            "wall_seconds": self.wall_seconds,
+            "stages": dict(self.stages),
+            "counters": dict(self.counters),
+        }
+
+
+_current: ContextVar[StageMetrics | None] = ContextVar("current_metrics", default=None)
+
+
+def current() -> StageMetrics | None:
+    """Metrics of the topic being processed in this context, if any."""
+    return _current.get()
+
+
+@contextmanager
+def collecting(metrics: StageMetrics):
+    """Route record()/stage() calls in this context (and its copies) to `metrics`."""
+    token = _current.set(metrics)
+    start = time.perf_counter()
+    try:
+        yield metrics
+    finally:
+        metrics.wall_seconds = time.perf_counter() - start
+        _current.reset(token)
+
+
+def record(counter: str, amount: int = 1):
+    """Increment a counter of the current topic (no-op outside a run)."""
+    metrics = _current.get()
+    if metrics is not None and amount:
+        metrics.add(counter, amount)
+
+
+def record_usage(usage_metadata):
+    """Record Vertex AI token usage from a response's usage_metadata."""
+    if usage_metadata is None:
+        return
+    for attr, counter in _USAGE_FIELDS.items():
+        record(counter, getattr(usage_metadata, attr, None) or 0)
+
+
+def record_time(name: str, seconds: float):
+    """Add a duration that is not measured by stage() (e.g. a latency milestone)."""
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.add_time(name, seconds)
+
+
+@contextmanager
+def stage(name: str):
+    """Time a pipeline stage of the current topic."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics = _current.get()
+        if metrics is not None:
+            metrics.add_time(name, time.perf_counter() - start)
+
+
+def new_run_id() -> str:
+    """Unique, chronologically sortable run id (start time plus a random suffix).
+
+    チェックポイントの実行ディレクトリと性能レポートのファイル名に使う。
+    """
+    return f"{datetime.now().strftime(RUN_ID_FORMAT)}-{secrets.token_hex(RUN_ID_SUFFIX_BYTES)}"
+
+
+class RunReport:
+    """Machine-readable performance report of one run."""
+
+    SHARED = "_shared"  # トピック横断の処理（共有X検索など）
+
+    def __init__(self, run_id: str | None = None, settings: dict | None = None):
+        self.run_id = run_id or new_run_id()
+        self.started_at = datetime.now().astimezone()
+        self.settings = settings or {}
+        self.shared = StageMetrics(self.SHARED)
+        self.topics: dict[str, StageMetrics] = {}
+        self.wall_seconds: float | None = None
+        self._start = time.perf_counter()
+
+    def topic(self, name: str) -> StageMetrics:
+        if name not in self.topics:
+            self.topics[name] = StageMetrics(name)
+        return self.topics[name]
+
+    def finish(self):
+        self.wall_seconds = time.perf_counter() - self._start
+
+    def totals(self) -> dict:
+        """Counters summed over the shared stage and every topic.
+
+        cached_token_ratio は cached_tokens / prompt_tokens（キャッシュのヒット率の確認用）。
+        """
+        counters: dict[str, int | float] = {}
+        for stage_metrics in (self.shared, *self.topics.values()):
+            for name, value in stage_metrics.counters.items():
+                counters[name] = counters.get(name, 0) + value
+        if counters.get(PROMPT_TOKENS):
+            counters["cached_token_ratio"] = round(counters.get(CACHED_TOKENS, 0) / counters[PROMPT_TOKENS], 4)
+        return counters
+
+    def to_dict(self) -> dict:
+        return {
+            "version": REPORT_VERSION,
+            "run_id": self.run_id,
+            "started_at": self.started_at.isoformat(),
+            "wall_seconds": self.wall_seconds,
+            "settings": self.settings,
+            "totals": self.totals(),
+            "shared": self.shared.to_dict(),
+            "topics": {name: m.to_dict() for name, m in self.topics.items()},
+        }
+
+    def write(self, report_dir: str | Path) -> Path:
+        """Write the report as `<report_dir>/<run_id>.json` and return the path."""
+        path = Path(report_dir) / f"{self.run_id}.json"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(self.to_dict(), ensure_ascii=False, indent=2), encoding="utf-8")
+        return path
@@ -0,0 +1,73 @@
+import logging
+
+from . import metrics
+from .config import Config, TopicPriority
+from .deadline import NO_DEADLINE, Deadline
+from .resilience import CallKind, LatencyTracker
+
+logger = logging.getLogger(__name__)
+
+# 生成モデルのレイテンシのサンプルがまだない場合に想定する所要時間（秒）
+DEFAULT_EXPECTED_SECONDS = 30.0
+ROUTING_PERCENTILE = 0.95
+# 残り時間が「想定所要時間 × 係数」を下回ったら高速モデルに切り替える（優先度が低いほど早めに切り替える）
+HEADROOM = {
+    TopicPriority.HIGH: 1.0,
+    TopicPriority.NORMAL: 1.5,
+    TopicPriority.LOW: 2.5,
+}
+
+
+def highest_priority(priorities: list[TopicPriority]) -> TopicPriority:
+    """The priority least willing to downgrade (for a request shared by several topics)."""
+    return min(priorities, key=HEADROOM.__getitem__, default=TopicPriority.NORMAL)
+
+
+class ModelRouter:
+    """Chooses the Vertex AI model for each stage of a topic.
+
+    filter_stories は常に高速モデル（FAST_MODEL_NAME）で行う。会話の生成は通常 MODEL_NAME で行い、
+    次の場合に高速モデルへ切り替える。
+
+    - 残り時間が MODEL_NAME の直近 p95 レイテンシ（× 優先度ごとの係数）に足りない
+    - MODEL_NAME の p95 が MODEL_LATENCY_SLO_SECONDS を超えている（priority が high のトピックを除く）
+
+    Args:
+        config: Application configuration.
+        tracker: Latency history of successful calls (shared with ResilientCaller).
+    """
+
+    def __init__(self, config: Config, tracker: LatencyTracker):
+        self.config = config
+        self.tracker = tracker
+
+    def filter_model(self) -> str:
+        return self.config.fast_model_name
+
+    def generation_model(
+        self,
+        deadline: Deadline = NO_DEADLINE,
+        priority: TopicPriority = TopicPriority.NORMAL,
+        kind: CallKind = CallKind.SOLO,
+    ) -> str:
+        """Model for the dialogue generation of a topic.
+
+        The p95 is taken from calls of the same kind (solo / batched / stream).
+        """
+        model, fast = self.config.model_name, self.config.fast_model_name
+        if not self.config.model_routing or model == fast:
+            return model
+
+        p95 = self.tracker.percentile(model, ROUTING_PERCENTILE, kind)
+        expected = p95 if p95 is not None else DEFAULT_EXPECTED_SECONDS
+        remaining = deadline.remaining()
+        if remaining is not None and remaining < expected * HEADROOM[priority]:
+            reason = f"{remaining:.0f}s left, {model} p95 {expected:.0f}s"
+        elif priority != TopicPriority.HIGH and p95 is not None and p95 > self.config.model_latency_slo:
+            reason = f"{model} p95 {p95:.0f}s exceeds {self.config.model_latency_slo:.0f}s"
+        else:
+            return model
+
+        logger.info(f"Routing generation to {fast} ({priority.value} priority): {reason}")
+        metrics.record(metrics.MODEL_DOWNGRADES)
+        return fast
@@ -1,15 +1,33 @@
+import asyncio
+import bisect
+import inspect
+import json
 import logging
 import re
+from collections.abc import Awaitable, Callable
+from typing import TypeVar
 
 from google import genai
-from google.genai import types
-
-from .config import Config, TopicConfig
+from google.genai import errors, types
+
+from . import metrics
+from .batch_prediction import BatchPredictionQueue
+from .config import Config, TopicConfig, TopicPriority
+from .context_cache import ContextCacheManager
+from .deadline import NO_DEADLINE, Deadline
+from .llm_cache import ResponseCache, cache_key
+from .model_router import ModelRouter
+from .resilience import CallKind, ResilientCaller, RetryPolicy, is_retryable
+from .story_ranking import PreRanking, prerank
+from .tokens import estimate_tokens
 from .x_news_client import XNewsStory
 
 logger = logging.getLogger(__name__)
 
-PROMPT_TEMPLATE = """「{topic}」に関する過去24時間以内のニュースを検索し、「ずんだもん」「あんこもん」「四国めたん」「東北きりたん」の4人が議論する形式でSlack mrkdwn形式で報告してください。
+T = TypeVar("T")
+
+# 全トピック・全リクエストで共通のキャラクター設定と出力形式（system instruction として送り、Vertex AI のコンテキストキャッシュに載せる）
+PERSONA_TEMPLATE = """「ずんだもん」「あんこもん」「四国めたん」「東北きりたん」の4人が議論する形式で、ニュースをSlack mrkdwn形式で報告してください。
 
 # ずんだもんの設定
 - ずんだ餅の妖精
@@ -71,7 +89,10 @@ PROMPT_TEMPLATE = """「{topic}」に関する過去24時間以内のニュー
 {kiritan}: （注目点一言）
 {zundamon}: （ポジティブに締め一言）
 
-# 注意事項
+{rules}"""
+
+# Google Search grounding で報告する場合の注意事項
+NEWS_RULES = """# 注意事項
 - 自己紹介や挨拶は含めず、いきなり1件目のニュースから始めること
 - URLは含めないこと（参照元は自動追加されます）
 - 各ニュースは `---` のみの行で区切る
@@ -82,7 +103,42 @@ PROMPT_TEMPLATE = """「{topic}」に関する過去24時間以内のニュー
 - 4人のキャラクターの口調を厳守すること
 - 各キャラクターの視点を活かすこと（ずんだもん: ポジティブ、あんこもん: 現実的、めたん: 技術的深掘り、きりたん: 客観的整理）
 - 各ニュースは2〜3人の組み合わせで会話すること（組み合わせは自由、まとめのみ4人全員）
-- 各キャラクターの発言は必ず一文のみにすること（長文禁止、テンポ重視）
+- 各キャラクターの発言は必ず一文のみにすること（長文禁止、テンポ重視）"""
+
+# 取得済みのXポストから報告する場合の注意事項
+ARTICLES_RULES = """# 注意事項
+- 自己紹介や挨拶は含めず、いきなり1件目のニュースから始めること
+- URLは含めないこと（参照元は自動追加されます）
+- 各ニュースは `---` のみの行で区切る
+- Markdown の ## や ** は使わず、Slack mrkdwn の *太字* を使用
+- 提示されたポストから話題を3〜5件選び、関連するポストをまとめて1つのニュースとして報告すること（最低3件、最大5件）
+- ポストにリンク先ページの情報がある場合は、その内容も参考にしてニュースの要約に含めること
+- 各ニュースの最後に、**そのニュースの情報源として直接使用した**ポストの番号のみを `[ref:1]` `[ref:1,2]` の形式で記載すること（会話内容に直接関係しないポストは含めない。通常1〜3個程度）
+- 4人のキャラクターの口調を厳守すること
+- 各キャラクターの視点を活かすこと（ずんだもん: ポジティブ、あんこもん: 現実的、めたん: 技術的深掘り、きりたん: 客観的整理）
+- 各ニュースは2〜3人の組み合わせで会話すること（組み合わせは自由、まとめのみ4人全員）
+- 各キャラクターの発言は必ず一文のみにすること（長文禁止、テンポ重視）"""
+
+# 構造化出力（STRUCTURED_OUTPUT）で取得済みのXポストから報告する場合の注意事項（区切り・[ref:N] の代わりに JSON のフィールドで返させる）
+ARTICLES_JSON_RULES = """# 注意事項
+- 出力は指定された JSON スキーマに従い、上記の出力形式の各要素を次のフィールドに入れること
+  - items: ニュースごとに title（ニュースタイトルのみ。* などの記号は付けない）、lines（発言の配列。speaker にキャラクター名、text に発言）、refs（**そのニュースの情報源として直接使用した**ポストの番号の配列。会話内容に直接関係しないポストは含めない。通常1〜3個程度）
+  - summary: まとめの4人の発言の配列
+- URLは含めないこと（参照元は自動追加されます）
+- Markdown の ## や ** は使わず、Slack mrkdwn の *太字* を使用
+- 提示されたポストから話題を3〜5件選び、関連するポストをまとめて1つのニュースとして報告すること（最低3件、最大5件）
+- ポストにリンク先ページの情報がある場合は、その内容も参考にしてニュースの要約に含めること
+- 4人のキャラクターの口調を厳守すること
+- 各キャラクターの視点を活かすこと（ずんだもん: ポジティブ、あんこもん: 現実的、めたん: 技術的深掘り、きりたん: 客観的整理）
+- 各ニュースは2〜3人の組み合わせで会話すること（組み合わせは自由、まとめのみ4人全員）
+- 各キャラクターの発言は必ず一文のみにすること（長文禁止、テンポ重視）"""
+
+# 以下のプロンプトは、プレフィックス一致による暗黙的なキャッシュが効くよう固定の文言を先頭に置き、
+# トピック名・ポスト一覧などリクエストごとに変わる値は末尾の見出し以降にまとめる
+PROMPT_TEMPLATE = """過去24時間以内のニュースを検索し、4人が議論する形式でSlack mrkdwn形式で報告してください。
+
+# トピック
+{topic}
 {exclude_section}"""
 
 EXCLUDE_SECTION_TEMPLATE = """
@@ -91,108 +147,258 @@ EXCLUDE_SECTION_TEMPLATE = """
 """
 
 # X News API でニュースを事前取得した場合に使うプロンプト（LLM は会話整形のみ担当）
-PROMPT_FILTER_TEMPLATE = """以下はXから取得した「{topic}」関連のポストです。
-ニュースとして取り上げる価値があるポストの番号だけを選んでください。
+FILTER_INSTRUCTION = """Xから取得したポストの一覧から、ニュースとして取り上げる価値があるポストの番号だけを選んでください。
 
 # 選定基準
-- トピック「{topic}」に直接関連している
+- 指定されたトピックに直接関連している
 - ニュースや話題として情報価値がある（単なる感想・宣伝・スパムは除外）
 - 具体的な事実や出来事を含んでいる
 - 重複する内容は1つだけ選ぶ
 
-# ポスト一覧
-{articles}
-
 # 出力形式
 選んだポストの番号をカンマ区切りで出力してください。番号以外は出力しないでください。
 例: 1,3,5,8"""
 
-PROMPT_WITH_ARTICLES_TEMPLATE = """以下は「{topic}」に関する最新のXポストと、リンク先ページの要約です。これらについて「ずんだもん」「あんこもん」「四国めたん」「東北きりたん」の4人が議論する形式でSlack mrkdwn形式で報告してください。
-
-# 取得済みポスト（番号付き）
-{articles}
-
-# ずんだもんの設定
-- ずんだ餅の妖精
-- 一人称は「ボク」
-- 語尾は「〜のだ」「〜なのだ」（例:「すごいのだ」「楽しみなのだ」）
-- ポジティブ・期待・ワクワクする視点でコメント
-- フレンドリーで優しい性格
-- 禁止: 「だよ。」「なのだよ。」「かな？」は使わない
-
-# あんこもんの設定
-- あんこ餅の妖精（ずんだもんのライバル）
-- 一人称は「あんこもん」（自分のことを名前で呼ぶ。例:「あんこもんは知ってるもん」）
-- 語尾は「〜もん」（動詞・形容詞の後）または「〜だもん」（名詞の後）
-- 例:「知らないもん」「そうだもん」「あんこもんの方が詳しいもん」
-- 現実的・慎重な視点でコメント（建設的な批判）
-- ツンデレで負けず嫌いだが、良いものは素直に認めることもある
-- ずんだもんに対抗意識を持ちつつも、最終的にはフォローすることもある
-- 禁止: 全否定や攻撃的な表現（「〜なんてない」「粗悪」「価値がない」「おもちゃ」など）
-- 推奨: 「〜には注意が必要だもん」「〜は慎重に見た方がいいもん」「〜という懸念もあるもん」
-
-# 四国めたんの設定
-- 良家のお嬢様
-- 一人称は「私」または「わたくし」
-- タメ口基調だが「〜でしょう」などの言い回し
-- 語尾: 「〜かしら。」「〜わね。」「〜わよ。」「〜なのよ。」
-- たまに厨二病的な発言（「闇の力」「運命」など）
-- 視点: 知的好奇心旺盛、技術的な深掘りや背景を探る
-
-# 東北きりたんの設定
-- 11歳の女性、しっかり者
-- 一人称は「私」
-- 丁寧な言葉遣い（「〜です」「〜ます」「〜ですね」「〜でしょうか」）
-- 視点: 冷静で客観的、事実を整理し要点をまとめる役割
-
-# 出力形式（以下のフォーマットを厳守）
-- 各ニュースは2〜3人の組み合わせで会話（組み合わせは自由に変えてよい）
-- 各キャラクターの発言は一文のみ（短く簡潔に）
-- テンポの良い掛け合いを重視
-- 1ニュースあたり5〜6発言程度（トピックを少し深掘りする）
+PROMPT_FILTER_TEMPLATE = """# トピック
+{topic}
 
-*ニュースタイトル*
-
-{zundamon} or {ankomon} or {metan} or {kiritan}: （ニュース紹介一言）
-別のキャラ: （反応・感想一言）
-別のキャラ: （背景や理由を深掘り一言）
-別のキャラ: （別の視点や影響を補足一言）
-別のキャラ: （さらに掘り下げ一言）
-別のキャラ: （締め一言）
-
----
-
-（3〜5件のニュースを上記形式で続ける）
+# ポスト一覧
+{articles}"""
 
----
+PROMPT_WITH_ARTICLES_TEMPLATE = """以下の最新のXポストとリンク先ページの要約について、4人が議論する形式でSlack mrkdwn形式で報告してください。
 
-💭 *まとめ*
-{metan}: （技術展望一言）
-{ankomon}: （現実的視点一言）
-{kiritan}: （注目点一言）
-{zundamon}: （ポジティブに締め一言）
+# トピック
+{topic}
 
-# 注意事項
-- 自己紹介や挨拶は含めず、いきなり1件目のニュースから始めること
-- URLは含めないこと（参照元は自動追加されます）
-- 各ニュースは `---` のみの行で区切る
-- Markdown の ## や ** は使わず、Slack mrkdwn の *太字* を使用
-- 上記のポストから話題を3〜5件選び、関連するポストをまとめて1つのニュースとして報告すること（最低3件、最大5件）
-- ポストにリンク先ページの情報がある場合は、その内容も参考にしてニュースの要約に含めること
-- 各ニュースの最後に、**そのニュースの情報源として直接使用した**ポストの番号のみを `[ref:1]` `[ref:1,2]` の形式で記載すること（会話内容に直接関係しないポストは含めない。通常1〜3個程度）
-- 4人のキャラクターの口調を厳守すること
-- 各キャラクターの視点を活かすこと（ずんだもん: ポジティブ、あんこもん: 現実的、めたん: 技術的深掘り、きりたん: 客観的整理）
-- 各ニュースは2〜3人の組み合わせで会話すること（組み合わせは自由、まとめのみ4人全員）
-- 各キャラクターの発言は必ず一文のみにすること（長文禁止、テンポ重視）"""
+# 取得済みポスト（番号付き）
+{articles}"""
+
+
+# 複数トピックを1リクエストにまとめる場合のプロンプト（各トピックのポスト番号はトピック内で振る）
+PROMPT_BATCH_TEMPLATE = """以下の{count}件のトピックそれぞれについて、最新のXポストとリンク先ページの要約をもとに、4人が議論する形式でSlack mrkdwn形式で報告してください。
+トピックごとに `=== トピックN ===`（N はトピック番号）だけの行から始まるセクションとして出力し、各セクションには通常と同じ形式（ニュースとまとめ）を含めてください。
+`[ref:N]` のポスト番号は、そのトピックのポスト一覧内の番号です。
+
+{sections}"""
+
+PROMPT_BATCH_JSON_TEMPLATE = """以下の{count}件のトピックそれぞれについて、最新のXポストとリンク先ページの要約をもとに、4人が議論する形式でSlack mrkdwn形式で報告してください。
+topics にはトピックごとに topic（トピック番号）と、通常と同じ形式の items・summary を含めてください。
+refs のポスト番号は、そのトピックのポスト一覧内の番号です。
+
+{sections}"""
+
+BATCH_SECTION_TEMPLATE = """# トピック{index}: {topic}
+
+## 取得済みポスト（番号付き）
+{articles}"""
+
+BATCH_SECTION_PATTERN = re.compile(r"^\s*=+\s*トピック\s*(\d+)\s*=+\s*$", re.MULTILINE)
+
+# 構造化出力の response_schema（property_ordering の順に生成させ、ストリーミング中に items から順に読めるようにする）
+_DIALOGUE_SCHEMA = types.Schema(
+    type=types.Type.ARRAY,
+    items=types.Schema(
+        type=types.Type.OBJECT,
+        properties={"speaker": types.Schema(type=types.Type.STRING), "text": types.Schema(type=types.Type.STRING)},
+        required=["speaker", "text"],
+        property_ordering=["speaker", "text"],
+    ),
+)
+_NEWS_ENTRY_SCHEMA = types.Schema(
+    type=types.Type.OBJECT,
+    properties={
+        "title": types.Schema(type=types.Type.STRING),
+        "lines": _DIALOGUE_SCHEMA,
+        "refs": types.Schema(type=types.Type.ARRAY, items=types.Schema(type=types.Type.INTEGER)),
+    },
+    required=["title", "lines", "refs"],
+    property_ordering=["title", "lines", "refs"],
+)
+ARTICLES_SCHEMA = types.Schema(
+    type=types.Type.OBJECT,
+    properties={"items": types.Schema(type=types.Type.ARRAY, items=_NEWS_ENTRY_SCHEMA), "summary": _DIALOGUE_SCHEMA},
+    required=["items", "summary"],
+    property_ordering=["items", "summary"],
+)
+BATCH_SCHEMA = types.Schema(
+    type=types.Type.OBJECT,
+    properties={
+        "topics": types.Schema(
+            type=types.Type.ARRAY,
+            items=types.Schema(
+                type=types.Type.OBJECT,
+                properties={"topic": types.Schema(type=types.Type.INTEGER), **ARTICLES_SCHEMA.properties},
+                required=["topic", "items", "summary"],
+                property_ordering=["topic", "items", "summary"],
+            ),
+        )
+    },
+    required=["topics"],
+)
+SUMMARY_HEADING = "💭 *まとめ*"
+
+
+# 切り詰めたリンク先本文の末尾に付ける記号
+TRUNCATION_MARK = "…"
+# 割り当てがこれより少ないリンク先は、切り詰めずに省く（短すぎる抜粋は要約の役に立たない）
+MIN_PAGE_TOKENS = 32
+
+
+def _truncate_to_tokens(text: str, tokens: int) -> str:
+    """Cut text so that estimate_tokens() of the result is at most `tokens`."""
+    data = text.encode("utf-8")
+    if len(data) <= tokens * 4:
+        return text
+    limit = max(tokens * 4 - len(TRUNCATION_MARK.encode("utf-8")), 0)
+    return data[:limit].decode("utf-8", errors="ignore").rstrip() + TRUNCATION_MARK
+
+
+def _page_line(url: str, page_text: str) -> str:
+    # XNewsStory.to_prompt_text のリンク先行と同じ形式（区切りの改行を含む）
+    return f"\n  リンク先 ({url}): {page_text}"
+
+
+def _pack_stories(stories: list[XNewsStory], max_tokens: int) -> tuple[list[XNewsStory], int, int]:
+    """Fit stories into an input-token budget, in priority order (highest first).
+
+    ポスト本文は残す全ストーリーに必須とし、入りきらない優先度の低いストーリーから落とす。
+    残りの予算はリンク先本文に、優先度の高いものほど多く（順位の逆数に比例して）割り当て、
+    使い切らなかった分は後続のストーリーに回す。
+
+    Returns:
+        (packed stories, trimmed page tokens, dropped story count). Stories
+        that are not trimmed are returned as is; trimmed ones are copies.
+    """
+    kept: list[XNewsStory] = []
+    used = 0
+    for i, story in enumerate(stories):
+        # ストーリー間の区切り（空行）の分も数える
+        cost = estimate_tokens(story.to_prompt_text(i + 1, include_pages=False)) + 1
+        if kept and used + cost > max_tokens:
+            break
+        kept.append(story)
+        used += cost
+
+    page_costs = [
+        [(url, estimate_tokens(_page_line(url, text))) for url, text in story.page_texts.items() if text]
+        for story in kept
+    ]
+    remaining = max(max_tokens - used, 0)
+    weights = [1 / (i + 1) if costs else 0.0 for i, costs in enumerate(page_costs)]
+    packed: list[XNewsStory] = []
+    trimmed = 0
+    for i, (story, costs) in enumerate(zip(kept, page_costs)):
+        total = sum(cost for _, cost in costs)
+        share = remaining * weights[i] / sum(weights[i:]) if weights[i] else 0
+        allotment = min(total, int(share))
+        remaining -= allotment
+        if allotment >= total:
+            packed.append(story)
+            continue
+
+        page_texts = {}
+        for url, cost in costs:
+            overhead = estimate_tokens(_page_line(url, ""))
+            if allotment >= cost:
+                page_texts[url] = story.page_texts[url]
+                allotment -= cost
+            elif allotment - overhead >= MIN_PAGE_TOKENS:
+                page_texts[url] = _truncate_to_tokens(story.page_texts[url], allotment - overhead)
+                allotment = 0
+        # 割り当てた予算のうちリンク先に使わなかった分は後続へ回す
+        remaining += allotment
+        copy = XNewsStory.from_dict(story.to_dict())
+        copy.page_texts = page_texts
+        trimmed += total - sum(estimate_tokens(_page_line(url, text)) for url, text in page_texts.items())
+        packed.append(copy)
+    return packed, trimmed, len(stories) - len(kept)
 
 
 class NewsItem:
     """Represents a single news item with text and sources."""
 
-    def __init__(self, text: str, sources: list[dict], is_impression: bool = False):
+    def __init__(self, text: str, sources: list[dict], is_impression: bool = False, model: str | None = None):
         self.text = text.strip()
         self.sources = sources
         self.is_impression = is_impression
+        # 生成に使ったモデル（Slack のフッターに表示する）
+        self.model = model
+
+    def to_dict(self) -> dict:
+        data = {"text": self.text, "sources": self.sources, "is_impression": self.is_impression}
+        if self.model:
+            data["model"] = self.model
+        return data
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "NewsItem":
+        return cls(data["text"], data.get("sources", []), data.get("is_impression", False), data.get("model"))
+
+
+# ストリーミング生成中に、区切り（---）まで届いたニュース項目を受け取るコールバック
+ProgressCallback = Callable[[list[NewsItem]], None]
+AsyncProgressCallback = Callable[[list[NewsItem]], Awaitable[None]]
+
+
+def _part_spans(text: str, separator: str) -> list[tuple[str, int, int]]:
+    """Split text by separator into stripped parts with their UTF-8 byte ranges in text.
+
+    grounding の segment の start_index / end_index は UTF-8 のバイト位置のため、パートの範囲もバイトで表す。
+    """
+    spans = []
+    pos = 0
+    separator_bytes = len(separator.encode("utf-8"))
+    for raw in text.split(separator):
+        stripped = raw.strip()
+        start = pos + len(raw[: len(raw) - len(raw.lstrip())].encode("utf-8"))
+        spans.append((stripped, start, start + len(stripped.encode("utf-8"))))
+        pos += len(raw.encode("utf-8")) + separator_bytes
+    return spans
+
+
+def _text_part_offsets(candidate) -> list[int]:
+    """Byte offset of each content part within the candidate's concatenated text (as in response.text)."""
+    offsets, total = [], 0
+    for part in (candidate.content.parts if candidate.content else None) or []:
+        offsets.append(total)
+        if isinstance(part.text, str) and not part.thought:
+            total += len(part.text.encode("utf-8"))
+    return offsets
+
+
+class _StreamAccumulator:
+    """Merges generate_content_stream chunks into a single response."""
+
+    def __init__(self):
+        self.text = ""
+        self.grounding_metadata = None
+        self.usage_metadata = None
+
+    def add(self, chunk) -> bool:
+        """Add a chunk and return whether new text arrived."""
+        if chunk.usage_metadata is not None:
+            self.usage_metadata = chunk.usage_metadata
+        for candidate in chunk.candidates or []:
+            # grounding metadata は最後のチャンクにまとめて付く
+            if candidate.grounding_metadata is not None:
+                self.grounding_metadata = candidate.grounding_metadata
+        try:
+            text = chunk.text or ""
+        except Exception:
+            text = ""
+        self.text += text
+        return bool(text)
+
+    def response(self) -> types.GenerateContentResponse:
+        return types.GenerateContentResponse(
+            candidates=[
+                types.Candidate(
+                    content=types.Content(role="model", parts=[types.Part(text=self.text)]),
+                    grounding_metadata=self.grounding_metadata,
+                )
+            ],
+            usage_metadata=self.usage_metadata,
+        )
 
 
 class NewsCurator:
@@ -202,13 +408,42 @@ class NewsCurator:
     # 短すぎるセグメントテキストは複数パートに誤マッチする可能性があるため除外
     MIN_SEGMENT_TEXT_LENGTH = 10
 
-    def __init__(self, config: Config):
+    def __init__(
+        self,
+        config: Config,
+        client: genai.Client | None = None,
+        cache: ResponseCache | None = None,
+        context_cache: ContextCacheManager | None = None,
+        caller: ResilientCaller | None = None,
+    ):
         self.config = config
-        self.client = genai.Client(
+        self.client = client or genai.Client(
             vertexai=True,
             project=config.gcp_project_id,
             location=config.gcp_location,
         )
+        if caller is None:
+            caller = ResilientCaller.for_locations(
+                self.client,
+                config.gcp_project_id,
+                config.gcp_location,
+                config.gcp_fallback_locations,
+                policy=RetryPolicy(max_attempts=config.vertex_max_attempts),
+                hedge_percentile=config.vertex_hedge_percentile,
+            )
+        self.caller = caller
+        self.router = ModelRouter(config, caller.tracker)
+        if cache is None and config.llm_cache_dir:
+            cache = ResponseCache(config.llm_cache_dir, config.llm_cache_ttl, config.llm_cache_max_bytes)
+        self.cache = cache
+        if context_cache is None and config.context_cache_ttl:
+            context_cache = ContextCacheManager(self.client, config.context_cache_ttl)
+        self.context_cache = context_cache
+
+    def close(self):
+        """Delete Vertex AI context caches created by this curator."""
+        if self.context_cache is not None:
+            self.context_cache.close()
 
     def _character_names(self) -> tuple[str, str, str, str]:
         """Return character display names based on config."""
@@ -216,46 +451,375 @@ class NewsCurator:
             return ":zundamon:", ":ankomon:", ":shikoku-metan:", ":tohoku-kiritan:"
         return "ずんだもん", "あんこもん", "四国めたん", "東北きりたん"
 
-    def fetch_news(
-        self, topic: str, exclude_urls: list[str] | None = None
-    ) -> list[NewsItem]:
-        """Fetch news using Google Search grounding.
+    def _with_deadline(
+        self, config: types.GenerateContentConfig, deadline: Deadline
+    ) -> types.GenerateContentConfig:
+        """Attach the remaining time budget as the request timeout."""
+        timeout_ms = deadline.timeout_ms()
+        if timeout_ms is None:
+            return config
+        return config.model_copy(update={"http_options": types.HttpOptions(timeout=timeout_ms)})
+
+    def _generate(
+        self,
+        model: str,
+        prompt: str,
+        config: types.GenerateContentConfig,
+        deadline: Deadline = NO_DEADLINE,
+        kind: CallKind = CallKind.SOLO,
+    ):
+        """Call generate_content synchronously (served from the response cache when possible).
+
+        Retryable failures are retried (in the fallback regions, if any); only
+        the async variant hedges slow calls, see ResilientCaller.
+        """
+        return self._cached(model, prompt, config, lambda: self._generate_online(model, prompt, config, deadline, kind))
+
+    async def _generate_async(
+        self,
+        model: str,
+        prompt: str,
+        config: types.GenerateContentConfig,
+        deadline: Deadline = NO_DEADLINE,
+        kind: CallKind = CallKind.SOLO,
+    ):
+        """Call generate_content on the asyncio client (served from the response cache when possible)."""
+        return await self._cached_async(
+            model, prompt, config, lambda: self._generate_online_async(model, prompt, config, deadline, kind)
+        )
 
-        Args:
-            topic: The topic to search for news.
-            exclude_urls: List of news URLs to exclude (already reported).
+    def _generate_online(
+        self, model: str, prompt: str, config: types.GenerateContentConfig, deadline: Deadline, kind: CallKind
+    ):
+        def request(client: genai.Client, request_config: types.GenerateContentConfig):
+            return client.models.generate_content(
+                model=model, contents=prompt, config=self._with_deadline(request_config, deadline)
+            )
+
+        return self._send(model, config, request, deadline, kind)
+
+    async def _generate_online_async(
+        self, model: str, prompt: str, config: types.GenerateContentConfig, deadline: Deadline, kind: CallKind
+    ):
+        async def request(client: genai.Client, request_config: types.GenerateContentConfig):
+            return await client.aio.models.generate_content(
+                model=model, contents=prompt, config=self._with_deadline(request_config, deadline)
+            )
+
+        return await self._send_async(model, config, request, deadline, kind)
+
+    def _generate_batched(
+        self,
+        queue: BatchPredictionQueue,
+        model: str,
+        prompt: str,
+        config: types.GenerateContentConfig,
+        deadline: Deadline = NO_DEADLINE,
+    ):
+        """Run generate_content through a batch prediction job, generating online if it fails."""
+
+        def generate():
+            response = queue.generate(model, prompt, config, deadline)
+            if response is None:
+                return self._generate_online(model, prompt, config, deadline, CallKind.SOLO)
+            metrics.record(metrics.BATCH_PREDICTIONS)
+            return response
+
+        return self._cached(model, prompt, config, generate)
+
+    async def _generate_batched_async(
+        self,
+        queue: BatchPredictionQueue,
+        model: str,
+        prompt: str,
+        config: types.GenerateContentConfig,
+        deadline: Deadline = NO_DEADLINE,
+    ):
+        """Async variant of _generate_batched (waits for the job in a worker thread)."""
+
+        async def generate():
+            response = await asyncio.to_thread(queue.generate, model, prompt, config, deadline)
+            if response is None:
+                return await self._generate_online_async(model, prompt, config, deadline, CallKind.SOLO)
+            metrics.record(metrics.BATCH_PREDICTIONS)
+            return response
+
+        return await self._cached_async(model, prompt, config, generate)
+
+    def _generate_stream(
+        self,
+        model: str,
+        prompt: str,
+        config: types.GenerateContentConfig,
+        deadline: Deadline,
+        on_text: Callable[[str], None],
+    ):
+        """Stream generate_content, calling on_text with the text received so far.
+
+        Returns the merged response, which is cached like a non-streamed one.
+        Failed streams are retried from the start but never hedged, not even
+        by the async variant (the progress callback must see a single stream).
+        """
 
-        Returns:
-            List of NewsItem objects with text and sources.
+        def request(client: genai.Client, request_config: types.GenerateContentConfig):
+            chunks = client.models.generate_content_stream(
+                model=model, contents=prompt, config=self._with_deadline(request_config, deadline)
+            )
+            return self._consume_stream(chunks, on_text)
+
+        return self._cached(
+            model, prompt, config, lambda: self._send(model, config, request, deadline, CallKind.STREAM)
+        )
+
+    async def _generate_stream_async(
+        self,
+        model: str,
+        prompt: str,
+        config: types.GenerateContentConfig,
+        deadline: Deadline,
+        on_text: Callable[[str], Awaitable[None] | None],
+    ):
+        """Async variant of _generate_stream."""
+
+        async def request(client: genai.Client, request_config: types.GenerateContentConfig):
+            chunks = await client.aio.models.generate_content_stream(
+                model=model, contents=prompt, config=self._with_deadline(request_config, deadline)
+            )
+            return await self._consume_stream_async(chunks, on_text)
+
+        return await self._cached_async(
+            model, prompt, config, lambda: self._send_async(model, config, request, deadline, CallKind.STREAM)
+        )
+
+    def _send(
+        self,
+        model: str,
+        config: types.GenerateContentConfig,
+        request: Callable[[genai.Client, types.GenerateContentConfig], T],
+        deadline: Deadline,
+        kind: CallKind,
+    ) -> T:
+        """Run request(client, config) through the caller, with the context cache in the primary region.
+
+        A request whose context cache is rejected is re-sent once without it.
         """
+
+        def call(client: genai.Client, primary: bool):
+            # コンテキストキャッシュはリージョンごとのリソースのため、プライマリリージョンでのみ使う
+            request_config = self.context_cache.apply(model, config) if self.context_cache and primary else config
+            try:
+                return request(client, request_config)
+            except errors.ClientError as e:
+                if request_config is config or is_retryable(e):
+                    raise
+                self._drop_context_cache(model, config, e)
+                return request(client, config)
+
+        return self.caller.call(model, call, deadline, kind=kind)
+
+    async def _send_async(
+        self,
+        model: str,
+        config: types.GenerateContentConfig,
+        request: Callable[[genai.Client, types.GenerateContentConfig], Awaitable[T]],
+        deadline: Deadline,
+        kind: CallKind,
+    ) -> T:
+        """Async variant of _send (hedged unless the call is streamed)."""
+
+        async def call(client: genai.Client, primary: bool):
+            request_config = config
+            if self.context_cache and primary:
+                # キャッシュの作成・延長は同期クライアントで行い、トピック間で1つを共有する
+                request_config = await asyncio.to_thread(self.context_cache.apply, model, config)
+            try:
+                return await request(client, request_config)
+            except errors.ClientError as e:
+                if request_config is config or is_retryable(e):
+                    raise
+                self._drop_context_cache(model, config, e)
+                return await request(client, config)
+
+        return await self.caller.call_async(model, call, deadline, hedge=kind is not CallKind.STREAM, kind=kind)
+
+    def _cached(self, model: str, prompt: str, config: types.GenerateContentConfig, generate: Callable[[], T]) -> T:
+        """Serve the response from the response cache, or generate, record and store it."""
+        key, cached = self._cache_lookup(model, prompt, config)
+        if cached is not None:
+            return cached
+        response = generate()
+        self._record_metrics(model, prompt, response)
+        self._cache_store(key, response)
+        return response
+
+    async def _cached_async(
+        self, model: str, prompt: str, config: types.GenerateContentConfig, generate: Callable[[], Awaitable[T]]
+    ) -> T:
+        """Async variant of _cached."""
+        key, cached = self._cache_lookup(model, prompt, config)
+        if cached is not None:
+            return cached
+        response = await generate()
+        self._record_metrics(model, prompt, response)
+        self._cache_store(key, response)
+        return response
+
+    @staticmethod
+    def _consume_stream(chunks, on_text: Callable[[str], None]) -> types.GenerateContentResponse:
+        accumulator = _StreamAccumulator()
+        for chunk in chunks:
+            if accumulator.add(chunk):
+                on_text(accumulator.text)
+        return accumulator.response()
+
+    @staticmethod
+    async def _consume_stream_async(chunks, on_text) -> types.GenerateContentResponse:
+        accumulator = _StreamAccumulator()
+        async for chunk in chunks:
+            if accumulator.add(chunk):
+                result = on_text(accumulator.text)
+                if inspect.isawaitable(result):
+                    await result
+        return accumulator.response()
+
+    def _item_progress(self, on_progress, model: str, stories: list[XNewsStory] | None = None):
+        """Wrap on_progress into an on_text callback for streaming.
+
+        最初のチャンクで（空のリストでも）1度呼び、その後は区切りまで届いた項目が増えたときだけ呼ぶ。
+        grounding の参照元は最後のチャンクまで届かないため、Google Search 経路の途中経過は参照元なしになる。
+        """
+        delivered = -1
+
+        def on_text(text: str):
+            nonlocal delivered
+            items = self._completed_items(text, stories)
+            if len(items) > delivered:
+                delivered = len(items)
+                return on_progress(self._tag_model(items, model))
+            return None
+
+        return on_text
+
+    def _completed_items(self, text: str, stories: list[XNewsStory] | None) -> list[NewsItem]:
+        """Items whose trailing separator has arrived (the last part may still be growing)."""
+        if stories is not None and self.config.structured_output:
+            return self._completed_json_items(text, stories)
+        items = []
+        for part_text in text.split(self.SEPARATOR)[:-1]:
+            part_text = part_text.strip()
+            if not part_text:
+                continue
+            if stories is None:
+                items.append(NewsItem(part_text, []))
+            else:
+                sources = self._extract_sources_by_ref(part_text, stories)
+                items.append(NewsItem(re.sub(r"\s*\[ref:[\d,\s]+\]", "", part_text).strip(), sources))
+        return items
+
+    def _completed_json_items(self, text: str, stories: list[XNewsStory]) -> list[NewsItem]:
+        """Entries of the "items" array that are complete in a partial structured response."""
+        match = re.search(r'"items"\s*:\s*\[', text)
+        if not match:
+            return []
+        decoder = json.JSONDecoder()
+        items, pos = [], match.end()
+        while True:
+            while pos < len(text) and text[pos] in " \t\r\n,":
+                pos += 1
+            if pos >= len(text) or text[pos] != "{":
+                return items
+            try:
+                entry, pos = decoder.raw_decode(text, pos)
+            except ValueError:
+                # まだ閉じていない項目
+                return items
+            item = self._item_from_entry(entry, stories)
+            if item is not None:
+                items.append(item)
+
+    @staticmethod
+    def _tag_model(items: list[NewsItem], model: str) -> list[NewsItem]:
+        for item in items:
+            item.model = model
+        return items
+
+    def _drop_context_cache(self, model: str, config: types.GenerateContentConfig, error: Exception):
+        # キャッシュが期限切れ・削除済みなどで拒否された場合は、キャッシュなしで1度だけ再送する
+        logger.warning(f"Request with context cache was rejected, retrying without it: {error}")
+        self.context_cache.invalidate(model, config)
+
+    def _cache_lookup(
+        self, model: str, prompt: str, config: types.GenerateContentConfig
+    ) -> tuple[str | None, types.GenerateContentResponse | None]:
+        """Return (cache key, cached response). Both are None when caching is disabled."""
+        if self.cache is None:
+            return None, None
+        key = cache_key(model, prompt, config)
+        cached = self.cache.get(key)
+        if cached is not None:
+            logger.info(f"Using cached {model} response ({key[:12]})")
+            metrics.record(metrics.LLM_CACHE_HITS)
+        return key, cached
+
+    def _cache_store(self, key: str | None, response):
+        # 空の応答（安全性フィルタ等）はキャッシュしない
+        if key is None:
+            return
+        try:
+            if not response.text:
+                return
+        except Exception:
+            return
+        self.cache.put(key, response)
+
+    @staticmethod
+    def _record_metrics(model: str, prompt: str, response):
+        """Record prompt/response sizes and token usage for the run report."""
+        metrics.record(metrics.VERTEX_CALLS)
+        metrics.record(metrics.model_calls(model))
+        metrics.record(metrics.PROMPT_CHARS, len(prompt))
+        try:
+            metrics.record(metrics.RESPONSE_CHARS, len(response.text or ""))
+        except Exception:
+            pass
+        usage = getattr(response, "usage_metadata", None)
+        metrics.record_usage(usage)
+        if usage is not None and usage.prompt_token_count:
+            cached = usage.cached_content_token_count or 0
+            logger.info(
+                f"{model} usage: {usage.prompt_token_count} prompt tokens, "
+                f"{cached} cached ({cached / usage.prompt_token_count:.0%})"
+            )
+
+    def _build_news_prompt(self, topic: str, exclude_urls: list[str] | None) -> str:
+        """Render the Google Search grounding prompt."""
         exclude_section = ""
         if exclude_urls:
             urls_text = "\n".join(f"- {url}" for url in exclude_urls)
             exclude_section = EXCLUDE_SECTION_TEMPLATE.format(urls=urls_text)
 
-        zundamon, ankomon, metan, kiritan = self._character_names()
+        return PROMPT_TEMPLATE.format(topic=topic, exclude_section=exclude_section)
 
-        prompt = PROMPT_TEMPLATE.format(
-            topic=topic,
-            exclude_section=exclude_section,
+    def _system_instruction(self, rules: str) -> str:
+        """Render the static persona / format block shared by every topic."""
+        zundamon, ankomon, metan, kiritan = self._character_names()
+        return PERSONA_TEMPLATE.format(
+            rules=rules,
             zundamon=zundamon,
             ankomon=ankomon,
             metan=metan,
             kiritan=kiritan,
         )
 
-        logger.info(f"Fetching news for topic: {topic}")
-        logger.info(f"Using model: {self.config.model_name}")
-
-        response = self.client.models.generate_content(
-            model=self.config.model_name,
-            contents=prompt,
-            config=types.GenerateContentConfig(
-                tools=[types.Tool(google_search=types.GoogleSearch())],
-                temperature=0.2,
-            ),
+    def _news_generation_config(self) -> types.GenerateContentConfig:
+        return types.GenerateContentConfig(
+            system_instruction=self._system_instruction(NEWS_RULES),
+            tools=[types.Tool(google_search=types.GoogleSearch())],
+            temperature=0.2,
         )
 
+    def _handle_news_response(self, response) -> list[NewsItem]:
+        """Convert a grounded response into NewsItems."""
         logger.info("Successfully received response from Vertex AI")
         logger.debug(f"Response candidates: {response.candidates}")
 
@@ -263,20 +827,191 @@ class NewsCurator:
         chunks, supports = self._extract_grounding_metadata(response)
 
         # 各ニュース項目を構造化
-        items = self._parse_news_items(response.text, chunks, supports)
+        return self._parse_news_items(response.text, chunks, supports)
+
+    def _topic_model(
+        self,
+        deadline: Deadline | None,
+        priority: TopicPriority,
+        on_progress: ProgressCallback | AsyncProgressCallback | None,
+        batch_queue: BatchPredictionQueue | None,
+    ) -> str:
+        """Pick the generation model for a single topic's request."""
+        # バッチ予測は時間予算に左右されないため、常に MODEL_NAME を使う
+        model = self.config.model_name
+        if batch_queue is None:
+            kind = CallKind.SOLO if on_progress is None else CallKind.STREAM
+            model = self.router.generation_model(deadline or NO_DEADLINE, priority, kind)
+        logger.info(f"Using model: {model}")
+        return model
+
+    def _generate_topic(
+        self,
+        model: str,
+        prompt: str,
+        config: types.GenerateContentConfig,
+        deadline: Deadline | None,
+        on_progress: ProgressCallback | None,
+        batch_queue: BatchPredictionQueue | None,
+        stories: list[XNewsStory] | None = None,
+    ):
+        """Generate a single topic's response: in a batch prediction job, streamed, or in one call."""
+        deadline = deadline or NO_DEADLINE
+        if batch_queue is not None:
+            return self._generate_batched(batch_queue, model, prompt, config, deadline)
+        if on_progress is not None:
+            return self._generate_stream(
+                model, prompt, config, deadline, self._item_progress(on_progress, model, stories)
+            )
+        return self._generate(model, prompt, config, deadline)
+
+    async def _generate_topic_async(
+        self,
+        model: str,
+        prompt: str,
+        config: types.GenerateContentConfig,
+        deadline: Deadline | None,
+        on_progress: AsyncProgressCallback | None,
+        batch_queue: BatchPredictionQueue | None,
+        stories: list[XNewsStory] | None = None,
+    ):
+        """Async variant of _generate_topic."""
+        deadline = deadline or NO_DEADLINE
+        if batch_queue is not None:
+            return await self._generate_batched_async(batch_queue, model, prompt, config, deadline)
+        if on_progress is not None:
+            return await self._generate_stream_async(
+                model, prompt, config, deadline, self._item_progress(on_progress, model, stories)
+            )
+        return await self._generate_async(model, prompt, config, deadline)
 
-        return items
+    def fetch_news(
+        self,
+        topic: str,
+        exclude_urls: list[str] | None = None,
+        deadline: Deadline | None = None,
+        on_progress: ProgressCallback | None = None,
+        batch_queue: BatchPredictionQueue | None = None,
+        priority: TopicPriority = TopicPriority.NORMAL,
+    ) -> list[NewsItem]:
+        """Fetch news using Google Search grounding.
+
+        Args:
+            topic: The topic to search for news.
+            exclude_urls: List of news URLs to exclude (already reported).
+            deadline: Time budget for the Vertex AI call.
+            on_progress: When given, the response is streamed and this is
+                called with the items completed so far (without sources).
+            batch_queue: When given, the request is sent as part of a batch
+                prediction job instead (on_progress is ignored).
+            priority: Topic priority for model routing (see ModelRouter).
+
+        Returns:
+            List of NewsItem objects with text and sources.
+        """
+        prompt = self._build_news_prompt(topic, exclude_urls)
+        logger.info(f"Fetching news for topic: {topic}")
+        model = self._topic_model(deadline, priority, on_progress, batch_queue)
+        response = self._generate_topic(
+            model, prompt, self._news_generation_config(), deadline, on_progress, batch_queue
+        )
+        return self._tag_model(self._handle_news_response(response), model)
+
+    async def fetch_news_async(
+        self,
+        topic: str,
+        exclude_urls: list[str] | None = None,
+        deadline: Deadline | None = None,
+        on_progress: AsyncProgressCallback | None = None,
+        batch_queue: BatchPredictionQueue | None = None,
+        priority: TopicPriority = TopicPriority.NORMAL,
+    ) -> list[NewsItem]:
+        """Async variant of fetch_news."""
+        prompt = self._build_news_prompt(topic, exclude_urls)
+        logger.info(f"Fetching news for topic: {topic}")
+        model = self._topic_model(deadline, priority, on_progress, batch_queue)
+        response = await self._generate_topic_async(
+            model, prompt, self._news_generation_config(), deadline, on_progress, batch_queue
+        )
+        return self._tag_model(self._handle_news_response(response), model)
+
+    # フィルタ結果が空の場合（またはフィルタを省略した場合）に使う先頭ストーリー数
+    FILTER_FALLBACK_COUNT = 5
+
+    def _build_filter_prompt(self, topic: str, stories: list[XNewsStory]) -> str:
+        # 選定はポスト本文とリンクのプレビューだけで行う（リンク先は選定後に取得する）
+        articles_text = "\n\n".join(
+            story.to_prompt_text(i + 1, include_pages=False) for i, story in enumerate(stories)
+        )
+        return PROMPT_FILTER_TEMPLATE.format(topic=topic, articles=articles_text)
+
+    def _filter_generation_config(self) -> types.GenerateContentConfig:
+        return types.GenerateContentConfig(system_instruction=FILTER_INSTRUCTION, temperature=0.0)
+
+    def prerank_stories(self, query: str, stories: list[XNewsStory]) -> PreRanking:
+        """Locally pre-rank stories before filter_stories (see story_ranking.prerank).
+
+        FILTER_CANDIDATES が 0 の場合は全ストーリーを元の順序のまま候補とする。
+        """
+        if self.config.filter_candidates < 1:
+            return PreRanking(candidates=list(stories))
+        ranking = prerank(stories, query, self.config.filter_candidates, self.FILTER_FALLBACK_COUNT)
+        if ranking.winners or ranking.dropped:
+            logger.info(
+                f"Pre-ranking: {len(ranking.winners)} selected, {len(ranking.candidates)} left for the filter, "
+                f"{len(ranking.dropped)} dropped (of {len(stories)})"
+            )
+        metrics.record(metrics.STORIES_PRERANK_DROPPED, len(ranking.dropped))
+        return ranking
+
+    def _filter_decided(self, ranking: PreRanking) -> bool:
+        """Whether the pre-ranking alone settles the selection (no LLM call needed)."""
+        if len(ranking.winners) >= self.FILTER_FALLBACK_COUNT or not ranking.candidates:
+            logger.info(f"Skipping filter LLM: pre-ranking selected {len(ranking.winners)} stories")
+            metrics.record(metrics.FILTER_SKIPPED)
+            return True
+        return False
+
+    def _handle_filter_response(self, response, ranking: PreRanking) -> list[XNewsStory]:
+        """Pick the stories whose indices were returned by the filter model.
+
+        事前ランキングで採用済みのストーリーを先頭に置き、LLM が選んだ候補を続ける。
+        """
+        stories = ranking.candidates
+        # レスポンスから番号を抽出
+        selected_indices = []
+        for token in response.text.strip().split(","):
+            token = token.strip()
+            if token.isdigit():
+                idx = int(token)
+                if 1 <= idx <= len(stories):
+                    selected_indices.append(idx - 1)
 
-    FILTER_MODEL = "gemini-2.5-flash"
+        filtered = [stories[i] for i in selected_indices]
+        logger.info(f"Selected {len(filtered)} newsworthy stories from {len(stories)}")
+
+        if not filtered and not ranking.winners:
+            return stories[: self.FILTER_FALLBACK_COUNT]  # フォールバック
+        return ranking.winners + filtered
 
     def filter_stories(
-        self, topic: str, stories: list[XNewsStory]
+        self,
+        topic: str,
+        stories: list[XNewsStory],
+        deadline: Deadline | None = None,
+        query: str | None = None,
     ) -> list[XNewsStory]:
         """Filter stories by relevance using a lightweight LLM.
 
+        Stories are pre-ranked locally first: only the top FILTER_CANDIDATES
+        reach the prompt, and the LLM call is skipped when the pre-ranking
+        already settles the selection.
+
         Args:
             topic: The topic name.
             stories: Candidate stories to evaluate.
+            deadline: Time budget for the Vertex AI call.
+            query: The topic's search query for keyword scoring (defaults to topic).
 
         Returns:
             Filtered list of newsworthy stories.
@@ -284,33 +1019,233 @@ class NewsCurator:
         if not stories:
             return stories
 
+        ranking = self.prerank_stories(query or topic, stories)
+        if self._filter_decided(ranking):
+            return ranking.winners
+        prompt = self._build_filter_prompt(topic, ranking.candidates)
+
+        model = self.router.filter_model()
+        logger.info(f"Filtering {len(ranking.candidates)} stories for relevance (model: {model})")
+
+        response = self._generate(
+            model,
+            prompt,
+            self._filter_generation_config(),
+            deadline or NO_DEADLINE,
+        )
+        return self._handle_filter_response(response, ranking)
+
+    async def filter_stories_async(
+        self,
+        topic: str,
+        stories: list[XNewsStory],
+        deadline: Deadline | None = None,
+        query: str | None = None,
+    ) -> list[XNewsStory]:
+        """Async variant of filter_stories."""
+        if not stories:
+            return stories
+
+        ranking = self.prerank_stories(query or topic, stories)
+        if self._filter_decided(ranking):
+            return ranking.winners
+        prompt = self._build_filter_prompt(topic, ranking.candidates)
+
+        model = self.router.filter_model()
+        logger.info(f"Filtering {len(ranking.candidates)} stories for relevance (model: {model})")
+
+        response = await self._generate_async(
+            model,
+            prompt,
+            self._filter_generation_config(),
+            deadline or NO_DEADLINE,
+        )
+        return self._handle_filter_response(response, ranking)
+
+    def pack_stories(self, stories: list[XNewsStory]) -> list[XNewsStory]:
+        """Trim or drop stories so their prompt text fits ARTICLES_MAX_TOKENS.
+
+        Stories are assumed to be in priority order (highest first), as
+        returned by filter_stories. Page text goes preferentially to the
+        higher ranked stories and the lowest ranked ones are dropped.
+        """
+        packed, trimmed, dropped = _pack_stories(stories, self.config.articles_max_tokens)
+        if trimmed or dropped:
+            tokens = estimate_tokens("\n\n".join(story.to_prompt_text(i + 1) for i, story in enumerate(packed)))
+            logger.info(
+                f"Packed {len(packed)}/{len(stories)} stories into ~{tokens} tokens "
+                f"(budget {self.config.articles_max_tokens}): trimmed ~{trimmed} page tokens, dropped {dropped} stories"
+            )
+            metrics.record(metrics.PAGE_TOKENS_TRIMMED, trimmed)
+            metrics.record(metrics.STORIES_DROPPED, dropped)
+        return packed
+
+    def _build_articles_prompt(self, topic: str, stories: list[XNewsStory]) -> str:
+        """Render the dialogue prompt for pre-fetched X News stories."""
         articles_text = "\n\n".join(story.to_prompt_text(i + 1) for i, story in enumerate(stories))
-        prompt = PROMPT_FILTER_TEMPLATE.format(topic=topic, articles=articles_text)
+        return PROMPT_WITH_ARTICLES_TEMPLATE.format(topic=topic, articles=articles_text)
 
-        logger.info(f"Filtering {len(stories)} stories for relevance (model: {self.FILTER_MODEL})")
+    def _prepare_articles(self, topic: str, stories: list[XNewsStory]) -> tuple[list[XNewsStory], str]:
+        """Pack the stories and render their prompt; returns (packed stories, prompt)."""
+        stories = self.pack_stories(stories)
+        logger.info(f"Formatting {len(stories)} X News stories for topic: {topic}")
+        return stories, self._build_articles_prompt(topic, stories)
 
-        response = self.client.models.generate_content(
-            model=self.FILTER_MODEL,
-            contents=prompt,
-            config=types.GenerateContentConfig(temperature=0.0),
+    def _build_batch_section(self, index: int, topic: str, stories: list[XNewsStory]) -> str:
+        articles_text = "\n\n".join(story.to_prompt_text(i + 1) for i, story in enumerate(stories))
+        return BATCH_SECTION_TEMPLATE.format(index=index, topic=topic, articles=articles_text)
+
+    def estimate_articles_tokens(self, topic: str, stories: list[XNewsStory]) -> int:
+        """Approximate prompt tokens a topic adds to a batched request (after packing)."""
+        packed, _, _ = _pack_stories(stories, self.config.articles_max_tokens)
+        return estimate_tokens(self._build_batch_section(1, topic, packed))
+
+    def _build_batch_prompt(self, requests: list[tuple[str, list[XNewsStory]]]) -> str:
+        sections = "\n\n".join(
+            self._build_batch_section(i + 1, topic, stories) for i, (topic, stories) in enumerate(requests)
         )
+        template = PROMPT_BATCH_JSON_TEMPLATE if self.config.structured_output else PROMPT_BATCH_TEMPLATE
+        return template.format(count=len(requests), sections=sections)
+
+    def _prepare_batch(
+        self, requests: list[tuple[str, list[XNewsStory]]], deadline: Deadline | None, priority: TopicPriority
+    ) -> tuple[list[tuple[str, list[XNewsStory]]], str, str]:
+        """Pack each topic's stories and pick the model; returns (packed requests, model, prompt)."""
+        requests = [(topic, self.pack_stories(stories)) for topic, stories in requests]
+        model = self.router.generation_model(deadline or NO_DEADLINE, priority, CallKind.BATCHED)
+        logger.info(f"Formatting {len(requests)} topics in one request ({model}): {', '.join(t for t, _ in requests)}")
+        return requests, model, self._build_batch_prompt(requests)
+
+    def _handle_batch_response(
+        self, response, requests: list[tuple[str, list[XNewsStory]]], model: str
+    ) -> list[list[NewsItem] | None]:
+        """Split a batched response into per-topic items (None for missing sections)."""
+        text = response.text or ""
+        if self.config.structured_output:
+            sections = self._json_batch_sections(text, len(requests))
+        else:
+            sections = self._text_batch_sections(text, len(requests))
+
+        results: list[list[NewsItem] | None] = []
+        for index, (topic, stories) in enumerate(requests):
+            body = sections.get(index)
+            if body is None:
+                logger.warning(f"Batched response has no section for topic: {topic}")
+                results.append(None)
+            elif isinstance(body, dict):
+                results.append(self._tag_model(self._items_from_json(body, stories), model))
+            else:
+                results.append(self._tag_model(self._parse_x_news_items(body, stories), model))
+        logger.info(f"Split batched response into {len(sections)}/{len(requests)} topic sections")
+        return results
+
+    def _text_batch_sections(self, text: str, count: int) -> dict[int, str]:
+        sections: dict[int, str] = {}
+        # re.split はキャプチャした番号と本文を交互に返す（先頭は最初の見出しより前の部分）
+        parts = BATCH_SECTION_PATTERN.split(text)
+        for number, body in zip(parts[1::2], parts[2::2]):
+            index = int(number) - 1
+            body = body.strip()
+            # 次のトピックの見出しの直前に区切りがあっても、まとめを感想セクションとして扱えるよう取り除く
+            while body.endswith(self.SEPARATOR):
+                body = body[: -len(self.SEPARATOR)].strip()
+            if 0 <= index < count and body and index not in sections:
+                sections[index] = body
+        return sections
+
+    @staticmethod
+    def _json_batch_sections(text: str, count: int) -> dict[int, dict]:
+        sections: dict[int, dict] = {}
+        try:
+            data = json.loads(text)
+        except json.JSONDecodeError as e:
+            logger.warning(f"Batched structured response is not valid JSON: {e}")
+            return sections
+        if not isinstance(data, dict):
+            return sections
+        for section in data.get("topics") or []:
+            if not isinstance(section, dict) or not isinstance(section.get("topic"), int):
+                continue
+            index = section["topic"] - 1
+            if 0 <= index < count and section.get("items") and index not in sections:
+                sections[index] = section
+        return sections
 
-        # レスポンスから番号を抽出
-        selected_indices = []
-        for token in response.text.strip().split(","):
-            token = token.strip()
-            if token.isdigit():
-                idx = int(token)
-                if 1 <= idx <= len(stories):
-                    selected_indices.append(idx - 1)
+    def fetch_news_from_articles_batch(
+        self,
+        requests: list[tuple[str, list[XNewsStory]]],
+        deadline: Deadline | None = None,
+        priority: TopicPriority = TopicPriority.NORMAL,
+    ) -> list[list[NewsItem] | None]:
+        """Format stories of several topics in a single LLM call.
 
-        filtered = [stories[i] for i in selected_indices]
-        logger.info(f"Selected {len(filtered)} newsworthy stories from {len(stories)}")
+        The shared persona prompt is sent once for the whole batch.
 
-        return filtered if filtered else stories[:5]  # フォールバック
+        Args:
+            requests: (topic name, stories) per topic.
+            deadline: Time budget for the Vertex AI call.
+            priority: Highest priority among the topics, for model routing.
+
+        Returns:
+            NewsItems per topic, in request order. None for a topic whose
+            section is missing from the response (format it on its own).
+        """
+        requests, model, prompt = self._prepare_batch(requests, deadline, priority)
+        response = self._generate(
+            model,
+            prompt,
+            self._articles_generation_config(batched=True),
+            deadline or NO_DEADLINE,
+            CallKind.BATCHED,
+        )
+        return self._handle_batch_response(response, requests, model)
+
+    async def fetch_news_from_articles_batch_async(
+        self,
+        requests: list[tuple[str, list[XNewsStory]]],
+        deadline: Deadline | None = None,
+        priority: TopicPriority = TopicPriority.NORMAL,
+    ) -> list[list[NewsItem] | None]:
+        """Async variant of fetch_news_from_articles_batch."""
+        requests, model, prompt = self._prepare_batch(requests, deadline, priority)
+        response = await self._generate_async(
+            model,
+            prompt,
+            self._articles_generation_config(batched=True),
+            deadline or NO_DEADLINE,
+            CallKind.BATCHED,
+        )
+        return self._handle_batch_response(response, requests, model)
+
+    def _articles_generation_config(self, batched: bool = False) -> types.GenerateContentConfig:
+        if not self.config.structured_output:
+            return types.GenerateContentConfig(
+                system_instruction=self._system_instruction(ARTICLES_RULES),
+                temperature=0.2,
+            )
+        return types.GenerateContentConfig(
+            system_instruction=self._system_instruction(ARTICLES_JSON_RULES),
+            temperature=0.2,
+            response_mime_type="application/json",
+            response_schema=BATCH_SCHEMA if batched else ARTICLES_SCHEMA,
+        )
+
+    def _handle_articles_response(self, response, stories: list[XNewsStory]) -> list[NewsItem]:
+        logger.info("Successfully received response from Vertex AI")
+
+        if self.config.structured_output:
+            return self._parse_structured_items(response.text, stories)
+        # [ref:N] タグを使って各ニュース項目にツイートのソースを付与してからテキストをクリーン化
+        return self._parse_x_news_items(response.text, stories)
 
     def fetch_news_from_articles(
-        self, topic: str, stories: list[XNewsStory]
+        self,
+        topic: str,
+        stories: list[XNewsStory],
+        deadline: Deadline | None = None,
+        on_progress: ProgressCallback | None = None,
+        batch_queue: BatchPredictionQueue | None = None,
+        priority: TopicPriority = TopicPriority.NORMAL,
     ) -> list[NewsItem]:
         """Format pre-fetched X News stories into NewsItems using LLM.
 
@@ -319,37 +1254,41 @@ class NewsCurator:
 
         Args:
             topic: The topic name (for prompt context).
-            stories: List of XNewsStory objects fetched from X News API.
+            stories: List of XNewsStory objects fetched from X News API, in
+                priority order (packed to ARTICLES_MAX_TOKENS first).
+            deadline: Time budget for the Vertex AI call.
+            on_progress: When given, the response is streamed and this is
+                called with the items completed so far.
+            batch_queue: When given, the request is sent as part of a batch
+                prediction job instead (on_progress is ignored).
+            priority: Topic priority for model routing (see ModelRouter).
 
         Returns:
             List of NewsItem objects with text (no grounding sources).
         """
-        articles_text = "\n\n".join(story.to_prompt_text(i + 1) for i, story in enumerate(stories))
-        zundamon, ankomon, metan, kiritan = self._character_names()
-
-        prompt = PROMPT_WITH_ARTICLES_TEMPLATE.format(
-            topic=topic,
-            articles=articles_text,
-            zundamon=zundamon,
-            ankomon=ankomon,
-            metan=metan,
-            kiritan=kiritan,
+        stories, prompt = self._prepare_articles(topic, stories)
+        model = self._topic_model(deadline, priority, on_progress, batch_queue)
+        response = self._generate_topic(
+            model, prompt, self._articles_generation_config(), deadline, on_progress, batch_queue, stories
         )
-
-        logger.info(f"Formatting {len(stories)} X News stories for topic: {topic}")
-        logger.info(f"Using model: {self.config.model_name}")
-
-        response = self.client.models.generate_content(
-            model=self.config.model_name,
-            contents=prompt,
-            config=types.GenerateContentConfig(temperature=0.2),
+        return self._tag_model(self._handle_articles_response(response, stories), model)
+
+    async def fetch_news_from_articles_async(
+        self,
+        topic: str,
+        stories: list[XNewsStory],
+        deadline: Deadline | None = None,
+        on_progress: AsyncProgressCallback | None = None,
+        batch_queue: BatchPredictionQueue | None = None,
+        priority: TopicPriority = TopicPriority.NORMAL,
+    ) -> list[NewsItem]:
+        """Async variant of fetch_news_from_articles."""
+        stories, prompt = self._prepare_articles(topic, stories)
+        model = self._topic_model(deadline, priority, on_progress, batch_queue)
+        response = await self._generate_topic_async(
+            model, prompt, self._articles_generation_config(), deadline, on_progress, batch_queue, stories
         )
-
-        logger.info("Successfully received response from Vertex AI")
-
-        # [ref:N] タグを使って各ニュース項目にツイートのソースを付与してからテキストをクリーン化
-        items = self._parse_x_news_items(response.text, stories)
-        return items
+        return self._tag_model(self._handle_articles_response(response, stories), model)
 
     def _parse_x_news_items(
         self, text: str, stories: list[XNewsStory]
@@ -374,6 +1313,59 @@ class NewsCurator:
 
         return items
 
+    def _parse_structured_items(self, text: str, stories: list[XNewsStory]) -> list[NewsItem]:
+        """Decode a response generated with ARTICLES_SCHEMA into NewsItems.
+
+        A response that is not a JSON object (e.g. free text written despite
+        the schema) is parsed as text with _parse_x_news_items instead.
+        """
+        try:
+            data = json.loads(text)
+        except json.JSONDecodeError as e:
+            logger.warning(f"Structured response is not valid JSON, parsing it as text: {e}")
+            return self._parse_x_news_items(text, stories)
+        if not isinstance(data, dict):
+            logger.warning(f"Structured response is not an object ({type(data).__name__}), parsing it as text")
+            return self._parse_x_news_items(text, stories)
+        return self._items_from_json(data, stories)
+
+    def _items_from_json(self, data: dict, stories: list[XNewsStory]) -> list[NewsItem]:
+        items = []
+        for entry in data.get("items") or []:
+            item = self._item_from_entry(entry, stories)
+            if item is not None:
+                items.append(item)
+        summary = self._render_lines(data.get("summary"))
+        if summary:
+            items.append(NewsItem(f"{SUMMARY_HEADING}\n{summary}", [], is_impression=True))
+        return items
+
+    def _item_from_entry(self, entry, stories: list[XNewsStory]) -> NewsItem | None:
+        """NewsItem of a structured entry (None when it has neither a title nor any line)."""
+        if not isinstance(entry, dict):
+            return None
+        text = self._render_entry(entry)
+        if not text:
+            return None
+        return NewsItem(text, self._sources_by_indices(entry.get("refs"), stories))
+
+    def _render_entry(self, entry: dict) -> str:
+        """Render a structured news entry as the Slack mrkdwn text of the free-text format."""
+        title = str(entry.get("title") or "").strip().strip("*").strip()
+        lines = self._render_lines(entry.get("lines"))
+        return "\n\n".join(part for part in (f"*{title}*" if title else "", lines) if part)
+
+    @staticmethod
+    def _render_lines(lines) -> str:
+        rendered = []
+        for line in lines or []:
+            if not isinstance(line, dict) or not str(line.get("text") or "").strip():
+                continue
+            speaker = str(line.get("speaker") or "").strip()
+            text = str(line["text"]).strip()
+            rendered.append(f"{speaker}: {text}" if speaker else text)
+        return "\n".join(rendered)
+
     MAX_REFS_PER_ITEM = 3
 
     def _extract_sources_by_ref(
@@ -387,12 +1379,16 @@ class NewsCurator:
         if not match:
             return []
         indices = [int(n.strip()) for n in match.group(1).split(",") if n.strip().isdigit()]
+        return self._sources_by_indices(indices, stories)
+
+    def _sources_by_indices(self, indices: list[int] | None, stories: list[XNewsStory]) -> list[dict]:
+        """Sources of the 1-based story indices, limited to MAX_REFS_PER_ITEM posts."""
         sources = []
         seen = set()
-        for idx in indices:
+        for idx in indices or []:
             if len(seen) >= self.MAX_REFS_PER_ITEM:
                 break
-            if 1 <= idx <= len(stories):
+            if isinstance(idx, int) and 1 <= idx <= len(stories):
                 story = stories[idx - 1]
                 if story.tweet_id not in seen:
                     seen.add(story.tweet_id)
@@ -403,73 +1399,113 @@ class NewsCurator:
         self, text: str, chunks: list[dict], supports: list[dict]
     ) -> list[NewsItem]:
         """Parse LLM output into structured NewsItem objects."""
-        parts = text.split(self.SEPARATOR)
+        spans = _part_spans(text, self.SEPARATOR)
 
-        if len(parts) <= 1:
-            # 区切りがない場合は全体を1つの項目として扱う
-            all_sources = self._dedupe_sources(chunks)
-            return [NewsItem(text, all_sources)]
+        if len(spans) <= 1:
+            # 区切りがない場合は全体を1つの項目として扱う（裏付けのないチャンクも最下位で残す）
+            scores: dict[int, list[float | None]] = {idx: [] for idx in range(len(chunks))}
+            for support in supports:
+                for idx, score in self._support_scores(support, chunks):
+                    scores[idx].append(score)
+            return [NewsItem(text, self._rank_sources(chunks, scores))]
+
+        # このパートに対応するソースを収集
+        part_scores = self._attribute_supports(text, spans, chunks, supports)
 
         items = []
-        for i, part_text in enumerate(parts):
-            part_text = part_text.strip()
+        for i, (part_text, _, _) in enumerate(spans):
             if not part_text:
                 continue
 
-            # 最後のパートは感想セクション
-            is_last_part = i == len(parts) - 1
-            is_impression = is_last_part
-
-            # このパートに対応するソースを収集
-            sources = self._find_sources_for_part(part_text, chunks, supports)
-
-            # 感想セクションには参照元を追加しない
-            if is_impression:
-                sources = []
-
+            # 最後のパートは感想セクション（参照元を追加しない）
+            is_impression = i == len(spans) - 1
+            sources = [] if is_impression else self._rank_sources(chunks, part_scores[i])
             items.append(NewsItem(part_text, sources, is_impression))
 
         return items
 
-    def _find_sources_for_part(
-        self, part_text: str, chunks: list[dict], supports: list[dict]
-    ) -> list[dict]:
-        """Find sources that match the given part text."""
-        source_indices = set()
+    def _attribute_supports(
+        self, text: str, spans: list[tuple[str, int, int]], chunks: list[dict], supports: list[dict]
+    ) -> list[dict[int, list[float | None]]]:
+        """Confidence scores of the grounding chunks supporting each part, located by the segments' byte offsets.
+
+        パートの開始位置の二分探索でセグメントが重なるパートを求める。オフセットがない・本文と一致しない
+        セグメントだけ、従来どおりセグメントのテキストがパートに含まれるかで判定する。
+        """
+        encoded = text.encode("utf-8")
+        starts = [start for _, start, _ in spans]
+        part_scores: list[dict[int, list[float | None]]] = [{} for _ in spans]
         for support in supports:
-            segment = support.get("segment", {})
-            seg_text = segment.get("text", "")
+            chunk_scores = self._support_scores(support, chunks)
+            if not chunk_scores:
+                continue
+            segment = support.get("segment") or {}
+            for i in self._segment_parts(segment, encoded, spans, starts):
+                for idx, score in chunk_scores:
+                    part_scores[i].setdefault(idx, []).append(score)
+        return part_scores
+
+    @staticmethod
+    def _support_scores(support: dict, chunks: list[dict]) -> list[tuple[int, float | None]]:
+        """(chunk index, confidence) pairs of a support. The confidence is None when the API returned none."""
+        scores = list(support.get("confidence_scores") or [])
+        return [
+            (idx, scores[n] if n < len(scores) else None)
+            for n, idx in enumerate(support.get("chunk_indices") or [])
+            if idx < len(chunks)
+        ]
+
+    def _segment_parts(
+        self, segment: dict, encoded: bytes, spans: list[tuple[str, int, int]], starts: list[int]
+    ) -> list[int]:
+        """Indices of the parts a grounding segment overlaps."""
+        start, end = segment.get("start_index") or 0, segment.get("end_index")
+        seg_text = segment.get("text") or ""
+        if end is not None and 0 <= start < end <= len(encoded):
+            located = encoded[start:end].decode("utf-8", errors="ignore")
+            if not seg_text or located.strip() == seg_text.strip():
+                parts = []
+                i = max(bisect.bisect_right(starts, start) - 1, 0)
+                while i < len(spans) and spans[i][1] < end:
+                    if spans[i][0] and spans[i][2] > start:
+                        parts.append(i)
+                    i += 1
+                return parts
+
+        # オフセットが使えない場合はテキストの包含で判定する
+        if len(seg_text) <= self.MIN_SEGMENT_TEXT_LENGTH:
+            return []
+        return [i for i, (part_text, _, _) in enumerate(spans) if seg_text in part_text]
 
-            # セグメントのテキストがこのパートに含まれるか確認
-            if seg_text and len(seg_text) > self.MIN_SEGMENT_TEXT_LENGTH and seg_text in part_text:
-                for idx in support.get("chunk_indices", []):
-                    if idx < len(chunks):
-                        source_indices.add(idx)
+    def _rank_sources(self, chunks: list[dict], scores: dict[int, list[float | None]]) -> list[dict]:
+        """Sources of an item ranked by aggregated confidence, capped at MAX_SOURCES_PER_ITEM.
 
-        # URIで重複排除
-        seen_uris = set()
-        sources = []
-        for idx in sorted(source_indices):
-            chunk = chunks[idx]
-            uri = chunk.get("uri", "")
-            if not uri or uri in seen_uris:
+        最大の信頼度が SOURCE_MIN_CONFIDENCE 未満のチャンクは落とす。順位は信頼度の合計
+        （複数のセグメントで裏付けられたものほど上位）で、信頼度が返らなかった裏付けは1件 1.0 として数える。
+        """
+        ranked = []
+        dropped = 0
+        for idx, values in scores.items():
+            known = [value for value in values if value is not None]
+            if known and max(known) < self.config.source_min_confidence:
+                dropped += 1
                 continue
-            seen_uris.add(uri)
-            sources.append(chunk)
-
-        return sources
+            ranked.append((-sum(1.0 if value is None else value for value in values), idx))
 
-    def _dedupe_sources(self, chunks: list[dict]) -> list[dict]:
-        """Deduplicate sources by URI."""
+        # URIで重複排除（信頼度の高い方を残す）
         seen_uris = set()
         sources = []
-        for chunk in chunks:
+        for _, idx in sorted(ranked):
+            chunk = chunks[idx]
             uri = chunk.get("uri", "")
             if not uri or uri in seen_uris:
                 continue
             seen_uris.add(uri)
             sources.append(chunk)
-        return sources
+
+        capped = sources[: self.config.max_sources_per_item]
+        metrics.record(metrics.GROUNDING_SOURCES_DROPPED, dropped + len(sources) - len(capped))
+        return capped
 
     def _extract_grounding_metadata(self, response) -> tuple[list[dict], list[dict]]:
         """Extract grounding chunks and supports from response metadata."""
@@ -479,6 +1515,8 @@ class NewsCurator:
             for candidate in response.candidates:
                 if hasattr(candidate, "grounding_metadata") and candidate.grounding_metadata:
                     metadata = candidate.grounding_metadata
+                    # segment のオフセットはパート内の位置のため、連結後の本文（response.text）での位置に直す
+                    part_offsets = _text_part_offsets(candidate)
 
                     # Extract grounding chunks
                     if hasattr(metadata, "grounding_chunks") and metadata.grounding_chunks:
@@ -498,9 +1536,12 @@ class NewsCurator:
                                 "confidence_scores": getattr(support, "confidence_scores", []),
                             }
                             if segment:
+                                part_index = getattr(segment, "part_index", None) or 0
+                                base = part_offsets[part_index] if part_index < len(part_offsets) else 0
+                                end_index = getattr(segment, "end_index", None)
                                 support_data["segment"] = {
-                                    "start_index": getattr(segment, "start_index", 0),
-                                    "end_index": getattr(segment, "end_index", 0),
+                                    "start_index": base + (getattr(segment, "start_index", None) or 0),
+                                    "end_index": None if end_index is None else base + end_index,
                                     "text": getattr(segment, "text", ""),
                                 }
                             supports.append(support_data)
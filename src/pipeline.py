@@ -0,0 +1,991 @@
+import asyncio
+import contextvars
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass, field
+
+import aiohttp
+from slack_sdk import WebClient
+from slack_sdk.web.async_client import AsyncWebClient
+
+from . import metrics
+from .batch_prediction import BatchPredictionQueue, VertexBatchPredictionClient
+from .batching import AsyncGenerationBatcher, GenerationBatcher
+from .checkpoint import (
+    STAGE_ITEMS,
+    STAGE_POSTED,
+    STAGE_RECENT_URLS,
+    STAGE_STORIES,
+    STAGE_STREAM_TS,
+    CheckpointStore,
+    TopicCheckpoint,
+)
+from .config import Config, NewsSource, TopicConfig
+from .deadline import NO_DEADLINE, Deadline, DeadlineExceeded
+from .news_curator import NewsCurator, NewsItem
+from .slack_poster import SlackPoster
+from .x_news_client import XNewsClient, XNewsStory, exclude_posted
+
+logger = logging.getLogger(__name__)
+
+X_SEARCH_MAX_RESULTS = 50
+
+# 時間予算が足りなくなったときは ページ取得の省略 → filter_stories の省略 → トピック中止 の順で縮退する。
+# 各段階の想定所要時間（秒）
+POST_RESERVE_SECONDS = 10
+GENERATION_MIN_SECONDS = 20
+GENERATION_STAGE_SECONDS = 60
+FILTER_STAGE_SECONDS = 15
+PAGE_FETCH_STAGE_SECONDS = 15
+
+# 生成・投稿に最低限必要な残り時間（これを下回るとトピックを中止する）
+ABORT_THRESHOLD = GENERATION_MIN_SECONDS + POST_RESERVE_SECONDS
+# 以下はどちらも filter_stories の前の残り時間で判定する（ページ取得は filter_stories の後に行うため、その分も含める）
+# filter_stories を実行するのに必要な残り時間
+FILTER_THRESHOLD = FILTER_STAGE_SECONDS + GENERATION_STAGE_SECONDS + POST_RESERVE_SECONDS
+# リンク先ページ取得（filter_stories で選んだストーリーのみ）を行うのに必要な残り時間
+PAGE_FETCH_THRESHOLD = PAGE_FETCH_STAGE_SECONDS + FILTER_THRESHOLD
+
+
+@dataclass
+class TopicResult:
+    """Outcome of processing a single topic."""
+
+    topic: str
+    success: bool
+    error: str | None = None
+
+
+@dataclass
+class _TopicRun:
+    """State shared by the topics of one run_topics / run_topics_async call."""
+
+    deadline: Deadline
+    workers: int
+    topic_budget: float | None
+    report: metrics.RunReport
+    batch_queue: BatchPredictionQueue | None = None
+    batcher: GenerationBatcher | AsyncGenerationBatcher | None = None
+    # 共有 X 検索の結果（クエリ → ストーリー）
+    prefetched: dict[str, list[XNewsStory]] = field(default_factory=dict)
+
+    def topic_deadline(self) -> Deadline:
+        # トピックの予算は実際に処理を開始した時点から数える（実行全体の期限は超えない）
+        return self.deadline.child(self.topic_budget)
+
+    def generation(
+        self, topic: TopicConfig
+    ) -> tuple[GenerationBatcher | AsyncGenerationBatcher | None, BatchPredictionQueue | None]:
+        """(batcher, batch queue) a topic generates through; at most one of them is set."""
+        if self.batch_queue is not None and topic.batch_prediction:
+            return None, self.batch_queue
+        return self.batcher, None
+
+    def order(self, topics: list[TopicConfig]) -> list[int]:
+        """Indices of topics in start order."""
+        # バッチ予測のトピックはジョブの完了まで枠を占有するため、オンラインのトピックを先に開始する
+        return sorted(range(len(topics)), key=lambda i: self.batch_queue is not None and topics[i].batch_prediction)
+
+
+class TopicPipeline:
+    """Runs the fetch → format → post pipeline for topics.
+
+    Vertex AI / Slack / X のクライアントはインスタンス生成時に1度だけ作成し、
+    全トピック・全実行で共有する（デーモンモードでは接続を温めたまま再利用する）。
+    """
+
+    def __init__(
+        self,
+        config: Config,
+        curator: NewsCurator,
+        x_client: XNewsClient | None = None,
+        slack_client: WebClient | None = None,
+        checkpoints: CheckpointStore | None = None,
+        slack_async_client: AsyncWebClient | None = None,
+        batch_client: VertexBatchPredictionClient | None = None,
+    ):
+        self.config = config
+        self.curator = curator
+        self.x_client = x_client
+        self.slack_client = slack_client
+        self.slack_async_client = slack_async_client
+        self.checkpoints = checkpoints
+        # batch_prediction フラグ付きトピックの生成に使うバッチ予測クライアント（None: オンラインで生成）
+        self.batch_client = batch_client
+        # 直近の run_topics / run_topics_async の性能レポート
+        self.last_report: metrics.RunReport | None = None
+
+    @classmethod
+    def from_config(cls, config: Config, checkpoints: CheckpointStore | None = None) -> "TopicPipeline":
+        """Build a pipeline with freshly created shared clients.
+
+        Args:
+            config: Application configuration.
+            checkpoints: Checkpoint store to resume from. When omitted, a new
+                run is started under config.state_dir (if set).
+        """
+        if checkpoints is None and config.state_dir:
+            checkpoints = CheckpointStore(config.state_dir)
+            checkpoints.prune()
+        curator = NewsCurator(config)
+        return cls(
+            config,
+            curator=curator,
+            x_client=(
+                XNewsClient(config.x_bearer_token, extract_processes=config.page_extract_processes)
+                if config.x_bearer_token
+                else None
+            ),
+            slack_client=WebClient(token=config.slack_bot_token),
+            checkpoints=checkpoints,
+            slack_async_client=AsyncWebClient(token=config.slack_bot_token),
+            batch_client=(
+                VertexBatchPredictionClient(curator.client, config.batch_prediction_gcs_uri)
+                if config.batch_prediction_gcs_uri
+                else None
+            ),
+        )
+
+    def _open_async_sessions(self):
+        """Attach a pooled HTTP session to the shared AsyncWebClient (must run on the event loop)."""
+        if self.slack_async_client is not None and self.slack_async_client.session is None:
+            self.slack_async_client.session = aiohttp.ClientSession()
+
+    async def _close_async_sessions(self):
+        """Close the sessions opened by _open_async_sessions and the X client's AsyncClient.
+
+        セッションはイベントループに紐づくため、run_topics_async の実行ごとに開いて閉じる。
+        """
+        if self.x_client:
+            await self.x_client.aclose()
+        if self.slack_async_client is not None and self.slack_async_client.session is not None:
+            await self.slack_async_client.session.close()
+            self.slack_async_client.session = None
+
+    def close(self):
+        """Release pooled connections and server-side caches held by the shared clients."""
+        if self.x_client:
+            self.x_client.close()
+        self.curator.close()
+
+    def _poster(self, topic: TopicConfig) -> SlackPoster:
+        return SlackPoster(self.config, topic, client=self.slack_client, async_client=self.slack_async_client)
+
+    def _checkpoint(self, topic: TopicConfig) -> TopicCheckpoint:
+        if self.checkpoints is None:
+            return TopicCheckpoint(None)
+        return self.checkpoints.topic(topic.name)
+
+    @staticmethod
+    def _should_fetch_pages(deadline: Deadline) -> bool:
+        if deadline.has_at_least(PAGE_FETCH_THRESHOLD):
+            return True
+        logger.warning(f"Skipping linked page fetch: {deadline.remaining():.1f}s left in time budget")
+        return False
+
+    @staticmethod
+    def _should_filter(deadline: Deadline) -> bool:
+        if deadline.has_at_least(FILTER_THRESHOLD):
+            return True
+        logger.warning(f"Skipping filter_stories: {deadline.remaining():.1f}s left in time budget")
+        return False
+
+    @staticmethod
+    def _generation_deadline(topic: TopicConfig, deadline: Deadline) -> Deadline:
+        """Deadline for the main LLM call, keeping time back for posting.
+
+        Raises:
+            DeadlineExceeded: If too little time is left to generate and post.
+        """
+        if not deadline.has_at_least(ABORT_THRESHOLD):
+            raise DeadlineExceeded(
+                f"Time budget exhausted for topic {topic.name} ({deadline.remaining():.1f}s left), aborting"
+            )
+        return deadline.child(None, reserve=POST_RESERVE_SECONDS)
+
+    def _topic_budget(self, topics: list[TopicConfig], workers: int) -> float | None:
+        """Per-topic time budget: TOPIC_TIME_BUDGET_SECONDS or a fair share of the run budget."""
+        if self.config.topic_time_budget is not None:
+            return self.config.topic_time_budget
+        if self.config.run_time_budget is None:
+            return None
+        return self.config.run_time_budget * workers / len(topics)
+
+    def _search_deadline(self, deadline: Deadline) -> Deadline:
+        """Deadline for X search / page fetching, keeping time back for later stages."""
+        return deadline.child(None, reserve=ABORT_THRESHOLD)
+
+    def process_topic(
+        self,
+        topic: TopicConfig,
+        prefetched_stories: list[XNewsStory] | None = None,
+        deadline: Deadline | None = None,
+        batcher: GenerationBatcher | None = None,
+        batch_queue: BatchPredictionQueue | None = None,
+    ) -> bool:
+        """Fetch, format and post news for a single topic.
+
+        Stage results are checkpointed, so a resumed run continues from the
+        last completed stage and never re-posts a topic that already succeeded.
+
+        Args:
+            topic: Topic to process.
+            prefetched_stories: Stories already obtained by a shared X search.
+                When None on the X News path, the topic is searched on its own.
+            deadline: Time budget for the topic. Stages are skipped as it runs low.
+            batcher: Shares the generation call with other topics of the run.
+            batch_queue: Generates through a batch prediction job instead of
+                online inference (for topics flagged batch_prediction).
+
+        Returns:
+            True if the news was posted successfully, False otherwise.
+
+        Raises:
+            DeadlineExceeded: If the budget runs out before generation.
+        """
+        deadline = deadline or NO_DEADLINE
+        checkpoint, poster = self._start_topic(topic)
+        if poster is None:
+            return True
+
+        items = self._checkpointed_items(topic, checkpoint)
+        if items is None:
+            on_progress = None
+            if self._streams(batch_queue):
+                on_progress = self._stream_progress(poster, checkpoint, deadline)
+            try:
+                items = self._generate_items(
+                    topic, poster, checkpoint, prefetched_stories, deadline, on_progress, batcher, batch_queue
+                )
+            except Exception:
+                # 途中まで配信したメッセージは残さない（期限切れでも削除できるよう時間予算は適用しない）
+                if poster.stream_ts is not None:
+                    poster.abort_stream()
+                    self._stream_aborted(checkpoint)
+                raise
+            checkpoint.save_items(items)
+
+        self._log_items(items)
+        logger.info("Posting to Slack...")
+        with metrics.stage("post"):
+            if self.config.stream_delivery:
+                success = poster.finish_stream(items, deadline=deadline)
+            else:
+                success = poster.post_news(items, deadline=deadline)
+
+        self._finish_topic(topic, checkpoint, poster, success)
+        return success
+
+    async def process_topic_async(
+        self,
+        topic: TopicConfig,
+        prefetched_stories: list[XNewsStory] | None = None,
+        deadline: Deadline | None = None,
+        batcher: AsyncGenerationBatcher | None = None,
+        batch_queue: BatchPredictionQueue | None = None,
+    ) -> bool:
+        """Async variant of process_topic."""
+        deadline = deadline or NO_DEADLINE
+        checkpoint, poster = self._start_topic(topic)
+        if poster is None:
+            return True
+
+        items = self._checkpointed_items(topic, checkpoint)
+        if items is None:
+            on_progress = None
+            if self._streams(batch_queue):
+                on_progress = self._stream_progress_async(poster, checkpoint, deadline)
+            try:
+                items = await self._generate_items_async(
+                    topic, poster, checkpoint, prefetched_stories, deadline, on_progress, batcher, batch_queue
+                )
+            except Exception:
+                if poster.stream_ts is not None:
+                    await poster.abort_stream_async()
+                    self._stream_aborted(checkpoint)
+                raise
+            checkpoint.save_items(items)
+
+        self._log_items(items)
+        logger.info("Posting to Slack...")
+        with metrics.stage("post"):
+            if self.config.stream_delivery:
+                success = await poster.finish_stream_async(items, deadline=deadline)
+            else:
+                success = await poster.post_news_async(items, deadline=deadline)
+
+        self._finish_topic(topic, checkpoint, poster, success)
+        return success
+
+    def _start_topic(self, topic: TopicConfig) -> tuple[TopicCheckpoint, SlackPoster | None]:
+        """Checkpoint and poster for a topic (poster is None when the topic was already posted)."""
+        logger.info(f"Processing topic: {topic.name}")
+        checkpoint = self._checkpoint(topic)
+        if checkpoint.has(STAGE_POSTED):
+            logger.info(f"Topic {topic.name} was already posted (ts={checkpoint.get(STAGE_POSTED)}), skipping")
+            return checkpoint, None
+
+        poster = self._poster(topic)
+        if self.config.stream_delivery:
+            poster.stream_ts = checkpoint.get(STAGE_STREAM_TS)
+        return checkpoint, poster
+
+    @staticmethod
+    def _checkpointed_items(topic: TopicConfig, checkpoint: TopicCheckpoint) -> list[NewsItem] | None:
+        items = checkpoint.items()
+        if items is not None:
+            logger.info(f"Resuming topic {topic.name} from checkpoint: {len(items)} generated items")
+        return items
+
+    def _streams(self, batch_queue: BatchPredictionQueue | None) -> bool:
+        """Whether items are streamed into Slack while they are generated (never for batch prediction)."""
+        return self.config.stream_delivery and batch_queue is None
+
+    @staticmethod
+    def _stream_aborted(checkpoint: TopicCheckpoint):
+        """Forget the streamed message once it has been deleted, so a resumed run starts a new one."""
+        checkpoint.save(STAGE_STREAM_TS, None)
+
+    @staticmethod
+    def _log_items(items: list[NewsItem]):
+        logger.info(f"Received {len(items)} news items")
+        metrics.record(metrics.NEWS_ITEMS, len(items))
+        for i, item in enumerate(items):
+            logger.debug(f"Item {i + 1}: {item.text[:100]}...")
+            logger.debug(f"  Sources: {len(item.sources)}, Impression: {item.is_impression}")
+
+    @staticmethod
+    def _finish_topic(topic: TopicConfig, checkpoint: TopicCheckpoint, poster: SlackPoster, success: bool):
+        if success:
+            checkpoint.save(STAGE_POSTED, poster.last_ts)
+            logger.info(f"News posted successfully for topic: {topic.name}")
+        else:
+            logger.error(f"Failed to post news for topic: {topic.name}")
+
+    @staticmethod
+    def _first_item_recorder():
+        """Callable recording the time until the first streamed item (once)."""
+        started = time.perf_counter()
+        recorded = False
+
+        def record(items: list[NewsItem]):
+            nonlocal recorded
+            if items and not recorded:
+                recorded = True
+                metrics.record_time("first_item", time.perf_counter() - started)
+
+        return record
+
+    @staticmethod
+    def _save_stream_ts(poster: SlackPoster, checkpoint: TopicCheckpoint, posted: bool):
+        """Checkpoint the streamed message's ts right after it was first posted."""
+        if not posted and poster.stream_ts is not None:
+            checkpoint.save(STAGE_STREAM_TS, poster.stream_ts)
+
+    @staticmethod
+    def _stream_progress(poster: SlackPoster, checkpoint: TopicCheckpoint, deadline: Deadline):
+        """on_progress callback mirroring streamed items into a Slack message.
+
+        最初の項目が Slack に表示されるまでの時間を first_item として記録する。
+        """
+        record_first_item = TopicPipeline._first_item_recorder()
+
+        def on_progress(items: list[NewsItem]):
+            posted = poster.stream_ts is not None
+            poster.update_stream(items, deadline)
+            TopicPipeline._save_stream_ts(poster, checkpoint, posted)
+            record_first_item(items)
+
+        return on_progress
+
+    @staticmethod
+    def _stream_progress_async(poster: SlackPoster, checkpoint: TopicCheckpoint, deadline: Deadline):
+        """Async variant of _stream_progress."""
+        record_first_item = TopicPipeline._first_item_recorder()
+
+        async def on_progress(items: list[NewsItem]):
+            posted = poster.stream_ts is not None
+            await poster.update_stream_async(items, deadline)
+            TopicPipeline._save_stream_ts(poster, checkpoint, posted)
+            record_first_item(items)
+
+        return on_progress
+
+    @staticmethod
+    def _needs_pages(stories: list[XNewsStory]) -> bool:
+        return any(story.urls and not story.page_texts for story in stories)
+
+    def _plan_page_fetch(self, stories: list[XNewsStory], deadline: Deadline) -> bool:
+        """Whether linked pages may be fetched after selection, decided before filter_stories.
+
+        filter_stories より先にページ取得が省略されるよう、選定前の残り時間で判定する。
+        """
+        return self._needs_pages(stories) and self._should_fetch_pages(deadline)
+
+    def _fetch_selected_pages(
+        self,
+        stories: list[XNewsStory],
+        filtered: list[XNewsStory],
+        fetch_pages: bool,
+        deadline: Deadline,
+        checkpoint: TopicCheckpoint,
+    ):
+        """Fetch linked pages of the selected stories only (after filter_stories)."""
+        if not fetch_pages or not self._needs_pages(filtered):
+            return
+        with metrics.stage("page_fetch"):
+            self.x_client.fetch_story_pages(filtered, deadline=self._search_deadline(deadline))
+        # 再開時に取り直さないよう、取得したリンク先をストーリーのチェックポイントに反映する
+        checkpoint.save_stories(stories)
+
+    async def _fetch_selected_pages_async(
+        self,
+        stories: list[XNewsStory],
+        filtered: list[XNewsStory],
+        fetch_pages: bool,
+        deadline: Deadline,
+        checkpoint: TopicCheckpoint,
+    ):
+        """Async variant of _fetch_selected_pages."""
+        if not fetch_pages or not self._needs_pages(filtered):
+            return
+        with metrics.stage("page_fetch"):
+            await self.x_client.fetch_story_pages_async(filtered, deadline=self._search_deadline(deadline))
+        checkpoint.save_stories(stories)
+
+    @staticmethod
+    def _exclude_posted(stories: list[XNewsStory], recent_urls: list[str]) -> list[XNewsStory]:
+        """Drop stories already posted to the channel, before any page fetching or LLM call."""
+        kept, skipped_tweets, skipped_links = exclude_posted(stories, recent_urls)
+        if skipped_tweets or skipped_links:
+            logger.info(
+                f"Skipping {skipped_tweets + skipped_links} already posted stories "
+                f"({skipped_tweets} by tweet, {skipped_links} by linked article)"
+            )
+        metrics.record(metrics.POSTED_TWEETS_SKIPPED, skipped_tweets)
+        metrics.record(metrics.POSTED_LINKS_SKIPPED, skipped_links)
+        return kept
+
+    @staticmethod
+    def _record_stories(stories: list[XNewsStory]):
+        metrics.record(metrics.TWEETS, len(stories))
+        metrics.record(metrics.LINKED_URLS, len({url for story in stories for url in story.urls}))
+
+    def _recent_urls(self, poster: SlackPoster, checkpoint: TopicCheckpoint, deadline: Deadline) -> list[str]:
+        urls = checkpoint.get(STAGE_RECENT_URLS)
+        if urls is None:
+            with metrics.stage("slack_history"):
+                urls = poster.fetch_recent_urls(deadline)
+            checkpoint.save(STAGE_RECENT_URLS, urls)
+        metrics.record(metrics.EXCLUDED_URLS, len(urls))
+        return urls
+
+    async def _recent_urls_async(
+        self, poster: SlackPoster, checkpoint: TopicCheckpoint, deadline: Deadline
+    ) -> list[str]:
+        urls = checkpoint.get(STAGE_RECENT_URLS)
+        if urls is None:
+            with metrics.stage("slack_history"):
+                urls = await poster.fetch_recent_urls_async(deadline)
+            checkpoint.save(STAGE_RECENT_URLS, urls)
+        metrics.record(metrics.EXCLUDED_URLS, len(urls))
+        return urls
+
+    def _checkpointed_stories(
+        self, checkpoint: TopicCheckpoint, prefetched_stories: list[XNewsStory] | None
+    ) -> list[XNewsStory] | None:
+        """Stories known without an X search (None: the topic has to be searched on its own)."""
+        stories = checkpoint.stories()
+        if stories is None and prefetched_stories is not None:
+            stories = prefetched_stories
+            checkpoint.save_stories(stories)
+        if stories is None:
+            logger.info("Fetching news from X News API...")
+        return stories
+
+    def _search_kwargs(self, deadline: Deadline) -> dict:
+        return {
+            "max_results": X_SEARCH_MAX_RESULTS,
+            "deadline": self._search_deadline(deadline),
+            "fetch_pages": False,
+        }
+
+    def _new_stories(self, stories: list[XNewsStory], recent_urls: list[str]) -> list[XNewsStory]:
+        self._record_stories(stories)
+        return self._exclude_posted(stories, recent_urls)
+
+    def _known_selection(
+        self, topic: TopicConfig, stories: list[XNewsStory], deadline: Deadline, checkpoint: TopicCheckpoint
+    ) -> list[XNewsStory] | None:
+        """Selected stories that need no filter_stories call (None: filter_stories has to run).
+
+        チェックポイント済みの選択結果か、時間予算が足りない場合は事前ランキングの上位を返す。
+        """
+        filtered = checkpoint.filtered(stories)
+        if filtered is None and not self._should_filter(deadline):
+            # filter_stories を省略する場合も事前ランキングの上位を使う
+            ranking = self.curator.prerank_stories(topic.query, stories)
+            filtered = ranking.ranked[: self.curator.FILTER_FALLBACK_COUNT]
+            checkpoint.save_filtered(filtered)
+        return filtered
+
+    @staticmethod
+    def _filter_kwargs(topic: TopicConfig, deadline: Deadline) -> dict:
+        return {"deadline": deadline.child(None, reserve=ABORT_THRESHOLD), "query": topic.query}
+
+    def _generation_kwargs(
+        self, topic: TopicConfig, deadline: Deadline, on_progress, batch_queue: BatchPredictionQueue | None
+    ) -> dict:
+        return {
+            "deadline": self._generation_deadline(topic, deadline),
+            "priority": topic.priority,
+            "on_progress": on_progress,
+            "batch_queue": batch_queue,
+        }
+
+    def _generate_items(
+        self,
+        topic: TopicConfig,
+        poster: SlackPoster,
+        checkpoint: TopicCheckpoint,
+        prefetched_stories: list[XNewsStory] | None,
+        deadline: Deadline,
+        on_progress=None,
+        batcher: GenerationBatcher | None = None,
+        batch_queue: BatchPredictionQueue | None = None,
+    ) -> list[NewsItem]:
+        """Run the gathering and LLM stages, reusing checkpointed stage results.
+
+        on_progress が指定された場合、生成はストリーミングで行い途中経過を渡す。
+        batcher が指定された場合、x_news の生成は同時に生成段階に達した他のトピックとまとめて行う。
+        batch_queue が指定された場合、生成はバッチ予測ジョブで行う。
+        """
+        # 過去の投稿からURLを取得して重複を避ける
+        # Slack 履歴取得はニュース収集と独立しているため並行して開始し、除外URLが必要な箇所で合流する
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="slack-history") as executor:
+            logger.info("Fetching recent URLs from Slack...")
+            # contextvars（メトリクスの集計先）を履歴取得スレッドにも引き継ぐ
+            recent_urls = executor.submit(
+                contextvars.copy_context().run, self._recent_urls, poster, checkpoint, deadline
+            )
+
+            if self.config.news_source == NewsSource.X_NEWS:
+                stories = self._search_stories(topic, checkpoint, prefetched_stories, deadline)
+                stories = self._new_stories(stories, recent_urls.result())
+                if stories:
+                    filtered = self._select_stories(topic, stories, deadline, checkpoint)
+                    return self._format_stories(topic, filtered, deadline, on_progress, batcher, batch_queue)
+                logger.warning("X News API returned no new stories, falling back to Google Search grounding")
+            else:
+                logger.info("Fetching news with Google Search grounding...")
+
+            return self._ground_news(topic, recent_urls.result(), deadline, on_progress, batch_queue)
+
+    async def _generate_items_async(
+        self,
+        topic: TopicConfig,
+        poster: SlackPoster,
+        checkpoint: TopicCheckpoint,
+        prefetched_stories: list[XNewsStory] | None,
+        deadline: Deadline,
+        on_progress=None,
+        batcher: AsyncGenerationBatcher | None = None,
+        batch_queue: BatchPredictionQueue | None = None,
+    ) -> list[NewsItem]:
+        """Async variant of _generate_items."""
+        logger.info("Fetching recent URLs from Slack...")
+        recent_urls = asyncio.create_task(self._recent_urls_async(poster, checkpoint, deadline))
+
+        try:
+            if self.config.news_source == NewsSource.X_NEWS:
+                stories = await self._search_stories_async(topic, checkpoint, prefetched_stories, deadline)
+                stories = self._new_stories(stories, await recent_urls)
+                if stories:
+                    filtered = await self._select_stories_async(topic, stories, deadline, checkpoint)
+                    return await self._format_stories_async(
+                        topic, filtered, deadline, on_progress, batcher, batch_queue
+                    )
+                logger.warning("X News API returned no new stories, falling back to Google Search grounding")
+            else:
+                logger.info("Fetching news with Google Search grounding...")
+
+            return await self._ground_news_async(topic, await recent_urls, deadline, on_progress, batch_queue)
+        finally:
+            if not recent_urls.done():
+                recent_urls.cancel()
+
+    def _search_stories(
+        self,
+        topic: TopicConfig,
+        checkpoint: TopicCheckpoint,
+        prefetched_stories: list[XNewsStory] | None,
+        deadline: Deadline,
+    ) -> list[XNewsStory]:
+        """Checkpointed or prefetched stories, or the results of the topic's own X search."""
+        stories = self._checkpointed_stories(checkpoint, prefetched_stories)
+        if stories is None:
+            with metrics.stage("x_search"):
+                stories = self.x_client.search(topic.query, **self._search_kwargs(deadline))
+            checkpoint.save_stories(stories)
+        return stories
+
+    async def _search_stories_async(
+        self,
+        topic: TopicConfig,
+        checkpoint: TopicCheckpoint,
+        prefetched_stories: list[XNewsStory] | None,
+        deadline: Deadline,
+    ) -> list[XNewsStory]:
+        """Async variant of _search_stories."""
+        stories = self._checkpointed_stories(checkpoint, prefetched_stories)
+        if stories is None:
+            with metrics.stage("x_search"):
+                stories = await self.x_client.search_async(topic.query, **self._search_kwargs(deadline))
+            checkpoint.save_stories(stories)
+        return stories
+
+    def _select_stories(
+        self, topic: TopicConfig, stories: list[XNewsStory], deadline: Deadline, checkpoint: TopicCheckpoint
+    ) -> list[XNewsStory]:
+        """Select the stories to format (see _known_selection), then fetch their linked pages."""
+        fetch_pages = self._plan_page_fetch(stories, deadline)
+        filtered = self._known_selection(topic, stories, deadline, checkpoint)
+        if filtered is None:
+            with metrics.stage("filter"):
+                filtered = self.curator.filter_stories(topic.name, stories, **self._filter_kwargs(topic, deadline))
+            checkpoint.save_filtered(filtered)
+        metrics.record(metrics.STORIES_SELECTED, len(filtered))
+        self._fetch_selected_pages(stories, filtered, fetch_pages, deadline, checkpoint)
+        return filtered
+
+    async def _select_stories_async(
+        self, topic: TopicConfig, stories: list[XNewsStory], deadline: Deadline, checkpoint: TopicCheckpoint
+    ) -> list[XNewsStory]:
+        """Async variant of _select_stories."""
+        fetch_pages = self._plan_page_fetch(stories, deadline)
+        filtered = self._known_selection(topic, stories, deadline, checkpoint)
+        if filtered is None:
+            with metrics.stage("filter"):
+                filtered = await self.curator.filter_stories_async(
+                    topic.name, stories, **self._filter_kwargs(topic, deadline)
+                )
+            checkpoint.save_filtered(filtered)
+        metrics.record(metrics.STORIES_SELECTED, len(filtered))
+        await self._fetch_selected_pages_async(stories, filtered, fetch_pages, deadline, checkpoint)
+        return filtered
+
+    def _format_stories(
+        self,
+        topic: TopicConfig,
+        stories: list[XNewsStory],
+        deadline: Deadline,
+        on_progress,
+        batcher: GenerationBatcher | None,
+        batch_queue: BatchPredictionQueue | None,
+    ) -> list[NewsItem]:
+        """Format the selected stories, sharing the call with other topics when batching."""
+        logger.info(f"Formatting {len(stories)} stories with LLM...")
+        with metrics.stage("generate"):
+            kwargs = self._generation_kwargs(topic, deadline, on_progress, batch_queue)
+            if batcher is not None and batch_queue is None:
+                items = batcher.format(topic.name, stories, kwargs["deadline"], topic.priority)
+                if items is not None:
+                    return items
+            return self.curator.fetch_news_from_articles(topic.name, stories, **kwargs)
+
+    async def _format_stories_async(
+        self,
+        topic: TopicConfig,
+        stories: list[XNewsStory],
+        deadline: Deadline,
+        on_progress,
+        batcher: AsyncGenerationBatcher | None,
+        batch_queue: BatchPredictionQueue | None,
+    ) -> list[NewsItem]:
+        """Async variant of _format_stories."""
+        logger.info(f"Formatting {len(stories)} stories with LLM...")
+        with metrics.stage("generate"):
+            kwargs = self._generation_kwargs(topic, deadline, on_progress, batch_queue)
+            if batcher is not None and batch_queue is None:
+                items = await batcher.format(topic.name, stories, kwargs["deadline"], topic.priority)
+                if items is not None:
+                    return items
+            return await self.curator.fetch_news_from_articles_async(topic.name, stories, **kwargs)
+
+    def _ground_news(
+        self,
+        topic: TopicConfig,
+        exclude_urls: list[str],
+        deadline: Deadline,
+        on_progress,
+        batch_queue: BatchPredictionQueue | None,
+    ) -> list[NewsItem]:
+        """Generate the topic's news with Google Search grounding."""
+        with metrics.stage("generate"):
+            kwargs = self._generation_kwargs(topic, deadline, on_progress, batch_queue)
+            return self.curator.fetch_news(topic.query, exclude_urls=exclude_urls, **kwargs)
+
+    async def _ground_news_async(
+        self,
+        topic: TopicConfig,
+        exclude_urls: list[str],
+        deadline: Deadline,
+        on_progress,
+        batch_queue: BatchPredictionQueue | None,
+    ) -> list[NewsItem]:
+        """Async variant of _ground_news."""
+        with metrics.stage("generate"):
+            kwargs = self._generation_kwargs(topic, deadline, on_progress, batch_queue)
+            return await self.curator.fetch_news_async(topic.query, exclude_urls=exclude_urls, **kwargs)
+
+    def _topics_needing_search(self, topics: list[TopicConfig]) -> list[TopicConfig]:
+        """Topics whose X search has not been checkpointed yet."""
+        pending = []
+        for topic in topics:
+            checkpoint = self._checkpoint(topic)
+            if not any(checkpoint.has(stage) for stage in (STAGE_STORIES, STAGE_ITEMS, STAGE_POSTED)):
+                pending.append(topic)
+        return pending
+
+    def _use_shared_x_search(self, topics: list[TopicConfig]) -> bool:
+        """Whether topic queries should be packed into shared X searches."""
+        return (
+            self.config.news_source == NewsSource.X_NEWS
+            and self.x_client is not None
+            and self.config.x_shared_search
+            and len(topics) > 1
+        )
+
+    def _batch_prediction_queue(self, topics: list[TopicConfig]) -> BatchPredictionQueue | None:
+        """Queue for topics flagged batch_prediction (None when there are none or it is not configured)."""
+        if not any(topic.batch_prediction for topic in topics):
+            return None
+        if self.batch_client is None:
+            logger.warning("Topics flagged batch_prediction run online: BATCH_PREDICTION_GCS_URI is not set")
+            return None
+        return BatchPredictionQueue(
+            self.batch_client,
+            poll_interval=self.config.batch_prediction_poll_seconds,
+            timeout=self.config.batch_prediction_timeout,
+            reserve=GENERATION_STAGE_SECONDS,
+        )
+
+    def _use_generation_batching(self, workers: int) -> bool:
+        """Whether topics reaching generation together should share a Vertex AI call."""
+        return (
+            self.config.news_source == NewsSource.X_NEWS
+            and self.config.generation_batch_size > 1
+            and workers > 1
+        )
+
+    def _start_report(self, mode: str) -> metrics.RunReport:
+        config = self.config
+        return metrics.RunReport(
+            settings={
+                "mode": mode,
+                "model_name": config.model_name,
+                "fast_model_name": config.fast_model_name,
+                "max_sources_per_item": config.max_sources_per_item,
+                "model_routing": config.model_routing,
+                "gcp_fallback_locations": config.gcp_fallback_locations,
+                "vertex_hedge_percentile": config.vertex_hedge_percentile,
+                "news_source": config.news_source.value,
+                "topic_concurrency": config.topic_concurrency,
+                "run_time_budget": config.run_time_budget,
+                "topic_time_budget": config.topic_time_budget,
+                "stream_delivery": config.stream_delivery,
+                "structured_output": config.structured_output,
+                "articles_max_tokens": config.articles_max_tokens,
+                "generation_batch_size": config.generation_batch_size,
+                "batch_prediction": self.batch_client is not None,
+                "x_shared_search": config.x_shared_search,
+                "filter_candidates": config.filter_candidates,
+                "page_extract_processes": config.page_extract_processes,
+                "checkpoint_run_id": self.checkpoints.run_id if self.checkpoints else None,
+            }
+        )
+
+    def _finish_report(self, report: metrics.RunReport, results: list[TopicResult]):
+        """Attach topic outcomes, then write the report to config.report_dir."""
+        for result in results:
+            topic_metrics = report.topic(result.topic)
+            topic_metrics.success = result.success
+            topic_metrics.error = result.error
+        report.finish()
+        self.last_report = report
+
+        totals = report.totals()
+        if totals.get(metrics.PROMPT_TOKENS):
+            logger.info(
+                f"Vertex AI prompt tokens: {totals[metrics.PROMPT_TOKENS]}, "
+                f"cached: {totals.get(metrics.CACHED_TOKENS, 0)} ({totals['cached_token_ratio']:.0%})"
+            )
+
+        if not self.config.report_dir:
+            return
+        try:
+            path = report.write(self.config.report_dir)
+            logger.info(f"Performance report written to {path}")
+        except OSError as e:
+            logger.warning(f"Failed to write performance report: {e}")
+
+    def _start_run(
+        self, topics: list[TopicConfig], concurrency: int | None, mode: str, batcher_cls: type
+    ) -> _TopicRun:
+        """Set up the deadline, topic budget, report and generation sharing for a run."""
+        run_deadline = Deadline.after(self.config.run_time_budget)
+        workers = min(concurrency or self.config.topic_concurrency, len(topics))
+        run = _TopicRun(
+            deadline=run_deadline,
+            workers=workers,
+            topic_budget=self._topic_budget(topics, workers),
+            report=self._start_report(mode),
+            batch_queue=self._batch_prediction_queue(topics),
+        )
+        if self._use_generation_batching(workers):
+            run.batcher = batcher_cls(
+                self.curator, self.config.generation_batch_size, self.config.generation_batch_max_tokens
+            )
+
+        logger.info(f"Running {len(topics)} topic(s) with concurrency {workers} ({mode})")
+        if run_deadline.bounded:
+            logger.info(f"Time budget: run {self.config.run_time_budget:.0f}s, topic {run.topic_budget:.0f}s")
+        return run
+
+    def _shared_search_queries(self, topics: list[TopicConfig]) -> list[str]:
+        """Queries to pack into shared X searches (empty when each topic searches on its own)."""
+        search_topics = self._topics_needing_search(topics)
+        if not self._use_shared_x_search(search_topics):
+            return []
+        return [topic.query for topic in search_topics]
+
+    @contextmanager
+    def _shared_search(self, run: _TopicRun):
+        """Attribute the shared X search to the run; on failure topics fall back to their own search."""
+        try:
+            with metrics.collecting(run.report.shared), metrics.stage("x_search"):
+                yield
+        except Exception as e:
+            logger.error(f"Shared X search failed, falling back to per-topic search: {e}")
+
+    @contextmanager
+    def _topic_scope(self, topic: TopicConfig, run: _TopicRun, batch_queue: BatchPredictionQueue | None):
+        """Collect the topic's metrics and keep it counted by the batch prediction queue while it runs."""
+        with (
+            metrics.collecting(run.report.topic(topic.name)),
+            batch_queue.participant() if batch_queue else nullcontext(),
+        ):
+            yield
+
+    @staticmethod
+    def _failed_result(topic: TopicConfig, error: Exception) -> TopicResult:
+        if isinstance(error, DeadlineExceeded):
+            logger.error(f"{error}")
+        else:
+            logger.error(f"Unexpected error while processing topic {topic.name}: {error}", exc_info=error)
+        return TopicResult(topic=topic.name, success=False, error=str(error))
+
+    def _run_topic_safely(self, topic: TopicConfig, run: _TopicRun) -> TopicResult:
+        """Run process_topic and convert any exception into a failed TopicResult."""
+        batcher, batch_queue = run.generation(topic)
+        with self._topic_scope(topic, run, batch_queue), batcher.participant() if batcher else nullcontext():
+            try:
+                success = self.process_topic(
+                    topic, run.prefetched.get(topic.query), run.topic_deadline(), batcher, batch_queue
+                )
+                return TopicResult(topic=topic.name, success=success)
+            except Exception as e:
+                return self._failed_result(topic, e)
+
+    async def _run_topic_safely_async(
+        self, topic: TopicConfig, run: _TopicRun, semaphore: asyncio.Semaphore
+    ) -> TopicResult:
+        """Async variant of _run_topic_safely bounded by a semaphore."""
+        batcher, batch_queue = run.generation(topic)
+        async with semaphore, batcher.participant() if batcher else nullcontext():
+            with self._topic_scope(topic, run, batch_queue):
+                try:
+                    success = await self.process_topic_async(
+                        topic, run.prefetched.get(topic.query), run.topic_deadline(), batcher, batch_queue
+                    )
+                    return TopicResult(topic=topic.name, success=success)
+                except Exception as e:
+                    return self._failed_result(topic, e)
+
+    def run_topics(
+        self, topics: list[TopicConfig] | None = None, max_workers: int | None = None
+    ) -> list[TopicResult]:
+        """Process topics concurrently.
+
+        1トピックの失敗が他のトピックの処理を止めないよう、例外はトピック単位で捕捉する。
+        RUN_TIME_BUDGET_SECONDS が設定されている場合は、その期限をトピック・API 呼び出し単位に分割して伝搬する。
+
+        Args:
+            topics: Topics to process. Defaults to config.topics.
+            max_workers: Number of topics processed in parallel.
+                Defaults to config.topic_concurrency.
+
+        Returns:
+            List of TopicResult in the same order as topics.
+        """
+        topics = self.config.topics if topics is None else topics
+        if not topics:
+            return []
+
+        run = self._start_run(topics, max_workers, "threads", GenerationBatcher)
+        queries = self._shared_search_queries(topics)
+        if queries:
+            with self._shared_search(run):
+                run.prefetched = self.x_client.search_many(queries, **self._search_kwargs(run.deadline))
+
+        if run.workers == 1:
+            results = [self._run_topic_safely(topic, run) for topic in topics]
+        else:
+            with ThreadPoolExecutor(max_workers=run.workers, thread_name_prefix="topic") as executor:
+                futures = {i: executor.submit(self._run_topic_safely, topics[i], run) for i in run.order(topics)}
+            results = [futures[i].result() for i in range(len(topics))]
+
+        self._finish_report(run.report, results)
+        return results
+
+    async def run_topics_async(
+        self, topics: list[TopicConfig] | None = None, max_concurrency: int | None = None
+    ) -> list[TopicResult]:
+        """Process topics on a single event loop.
+
+        Args:
+            topics: Topics to process. Defaults to config.topics.
+            max_concurrency: Number of topics in flight at once.
+                Defaults to config.topic_concurrency.
+
+        Returns:
+            List of TopicResult in the same order as topics.
+        """
+        topics = self.config.topics if topics is None else topics
+        if not topics:
+            return []
+
+        run = self._start_run(topics, max_concurrency, "asyncio", AsyncGenerationBatcher)
+        # 投稿の接続を全トピックで使い回すため、イベントループ上で aiohttp のセッションを1つ開く
+        self._open_async_sessions()
+        try:
+            queries = self._shared_search_queries(topics)
+            if queries:
+                with self._shared_search(run):
+                    run.prefetched = await self.x_client.search_many_async(
+                        queries, **self._search_kwargs(run.deadline)
+                    )
+
+            semaphore = asyncio.Semaphore(run.workers)
+            tasks = {
+                i: asyncio.ensure_future(self._run_topic_safely_async(topics[i], run, semaphore))
+                for i in run.order(topics)
+            }
+            await asyncio.gather(*tasks.values())
+            results = [tasks[i].result() for i in range(len(topics))]
+        finally:
+            await self._close_async_sessions()
+        self._finish_report(run.report, results)
+        return results
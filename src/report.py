@@ -0,0 +1,154 @@
+import argparse
+import json
+import os
+import sys
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+from .metrics import RunReport
+
+# この割合（%）以上かつ MIN_REGRESSION_SECONDS 以上遅くなったステージを退行として扱う
+DEFAULT_THRESHOLD_PERCENT = 10.0
+MIN_REGRESSION_SECONDS = 0.5
+
+
+def _load(path: str | Path) -> dict:
+    return json.loads(Path(path).read_text(encoding="utf-8"))
+
+
+def _latest_reports(report_dir: str, count: int) -> list[Path]:
+    paths = sorted(Path(report_dir).glob("*.json"))
+    if len(paths) < count:
+        raise ValueError(f"Need {count} report(s) in {report_dir}, found {len(paths)}")
+    return paths[-count:]
+
+
+def _format_number(value) -> str:
+    if value is None:
+        return "-"
+    if isinstance(value, float):
+        return f"{value:.2f}"
+    return str(value)
+
+
+def _format_delta(old, new) -> str:
+    if old is None or new is None:
+        return ""
+    delta = new - old
+    sign = "+" if delta >= 0 else ""
+    text = f"{sign}{delta:.2f}" if isinstance(delta, float) else f"{sign}{delta}"
+    if old:
+        text += f" ({sign}{delta / old * 100:.0f}%)"
+    return text
+
+
+def _is_regression(old: float | None, new: float | None, threshold: float) -> bool:
+    if old is None or new is None:
+        return False
+    delta = new - old
+    return delta >= MIN_REGRESSION_SECONDS and (old == 0 or delta / old * 100 >= threshold)
+
+
+def _sections(report: dict) -> dict[str, dict]:
+    sections = {"(run)": {"wall_seconds": report.get("wall_seconds"), "stages": {}, "counters": report.get("totals", {})}}
+    sections[RunReport.SHARED] = report.get("shared", {})
+    sections.update(report.get("topics", {}))
+    return sections
+
+
+def diff_reports(old: dict, new: dict, threshold: float = DEFAULT_THRESHOLD_PERCENT) -> tuple[list[str], int]:
+    """Compare two run reports.
+
+    Args:
+        old: Baseline report.
+        new: Report to compare against the baseline.
+        threshold: Percentage slowdown of a stage that counts as a regression.
+
+    Returns:
+        (output lines, number of regressed timings)
+    """
+    lines = [f"old: {old.get('run_id')}  new: {new.get('run_id')}"]
+    regressions = 0
+
+    old_settings, new_settings = old.get("settings", {}), new.get("settings", {})
+    changed = sorted(k for k in old_settings.keys() | new_settings.keys() if old_settings.get(k) != new_settings.get(k))
+    for key in changed:
+        lines.append(f"  setting {key}: {old_settings.get(key)!r} -> {new_settings.get(key)!r}")
+
+    old_sections, new_sections = _sections(old), _sections(new)
+    for name in list(dict.fromkeys([*old_sections, *new_sections])):
+        before, after = old_sections.get(name) or {}, new_sections.get(name) or {}
+        if before.get("wall_seconds") is None and after.get("wall_seconds") is None:
+            continue
+        lines.append("")
+        status = ""
+        if before.get("success") is not None or after.get("success") is not None:
+            status = f"  [success: {before.get('success')} -> {after.get('success')}]"
+        lines.append(f"== {name}{status}")
+
+        rows = [("wall_seconds", before.get("wall_seconds"), after.get("wall_seconds"), True)]
+        old_stages, new_stages = before.get("stages", {}), after.get("stages", {})
+        for stage in dict.fromkeys([*old_stages, *new_stages]):
+            rows.append((f"stage.{stage}", old_stages.get(stage), new_stages.get(stage), True))
+        old_counters, new_counters = before.get("counters", {}), after.get("counters", {})
+        for counter in sorted(old_counters.keys() | new_counters.keys()):
+            if old_counters.get(counter) != new_counters.get(counter):
+                rows.append((counter, old_counters.get(counter), new_counters.get(counter), False))
+
+        for label, a, b, timed in rows:
+            if a is None and b is None:
+                continue
+            mark = ""
+            if timed and _is_regression(a, b, threshold):
+                mark = "  << regression"
+                regressions += 1
+            lines.append(f"  {label:<28} {_format_number(a):>12} {_format_number(b):>12}  {_format_delta(a, b)}{mark}")
+
+    lines.append("")
+    lines.append(f"{regressions} regressed timing(s) (threshold {threshold:.0f}%)")
+    return lines, regressions
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Entry point: `python -m src.report {show,diff}`."""
+    load_dotenv()
+    report_dir = os.environ.get("REPORT_DIR", ".state/reports")
+
+    parser = argparse.ArgumentParser(prog="python -m src.report", description="Inspect run performance reports")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    show = subparsers.add_parser("show", help="Print a report (default: the latest one)")
+    show.add_argument("report", nargs="?")
+
+    diff = subparsers.add_parser("diff", help="Compare two reports (default: the two latest ones)")
+    diff.add_argument("old", nargs="?")
+    diff.add_argument("new", nargs="?")
+    diff.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD_PERCENT, help="Regression threshold in %%")
+    diff.add_argument("--fail-on-regression", action="store_true", help="Exit with 1 when a timing regressed")
+
+    args = parser.parse_args(argv)
+
+    try:
+        if args.command == "show":
+            path = args.report or _latest_reports(report_dir, 1)[0]
+            print(json.dumps(_load(path), ensure_ascii=False, indent=2))
+            return 0
+
+        if args.old and args.new:
+            old_path, new_path = args.old, args.new
+        elif args.old:
+            old_path, new_path = args.old, _latest_reports(report_dir, 1)[0]
+        else:
+            old_path, new_path = _latest_reports(report_dir, 2)
+        lines, regressions = diff_reports(_load(old_path), _load(new_path), args.threshold)
+        print("\n".join(lines))
+        return 1 if regressions and args.fail_on_regression else 0
+
+    except (OSError, ValueError) as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
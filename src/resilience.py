@@ -0,0 +1,297 @@
+import asyncio
+import logging
+import random
+import re
+import threading
+import time
+from collections import deque
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+from enum import Enum
+from typing import TypeVar
+
+import httpx
+from google import genai
+from google.genai import errors
+
+from . import metrics
+from .deadline import NO_DEADLINE, Deadline, DeadlineExceeded
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# 再試行する HTTP ステータス（レート制限・一時的なサーバーエラー）
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+DEFAULT_MAX_ATTEMPTS = 3
+DEFAULT_BASE_DELAY = 1.0
+DEFAULT_MAX_DELAY = 30.0
+# ヘッジの待ち時間を決めるのに必要なレイテンシのサンプル数と、保持するサンプル数（モデルごと）
+MIN_LATENCY_SAMPLES = 5
+LATENCY_WINDOW = 100
+
+_DURATION_PATTERN = re.compile(r"^\s*(\d+(?:\.\d+)?)s\s*$")
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Whether a failed Vertex AI call is worth retrying (possibly in another region)."""
+    if isinstance(error, errors.APIError):
+        return error.code in RETRYABLE_STATUS
+    # 接続エラーなど。タイムアウトは時間予算を使い切った結果なので再試行しない
+    return isinstance(error, httpx.TransportError) and not isinstance(error, httpx.TimeoutException)
+
+
+def retry_after(error: BaseException) -> float | None:
+    """Server-suggested wait in seconds (Retry-After header or google.rpc.RetryInfo), if any."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        value = headers.get("retry-after") or headers.get("Retry-After")
+        if value is not None:
+            return max(0.0, float(value))
+    except (TypeError, ValueError):
+        pass
+
+    details = getattr(error, "details", None)
+    if not isinstance(details, dict):
+        return None
+    error_body = details.get("error", details)
+    if not isinstance(error_body, dict):
+        return None
+    for detail in error_body.get("details") or []:
+        if isinstance(detail, dict) and str(detail.get("@type", "")).endswith("google.rpc.RetryInfo"):
+            match = _DURATION_PATTERN.match(str(detail.get("retryDelay", "")))
+            if match:
+                return float(match.group(1))
+    return None
+
+
+@dataclass
+class RetryPolicy:
+    """Jittered exponential backoff that honours retry-after hints."""
+
+    max_attempts: int = DEFAULT_MAX_ATTEMPTS
+    base_delay: float = DEFAULT_BASE_DELAY
+    max_delay: float = DEFAULT_MAX_DELAY
+
+    def delay(self, attempt: int, error: BaseException) -> float:
+        """Seconds to wait before retry number `attempt` (1-based)."""
+        hint = retry_after(error)
+        if hint is not None:
+            # サーバーの指示より早くは再送しない（同時に待っていたトピックが一斉に再送しないよう少しずらす）
+            return hint * random.uniform(1.0, 1.2)
+        # full jitter
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+
+class CallKind(str, Enum):
+    """Shape of a Vertex AI call; latencies of different kinds are tracked separately."""
+
+    SOLO = "solo"
+    # 複数トピックをまとめた生成（出力が長く、単独の呼び出しより遅い）
+    BATCHED = "batched"
+    # ストリーミング（応答の最後のチャンクまでの時間）
+    STREAM = "stream"
+
+
+class LatencyTracker:
+    """Recent successful call latencies per model and call kind, for picking the hedge delay."""
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self.window = window
+        self._samples: dict[tuple[str, CallKind], deque[float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, model: str, seconds: float, kind: CallKind = CallKind.SOLO):
+        with self._lock:
+            self._samples.setdefault((model, kind), deque(maxlen=self.window)).append(seconds)
+
+    def percentile(self, model: str, p: float, kind: CallKind = CallKind.SOLO) -> float | None:
+        """Nearest-rank percentile (p in 0-1), or None until MIN_LATENCY_SAMPLES calls of this kind succeeded."""
+        with self._lock:
+            samples = sorted(self._samples.get((model, kind), ()))
+        if len(samples) < MIN_LATENCY_SAMPLES:
+            return None
+        return samples[min(len(samples) - 1, max(0, round(p * len(samples)) - 1))]
+
+
+# 1回の呼び出し。(クライアント, プライマリリージョンかどうか) を受け取る（コンテキストキャッシュはプライマリでのみ使える）
+Call = Callable[[genai.Client, bool], T]
+AsyncCall = Callable[[genai.Client, bool], Awaitable[T]]
+
+
+class ResilientCaller:
+    """Runs Vertex AI calls with retries, regional failover and hedged requests.
+
+    Retries of a retryable failure (429 / 5xx / connection errors) wait with
+    jittered exponential backoff and move to the next region in the list.
+    When hedging is enabled and a call runs longer than the model's
+    `hedge_percentile` latency, the same request is also sent to the next
+    region and the first successful response wins and the loser is
+    cancelled. Hedging only applies to call_async: a synchronous request
+    cannot be interrupted, so call never hedges. Retries never sleep past
+    the caller's deadline.
+
+    Args:
+        clients: (location, client) pairs; the first is the primary region.
+        policy: Backoff policy.
+        hedge_percentile: Latency percentile (0-1) after which a hedged
+            request is sent. None disables hedging.
+        tracker: Latency history shared across calls.
+    """
+
+    def __init__(
+        self,
+        clients: list[tuple[str, genai.Client]],
+        policy: RetryPolicy | None = None,
+        hedge_percentile: float | None = None,
+        tracker: LatencyTracker | None = None,
+    ):
+        self.clients = clients
+        self.policy = policy or RetryPolicy()
+        self.hedge_percentile = hedge_percentile
+        self.tracker = tracker or LatencyTracker()
+
+    @classmethod
+    def for_locations(
+        cls,
+        primary: genai.Client,
+        project: str,
+        location: str,
+        fallback_locations: list[str],
+        **kwargs,
+    ) -> "ResilientCaller":
+        """Build a caller whose fallback regions get their own Vertex AI clients."""
+        clients = [(location, primary)]
+        for fallback in fallback_locations:
+            if all(fallback != existing for existing, _ in clients):
+                clients.append((fallback, genai.Client(vertexai=True, project=project, location=fallback)))
+        return cls(clients, **kwargs)
+
+    def _client(self, index: int) -> tuple[str, genai.Client, bool]:
+        location, client = self.clients[index % len(self.clients)]
+        return location, client, index % len(self.clients) == 0
+
+    def _hedge_delay(self, model: str, hedge: bool, kind: CallKind) -> float | None:
+        if not hedge or self.hedge_percentile is None or len(self.clients) < 2:
+            return None
+        return self.tracker.percentile(model, self.hedge_percentile, kind)
+
+    def _backoff(self, attempt: int, error: BaseException, deadline: Deadline) -> float | None:
+        """Delay before the next attempt, or None when the error should be raised."""
+        if attempt >= self.policy.max_attempts or not is_retryable(error):
+            return None
+        delay = self.policy.delay(attempt, error)
+        if not deadline.has_at_least(delay):
+            logger.warning(f"Not retrying Vertex AI call: retry delay {delay:.1f}s exceeds the time budget")
+            return None
+        return delay
+
+    def call(
+        self,
+        model: str,
+        fn: Call,
+        deadline: Deadline = NO_DEADLINE,
+        kind: CallKind = CallKind.SOLO,
+    ) -> T:
+        """Run fn with retries (never hedged; see the class docstring).
+
+        Latencies are recorded under kind.
+        """
+        attempt = 1
+        while True:
+            try:
+                return self._attempt(model, fn, attempt - 1, kind)
+            except Exception as e:
+                delay = self._backoff(attempt, e, deadline)
+                if delay is None:
+                    raise
+                self._log_retry(e, delay, attempt)
+                time.sleep(delay)
+                attempt += 1
+
+    async def call_async(
+        self,
+        model: str,
+        fn: AsyncCall,
+        deadline: Deadline = NO_DEADLINE,
+        hedge: bool = True,
+        kind: CallKind = CallKind.SOLO,
+    ) -> T:
+        """Async variant of call (the losing hedged request is cancelled)."""
+        attempt = 1
+        while True:
+            try:
+                return await self._attempt_async(
+                    model, fn, attempt - 1, deadline, kind, self._hedge_delay(model, hedge, kind)
+                )
+            except Exception as e:
+                delay = self._backoff(attempt, e, deadline)
+                if delay is None:
+                    raise
+                self._log_retry(e, delay, attempt)
+                await asyncio.sleep(delay)
+                attempt += 1
+
+    def _attempt(self, model: str, fn: Call, index: int, kind: CallKind) -> T:
+        start = time.monotonic()
+        _, client, primary = self._client(index)
+        result = fn(client, primary)
+        self.tracker.record(model, time.monotonic() - start, kind)
+        return result
+
+    async def _attempt_async(
+        self, model: str, fn: AsyncCall, index: int, deadline: Deadline, kind: CallKind, hedge_delay: float | None
+    ) -> T:
+        start = time.monotonic()
+        _, client, primary = self._client(index)
+        if hedge_delay is None:
+            result = await fn(client, primary)
+            self.tracker.record(model, time.monotonic() - start, kind)
+            return result
+
+        tasks: dict[asyncio.Task, str] = {}
+
+        def submit(i: int):
+            location, client, primary = self._client(i)
+            tasks[asyncio.ensure_future(fn(client, primary))] = location
+
+        try:
+            submit(index)
+            done, _ = await asyncio.wait(tasks, timeout=_capped(hedge_delay, deadline))
+            if not done:
+                self._log_hedge(model, hedge_delay, index)
+                submit(index + 1)
+
+            error: BaseException | None = None
+            while tasks:
+                done, _ = await asyncio.wait(tasks, timeout=deadline.remaining(), return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    raise DeadlineExceeded("Time budget exhausted while waiting for Vertex AI")
+                for task in done:
+                    location = tasks.pop(task)
+                    if task.exception() is None:
+                        self.tracker.record(model, time.monotonic() - start, kind)
+                        logger.debug(f"{model} response from {location}")
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            # 負けた（または期限切れの）リクエストはキャンセルする
+            for task in tasks:
+                task.cancel()
+
+    def _log_retry(self, error: BaseException, delay: float, attempt: int):
+        location, _, _ = self._client(attempt)
+        logger.warning(f"Vertex AI call failed ({error}), retrying in {delay:.1f}s on {location}")
+        metrics.record(metrics.VERTEX_RETRIES)
+
+    def _log_hedge(self, model: str, hedge_delay: float, index: int):
+        location, _, _ = self._client(index + 1)
+        logger.info(f"{model} call exceeded p{self.hedge_percentile * 100:.0f} ({hedge_delay:.1f}s), hedging to {location}")
+        metrics.record(metrics.VERTEX_HEDGES)
+
+
+def _capped(seconds: float, deadline: Deadline) -> float:
+    remaining = deadline.remaining()
+    return seconds if remaining is None else min(seconds, remaining)
@@ -0,0 +1,65 @@
+import logging
+import sys
+
+from dotenv import load_dotenv
+
+from .checkpoint import CheckpointStore
+from .config import Config
+from .main import summarize_results, warn_thread_mode_settings
+from .pipeline import TopicPipeline
+
+logger = logging.getLogger(__name__)
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Resume a previous run from its checkpoints.
+
+    Usage: python -m src.resume [RUN_ID]
+
+    Without RUN_ID the most recent run under STATE_DIR is resumed. Completed
+    stages are reused and topics that were already posted are skipped.
+    """
+    load_dotenv()
+    argv = sys.argv[1:] if argv is None else argv
+
+    try:
+        config = Config.from_env()
+        if not config.state_dir:
+            logger.error("STATE_DIR is empty; checkpoints are disabled")
+            return 1
+        warn_thread_mode_settings(config)
+
+        if argv:
+            if argv[0] not in CheckpointStore.list_runs(config.state_dir):
+                logger.error(f"Run {argv[0]} not found under {config.state_dir}")
+                return 1
+            checkpoints = CheckpointStore(config.state_dir, argv[0])
+        else:
+            checkpoints = CheckpointStore.latest(config.state_dir)
+            if checkpoints is None:
+                logger.error(f"No run to resume under {config.state_dir}")
+                return 1
+
+        logger.info(f"Resuming run {checkpoints.run_id} ({len(config.topics)} topic(s))")
+
+        pipeline = TopicPipeline.from_config(config, checkpoints=checkpoints)
+
+        try:
+            results = pipeline.run_topics()
+        finally:
+            pipeline.close()
+        return summarize_results(results)
+
+    except KeyError as e:
+        logger.error(f"Missing required environment variable: {e}")
+        return 1
+    except ValueError as e:
+        logger.error(f"Configuration error: {e}")
+        return 1
+    except Exception as e:
+        logger.error(f"Unexpected error: {e}", exc_info=True)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,12 +1,17 @@
+import copy
 import logging
+import math
 import re
 from datetime import datetime, timedelta, timezone
 from typing import TYPE_CHECKING
 
 from slack_sdk import WebClient
 from slack_sdk.errors import SlackApiError
+from slack_sdk.web.async_client import AsyncWebClient
 
+from . import metrics
 from .config import Config, TopicConfig
+from .deadline import Deadline
 
 if TYPE_CHECKING:
     from .news_curator import NewsItem
@@ -16,46 +21,249 @@ logger = logging.getLogger(__name__)
 MAX_BLOCK_TEXT_LENGTH = 3000
 MAX_HEADER_LENGTH = 150
 HISTORY_DAYS = 7
+# slack_sdk のデフォルトタイムアウト（秒）
+DEFAULT_TIMEOUT = 30
+
+# URLパターン: Slack mrkdwn形式 <URL|タイトル> から URL を抽出
+URL_PATTERN = re.compile(r"<(https?://[^|>]+)(?:\|[^>]*)?>")
+# ソースのリンク先記事の URL を残すメッセージメタデータのイベント種別
+SOURCES_METADATA_EVENT = "news_curator_sources"
 
 
 class SlackPoster:
     """Posts messages to Slack using Block Kit."""
 
-    def __init__(self, config: Config, topic: TopicConfig):
-        self.client = WebClient(token=config.slack_bot_token)
+    def __init__(
+        self,
+        config: Config,
+        topic: TopicConfig,
+        client: WebClient | None = None,
+        async_client: AsyncWebClient | None = None,
+    ):
+        self.client = client or WebClient(token=config.slack_bot_token)
+        self._token = config.slack_bot_token
+        self._async_client = async_client
         self.channel_id = topic.channel_id
         self.header = topic.header
         self.model_name = config.model_name
         self.unfurl_links = topic.unfurl_links
         self.unfurl_media = topic.unfurl_media
+        # 直近に投稿したメッセージの ts（チェックポイント記録用）
+        self.last_ts: str | None = None
+        # ストリーミング配信中のメッセージの ts と、反映済みの項目数
+        self.stream_ts: str | None = None
+        self._streamed_count = -1
+
+    @property
+    def async_client(self) -> AsyncWebClient:
+        """AsyncWebClient created on first use (requires a running event loop)."""
+        if self._async_client is None:
+            self._async_client = AsyncWebClient(token=self._token)
+        return self._async_client
+
+    @staticmethod
+    def _with_deadline(client, deadline: Deadline | None):
+        """Return a shallow copy of client whose timeout fits within deadline.
+
+        slack_sdk のタイムアウトはクライアント単位の設定のため、共有クライアントは変更せずに複製する。
+        """
+        if deadline is None or not deadline.bounded:
+            return client
+        timeout = deadline.timeout(DEFAULT_TIMEOUT)
+        if timeout >= client.timeout:
+            return client
+        limited = copy.copy(client)
+        limited.timeout = max(1, math.ceil(timeout))
+        return limited
 
-    def post_news(self, items: list["NewsItem"]) -> bool:
+    @staticmethod
+    def _sources_metadata(items: list["NewsItem"]) -> dict | None:
+        """Message metadata listing the linked articles of the sources (not shown in the message)."""
+        links = list(
+            dict.fromkeys(link for item in items for source in item.sources for link in source.get("links") or [])
+        )
+        if not links:
+            return None
+        return {"event_type": SOURCES_METADATA_EVENT, "event_payload": {"links": links}}
+
+    def _post_message_kwargs(self, items: list["NewsItem"], in_progress: bool = False) -> dict:
+        kwargs = {
+            "channel": self.channel_id,
+            "blocks": self._build_blocks(items, in_progress),
+            "text": self.header,
+            "unfurl_links": self.unfurl_links,
+            "unfurl_media": self.unfurl_media,
+        }
+        metadata = self._sources_metadata(items)
+        if metadata:
+            kwargs["metadata"] = metadata
+        return kwargs
+
+    def _update_kwargs(self, items: list["NewsItem"], in_progress: bool = False) -> dict:
+        kwargs = {
+            "channel": self.channel_id,
+            "ts": self.stream_ts,
+            "blocks": self._build_blocks(items, in_progress),
+            "text": self.header,
+        }
+        metadata = self._sources_metadata(items)
+        if metadata:
+            kwargs["metadata"] = metadata
+        return kwargs
+
+    def post_news(self, items: list["NewsItem"], deadline: Deadline | None = None) -> bool:
         """Post news items to Slack using Block Kit.
 
         Args:
             items: List of NewsItem objects with text and sources.
+            deadline: Time budget for the Slack API call.
 
         Returns:
             True if successful, False otherwise.
         """
-        blocks = self._build_blocks(items)
+        try:
+            client = self._with_deadline(self.client, deadline)
+            metrics.record(metrics.SLACK_API_CALLS)
+            response = client.chat_postMessage(**self._post_message_kwargs(items))
+            logger.info(f"Message posted successfully: {response['ts']}")
+            self.last_ts = response["ts"]
+            return True
+        except SlackApiError as e:
+            logger.error(f"Slack API error: {e.response['error']}")
+            return False
 
+    async def post_news_async(self, items: list["NewsItem"], deadline: Deadline | None = None) -> bool:
+        """Async variant of post_news."""
         try:
-            response = self.client.chat_postMessage(
-                channel=self.channel_id,
-                blocks=blocks,
-                text=self.header,
-                unfurl_links=self.unfurl_links,
-                unfurl_media=self.unfurl_media,
-            )
+            client = self._with_deadline(self.async_client, deadline)
+            metrics.record(metrics.SLACK_API_CALLS)
+            response = await client.chat_postMessage(**self._post_message_kwargs(items))
             logger.info(f"Message posted successfully: {response['ts']}")
+            self.last_ts = response["ts"]
             return True
         except SlackApiError as e:
             logger.error(f"Slack API error: {e.response['error']}")
             return False
 
-    def _build_blocks(self, items: list["NewsItem"]) -> list[dict]:
-        """Build Slack Block Kit blocks for the message."""
+    def update_stream(self, items: list["NewsItem"], deadline: Deadline | None = None) -> bool:
+        """Show the items generated so far, posting the message on the first call.
+
+        Called repeatedly while the LLM response streams in. Only calls the
+        Slack API when more items are available than already shown.
+
+        Args:
+            items: Completed news items so far (may be empty).
+            deadline: Time budget for the Slack API call.
+
+        Returns:
+            True if the message is up to date, False if the Slack API call failed.
+        """
+        if len(items) <= self._streamed_count:
+            return True
+        try:
+            client = self._with_deadline(self.client, deadline)
+            metrics.record(metrics.SLACK_API_CALLS)
+            if self.stream_ts is None:
+                response = client.chat_postMessage(**self._post_message_kwargs(items, in_progress=True))
+                self.stream_ts = response["ts"]
+                logger.info(f"Streaming message posted: {self.stream_ts}")
+            else:
+                client.chat_update(**self._update_kwargs(items, in_progress=True))
+            self._streamed_count = len(items)
+            return True
+        except SlackApiError as e:
+            # 途中経過の更新失敗は致命的ではない（最後の finish_stream で全体を反映する）
+            logger.warning(f"Failed to update streaming message: {e.response['error']}")
+            return False
+
+    async def update_stream_async(self, items: list["NewsItem"], deadline: Deadline | None = None) -> bool:
+        """Async variant of update_stream."""
+        if len(items) <= self._streamed_count:
+            return True
+        try:
+            client = self._with_deadline(self.async_client, deadline)
+            metrics.record(metrics.SLACK_API_CALLS)
+            if self.stream_ts is None:
+                response = await client.chat_postMessage(**self._post_message_kwargs(items, in_progress=True))
+                self.stream_ts = response["ts"]
+                logger.info(f"Streaming message posted: {self.stream_ts}")
+            else:
+                await client.chat_update(**self._update_kwargs(items, in_progress=True))
+            self._streamed_count = len(items)
+            return True
+        except SlackApiError as e:
+            logger.warning(f"Failed to update streaming message: {e.response['error']}")
+            return False
+
+    def finish_stream(self, items: list["NewsItem"], deadline: Deadline | None = None) -> bool:
+        """Replace the streaming message with the final items (with sources).
+
+        Falls back to post_news when no streaming message was posted.
+
+        Returns:
+            True if successful, False otherwise.
+        """
+        if self.stream_ts is None:
+            return self.post_news(items, deadline)
+        try:
+            client = self._with_deadline(self.client, deadline)
+            metrics.record(metrics.SLACK_API_CALLS)
+            client.chat_update(**self._update_kwargs(items))
+            logger.info(f"Message updated successfully: {self.stream_ts}")
+            self.last_ts = self.stream_ts
+            return True
+        except SlackApiError as e:
+            logger.error(f"Slack API error: {e.response['error']}")
+            return False
+
+    async def finish_stream_async(self, items: list["NewsItem"], deadline: Deadline | None = None) -> bool:
+        """Async variant of finish_stream."""
+        if self.stream_ts is None:
+            return await self.post_news_async(items, deadline)
+        try:
+            client = self._with_deadline(self.async_client, deadline)
+            metrics.record(metrics.SLACK_API_CALLS)
+            await client.chat_update(**self._update_kwargs(items))
+            logger.info(f"Message updated successfully: {self.stream_ts}")
+            self.last_ts = self.stream_ts
+            return True
+        except SlackApiError as e:
+            logger.error(f"Slack API error: {e.response['error']}")
+            return False
+
+    def abort_stream(self, deadline: Deadline | None = None):
+        """Delete a partially streamed message after generation failed."""
+        if self.stream_ts is None:
+            return
+        try:
+            client = self._with_deadline(self.client, deadline)
+            metrics.record(metrics.SLACK_API_CALLS)
+            client.chat_delete(channel=self.channel_id, ts=self.stream_ts)
+            logger.info(f"Deleted incomplete streaming message: {self.stream_ts}")
+        except SlackApiError as e:
+            logger.warning(f"Failed to delete streaming message {self.stream_ts}: {e.response['error']}")
+        self.stream_ts = None
+        self._streamed_count = -1
+
+    async def abort_stream_async(self, deadline: Deadline | None = None):
+        """Async variant of abort_stream."""
+        if self.stream_ts is None:
+            return
+        try:
+            client = self._with_deadline(self.async_client, deadline)
+            metrics.record(metrics.SLACK_API_CALLS)
+            await client.chat_delete(channel=self.channel_id, ts=self.stream_ts)
+            logger.info(f"Deleted incomplete streaming message: {self.stream_ts}")
+        except SlackApiError as e:
+            logger.warning(f"Failed to delete streaming message {self.stream_ts}: {e.response['error']}")
+        self.stream_ts = None
+        self._streamed_count = -1
+
+    def _build_blocks(self, items: list["NewsItem"], in_progress: bool = False) -> list[dict]:
+        """Build Slack Block Kit blocks for the message.
+
+        in_progress の場合はフッターに生成中であることを表示する。
+        """
         now = datetime.now(timezone.utc)
         date_str = now.strftime("%Y年%-m月%-d日")
         time_str = now.strftime("%H:%M UTC")
@@ -126,7 +334,8 @@ class SlackPoster:
                         }
                     )
 
-        # フッター
+        # フッター（時間予算に応じて高速モデルで生成した場合はそのモデル名を出す）
+        model_name = next((item.model for item in items if item.model), self.model_name)
         blocks.extend(
             [
                 {"type": "divider"},
@@ -135,7 +344,11 @@ class SlackPoster:
                     "elements": [
                         {
                             "type": "mrkdwn",
-                            "text": f"⚡ {self.model_name} · {time_str}",
+                            "text": (
+                                f"⏳ 生成中… · {model_name}"
+                                if in_progress
+                                else f"⚡ {model_name} · {time_str}"
+                            ),
                         }
                     ],
                 },
@@ -154,43 +367,64 @@ class SlackPoster:
                 links.append(f"<{uri}|{title}>")
         return " · ".join(links)
 
-    def fetch_recent_urls(self) -> list[str]:
+    def _history_kwargs(self) -> dict:
+        oldest = datetime.now(timezone.utc) - timedelta(days=HISTORY_DAYS)
+        return {
+            "channel": self.channel_id,
+            "oldest": str(oldest.timestamp()),
+            "limit": 100,
+            "include_all_metadata": True,
+        }
+
+    def _extract_urls_from_history(self, response) -> list[str]:
+        """Extract posted source URLs from a conversations.history response."""
+        urls = []
+        for message in response.get("messages", []):
+            # メタデータに残したリンク先記事の URL
+            metadata = message.get("metadata") or {}
+            if metadata.get("event_type") == SOURCES_METADATA_EVENT:
+                urls.extend((metadata.get("event_payload") or {}).get("links") or [])
+            blocks = message.get("blocks", [])
+            for block in blocks:
+                # context ブロックの 🔗 セクションから URL を抽出
+                if block.get("type") == "context":
+                    elements = block.get("elements", [])
+                    for element in elements:
+                        if element.get("type") == "mrkdwn":
+                            text = element.get("text", "")
+                            if text.startswith("🔗"):
+                                matches = URL_PATTERN.findall(text)
+                                urls.extend(matches)
+
+        logger.info(f"Found {len(urls)} URLs from past {HISTORY_DAYS} days")
+        logger.debug(f"Recent URLs: {urls}")
+        return urls
+
+    def fetch_recent_urls(self, deadline: Deadline | None = None) -> list[str]:
         """Fetch news URLs from recent messages in the channel.
 
+        Args:
+            deadline: Time budget for the Slack API call.
+
         Returns:
             List of news URLs from the past HISTORY_DAYS days.
         """
-        oldest = datetime.now(timezone.utc) - timedelta(days=HISTORY_DAYS)
-        oldest_ts = str(oldest.timestamp())
-
         try:
-            response = self.client.conversations_history(
-                channel=self.channel_id,
-                oldest=oldest_ts,
-                limit=100,
-            )
-
-            urls = []
-            # URLパターン: Slack mrkdwn形式 <URL|タイトル> から URL を抽出
-            url_pattern = re.compile(r"<(https?://[^|>]+)(?:\|[^>]*)?>")
-
-            for message in response.get("messages", []):
-                blocks = message.get("blocks", [])
-                for block in blocks:
-                    # context ブロックの 🔗 セクションから URL を抽出
-                    if block.get("type") == "context":
-                        elements = block.get("elements", [])
-                        for element in elements:
-                            if element.get("type") == "mrkdwn":
-                                text = element.get("text", "")
-                                if text.startswith("🔗"):
-                                    matches = url_pattern.findall(text)
-                                    urls.extend(matches)
-
-            logger.info(f"Found {len(urls)} URLs from past {HISTORY_DAYS} days")
-            logger.debug(f"Recent URLs: {urls}")
-            return urls
+            client = self._with_deadline(self.client, deadline)
+            metrics.record(metrics.SLACK_API_CALLS)
+            response = client.conversations_history(**self._history_kwargs())
+            return self._extract_urls_from_history(response)
+        except SlackApiError as e:
+            logger.warning(f"Failed to fetch conversation history: {e.response['error']}")
+            return []
 
+    async def fetch_recent_urls_async(self, deadline: Deadline | None = None) -> list[str]:
+        """Async variant of fetch_recent_urls."""
+        try:
+            client = self._with_deadline(self.async_client, deadline)
+            metrics.record(metrics.SLACK_API_CALLS)
+            response = await client.conversations_history(**self._history_kwargs())
+            return self._extract_urls_from_history(response)
         except SlackApiError as e:
             logger.warning(f"Failed to fetch conversation history: {e.response['error']}")
             return []
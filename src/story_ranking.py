@@ -0,0 +1,131 @@
+import math
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+
+from .x_news_client import XNewsStory
+from .x_query_planner import contains_term, query_terms
+
+# スコアの重み（合計 1.0）
+ENGAGEMENT_WEIGHT = 0.4
+KEYWORD_WEIGHT = 0.3
+RECENCY_WEIGHT = 0.2
+URL_WEIGHT = 0.1
+KEYWORDS_FOR_FULL_SCORE = 2
+# 投稿からこの時間（時間）が経つごとに鮮度のスコアが半分になる
+RECENCY_HALF_LIFE_HOURS = 12.0
+# 投稿日時が分からない場合の鮮度のスコア
+UNKNOWN_RECENCY = 0.5
+# これ以上なら LLM に聞かずに採用し、これ未満なら LLM に渡さずに落とす
+WINNER_SCORE = 0.85
+LOSER_SCORE = 0.2
+
+
+def _parse_time(value: str) -> datetime | None:
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def _engagement(story: XNewsStory) -> float:
+    # リポストは拡散への寄与が大きいため、いいねの2倍に数える
+    return float(max(story.like_count, 0) + 2 * max(story.retweet_count, 0))
+
+
+def score_story(story: XNewsStory, terms: list[str], max_engagement: float, now: datetime) -> float:
+    """Heuristic newsworthiness of a story in 0-1.
+
+    Args:
+        story: The story to score.
+        terms: Lowercased query terms (see query_terms).
+        max_engagement: Largest engagement among the candidates, for normalisation.
+        now: Reference time for recency.
+    """
+    # 最大値との比の平方根（最大の半分の反応で 0.71、1/10 で 0.32）
+    engagement = math.sqrt(_engagement(story) / max_engagement) if max_engagement > 0 else 0.0
+
+    text = f"{story.text} {' '.join(story.urls)}".lower()
+    # OR で並べた長いクエリでも不利にならないよう、2語（1語のクエリはその語）一致で満点とする
+    matched = sum(contains_term(text, term) for term in terms)
+    keywords = min(matched, KEYWORDS_FOR_FULL_SCORE) / min(len(terms), KEYWORDS_FOR_FULL_SCORE) if terms else 0.0
+
+    created_at = _parse_time(story.created_at)
+    if created_at is None:
+        recency = UNKNOWN_RECENCY
+    else:
+        age_hours = max((now - created_at).total_seconds() / 3600, 0.0)
+        recency = 0.5 ** (age_hours / RECENCY_HALF_LIFE_HOURS)
+
+    return (
+        ENGAGEMENT_WEIGHT * engagement
+        + KEYWORD_WEIGHT * keywords
+        + RECENCY_WEIGHT * recency
+        + URL_WEIGHT * (1.0 if story.urls else 0.0)
+    )
+
+
+@dataclass
+class PreRanking:
+    """Stories split by the local pre-ranking.
+
+    Attributes:
+        winners: Stories selected without asking the LLM (highest score first).
+        candidates: Stories to put in the filter prompt (highest score first).
+        dropped: Stories removed before the filter prompt.
+    """
+
+    winners: list[XNewsStory] = field(default_factory=list)
+    candidates: list[XNewsStory] = field(default_factory=list)
+    dropped: list[XNewsStory] = field(default_factory=list)
+
+    @property
+    def ranked(self) -> list[XNewsStory]:
+        """Winners and candidates in score order (for skipping the filter)."""
+        return self.winners + self.candidates
+
+
+def prerank(
+    stories: list[XNewsStory],
+    query: str,
+    max_candidates: int,
+    max_winners: int,
+    now: datetime | None = None,
+) -> PreRanking:
+    """Score stories locally and decide which ones the filter LLM has to look at.
+
+    スコアが LOSER_SCORE 未満のストーリーと、上位 max_candidates 件に入らないストーリーは落とす
+    （全てが LOSER_SCORE 未満の場合は上位 max_candidates 件を残す）。
+    WINNER_SCORE 以上のストーリーは max_winners 件まで LLM に聞かずに採用する。
+
+    Args:
+        stories: Candidate stories.
+        query: The topic's X search query (for keyword overlap).
+        max_candidates: Maximum number of stories kept (winners included).
+        max_winners: Maximum number of stories selected without the LLM.
+        now: Reference time for recency (defaults to the current time).
+    """
+    now = now or datetime.now(timezone.utc)
+    terms = query_terms(query)
+    max_engagement = max((_engagement(s) for s in stories), default=0.0)
+    scored = sorted(
+        ((score_story(s, terms, max_engagement, now), i, s) for i, s in enumerate(stories)),
+        key=lambda entry: (-entry[0], entry[1]),
+    )
+
+    if scored and scored[0][0] < LOSER_SCORE:
+        # 全て低スコアの場合は判断を LLM に任せる
+        ranked = [s for _, _, s in scored]
+        return PreRanking(candidates=ranked[:max_candidates], dropped=ranked[max_candidates:])
+
+    result = PreRanking()
+    for score, _, story in scored:
+        if len(result.winners) < max_winners and score >= WINNER_SCORE:
+            result.winners.append(story)
+        elif score >= LOSER_SCORE and len(result.winners) + len(result.candidates) < max_candidates:
+            result.candidates.append(story)
+        else:
+            result.dropped.append(story)
+    return result
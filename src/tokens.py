@@ -0,0 +1,6 @@
+import math
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count for budgeting (about 4 bytes of UTF-8 per token)."""
+    return math.ceil(len(text.encode("utf-8")) / 4)
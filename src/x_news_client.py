@@ -1,13 +1,36 @@
+import asyncio
 import logging
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import multiprocessing
+import re
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from html.parser import HTMLParser
+from typing import NoReturn
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
 
 import httpx
 
+from . import metrics
+from .deadline import NO_DEADLINE, Deadline, DeadlineExceeded
+from .x_query_planner import compile_query, plan_queries
+
 logger = logging.getLogger(__name__)
 
 X_API_BASE = "https://api.x.com/2"
 MAX_PAGE_TEXT_LENGTH = 1000
+MAX_LINK_PREVIEW_LENGTH = 300
+# /2/tweets/search/all の max_results 上限
+MAX_SEARCH_RESULTS = 500
+PAGE_FETCH_CONCURRENCY = 5
+PAGE_FETCH_TIMEOUT = 10
+SEARCH_TIMEOUT = 30
+PAGE_FETCH_HEADERS = {"User-Agent": "Mozilla/5.0 (compatible; NewsCuratorBot/1.0)"}
+# 同じ記事の URL を同一視するときに取り除くトラッキング用のクエリパラメータ
+TRACKING_PARAMS = {"fbclid", "gclid", "ref_src"}
+# X の共有リンクに付くパラメータ（他のサイトでは意味を持つことがあるため x.com / twitter.com でのみ除く）
+X_TRACKING_PARAMS = {"ref", "s", "t"}
+X_HOSTS = {"x.com", "twitter.com", "mobile.x.com", "mobile.twitter.com"}
+_STATUS_URL_PATTERN = re.compile(r"^(?:[\w-]+\.)?(?:x|twitter)\.com/(?:i/web|[^/]+)/status/(\d+)", re.IGNORECASE)
 
 
 class _TextExtractor(HTMLParser):
@@ -46,31 +69,127 @@ def _extract_text_from_html(html: str) -> str:
     return parser.get_text()
 
 
-def _fetch_page_text(url: str) -> str:
-    """Fetch a URL and extract main text content."""
+# (本文の生バイト列, 文字コード)。HTML 以外や取得失敗時は None
+PageBody = tuple[bytes, str | None]
+
+
+def _extract_page_text(content: bytes, encoding: str | None) -> str:
+    """Decode raw HTML bytes and extract the (truncated) main text.
+
+    Module-level so that it can run in a worker process.
+    """
     try:
-        with httpx.Client(timeout=10, follow_redirects=True) as client:
-            resp = client.get(url, headers={"User-Agent": "Mozilla/5.0 (compatible; NewsCuratorBot/1.0)"})
-            resp.raise_for_status()
-            content_type = resp.headers.get("content-type", "")
-            if "text/html" not in content_type:
-                return ""
-            text = _extract_text_from_html(resp.text)
-            return text[:MAX_PAGE_TEXT_LENGTH]
+        html = content.decode(encoding or "utf-8", errors="replace")
+    except LookupError:
+        html = content.decode("utf-8", errors="replace")
+    return _extract_text_from_html(html)[:MAX_PAGE_TEXT_LENGTH]
+
+
+def _page_body_from_response(resp: httpx.Response) -> PageBody | None:
+    resp.raise_for_status()
+    content_type = resp.headers.get("content-type", "")
+    if "text/html" not in content_type:
+        return None
+    # デコードは抽出側で行い、ここでは生のバイト列をそのまま渡す
+    return resp.content, resp.encoding
+
+
+def _fetch_page_body(url: str, client: httpx.Client | None = None, timeout: float | None = None) -> PageBody | None:
+    """Fetch a URL and return its raw HTML body.
+
+    Args:
+        url: Page URL.
+        client: Pooled client to reuse. A one-off client is used when omitted.
+        timeout: Request timeout in seconds. Defaults to PAGE_FETCH_TIMEOUT.
+    """
+    timeout = timeout or PAGE_FETCH_TIMEOUT
+    try:
+        if client is not None:
+            return _page_body_from_response(client.get(url, headers=PAGE_FETCH_HEADERS, timeout=timeout))
+        with httpx.Client(timeout=timeout, follow_redirects=True) as one_off:
+            return _page_body_from_response(one_off.get(url, headers=PAGE_FETCH_HEADERS))
     except Exception as e:
         logger.debug(f"Failed to fetch {url}: {e}")
-        return ""
+        return None
+
+
+async def _fetch_page_body_async(client: httpx.AsyncClient, url: str, timeout: float | None = None) -> PageBody | None:
+    """Async variant of _fetch_page_body using a shared AsyncClient."""
+    try:
+        resp = await client.get(
+            url, headers=PAGE_FETCH_HEADERS, timeout=timeout or PAGE_FETCH_TIMEOUT, follow_redirects=True
+        )
+        return _page_body_from_response(resp)
+    except Exception as e:
+        logger.debug(f"Failed to fetch {url}: {e}")
+        return None
+
+
+def _fetch_page_text(url: str, client: httpx.Client | None = None, timeout: float | None = None) -> str:
+    """Fetch a URL and extract main text content in the calling thread."""
+    body = _fetch_page_body(url, client, timeout)
+    return _extract_page_text(*body) if body else ""
+
+
+def _process_pool_context():
+    # スレッド実行中の fork は安全でないため、使える場合は forkserver を使う
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("forkserver")
+    return multiprocessing.get_context("spawn")
 
 
 class XNewsStory:
     """Represents a news story derived from an X tweet."""
 
-    def __init__(self, tweet_id: str, text: str, urls: list[str], author: str = ""):
+    def __init__(
+        self,
+        tweet_id: str,
+        text: str,
+        urls: list[str],
+        author: str = "",
+        like_count: int = 0,
+        retweet_count: int = 0,
+        created_at: str = "",
+    ):
         self.tweet_id = tweet_id
         self.text = text
         self.urls = urls
         self.author = author
+        # 事前ランキング（story_ranking）に使う反応数と投稿日時（ISO 8601）
+        self.like_count = like_count
+        self.retweet_count = retweet_count
+        self.created_at = created_at
         self.page_texts: dict[str, str] = {}  # url -> extracted text
+        # url -> X API が返すリンクのタイトル・説明（ページ取得前の選定に使う）
+        self.link_previews: dict[str, str] = {}
+
+    def to_dict(self) -> dict:
+        return {
+            "tweet_id": self.tweet_id,
+            "text": self.text,
+            "urls": self.urls,
+            "author": self.author,
+            "like_count": self.like_count,
+            "retweet_count": self.retweet_count,
+            "created_at": self.created_at,
+            "page_texts": self.page_texts,
+            "link_previews": self.link_previews,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "XNewsStory":
+        story = cls(
+            data["tweet_id"],
+            data["text"],
+            data.get("urls", []),
+            data.get("author", ""),
+            like_count=data.get("like_count", 0),
+            retweet_count=data.get("retweet_count", 0),
+            created_at=data.get("created_at", ""),
+        )
+        story.page_texts = dict(data.get("page_texts", {}))
+        story.link_previews = dict(data.get("link_previews", {}))
+        return story
 
     @property
     def x_url(self) -> str:
@@ -78,15 +197,25 @@ class XNewsStory:
 
     @property
     def sources(self) -> list[dict]:
-        return [{"title": "X", "uri": self.x_url}]
+        # links: リンク先記事の URL（表示はせず、次回以降の重複除外のために投稿のメタデータに残す）
+        return [{"title": "X", "uri": self.x_url, "links": list(self.urls)}]
 
-    def to_prompt_text(self, index: int) -> str:
-        """Format story for inclusion in LLM prompt with index number."""
+    def to_prompt_text(self, index: int, include_pages: bool = True) -> str:
+        """Format story for inclusion in LLM prompt with index number.
+
+        Args:
+            index: 1-based story number.
+            include_pages: Whether to include linked page text. Links
+                without page text are shown with their preview instead.
+        """
         author_tag = f" (@{self.author})" if self.author else ""
         lines = [f"[{index}]{author_tag} {self.text}"]
-        for url, page_text in self.page_texts.items():
+        for url in self.urls:
+            page_text = self.page_texts.get(url) if include_pages else None
             if page_text:
                 lines.append(f"  リンク先 ({url}): {page_text}")
+            elif self.link_previews.get(url):
+                lines.append(f"  リンク ({url}): {self.link_previews[url]}")
         return "\n".join(lines)
 
     def fetch_linked_pages(self):
@@ -97,16 +226,148 @@ class XNewsStory:
                 self.page_texts[url] = text
 
 
+def normalize_url(url: str) -> str:
+    """Canonical form of a URL for duplicate checks (scheme, www., fragment and tracking params removed)."""
+    parts = urlsplit(url.strip())
+    host = parts.netloc.lower().removeprefix("www.")
+    tracking = TRACKING_PARAMS | X_TRACKING_PARAMS if host in X_HOSTS else TRACKING_PARAMS
+    query = [
+        (key, value)
+        for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not key.lower().startswith("utm_") and key.lower() not in tracking
+    ]
+    return urlunsplit(("", host, parts.path.rstrip("/"), urlencode(query), "")).removeprefix("//")
+
+
+def status_id(url: str) -> str | None:
+    """Tweet ID of an x.com / twitter.com status URL, if it is one."""
+    match = _STATUS_URL_PATTERN.match(normalize_url(url))
+    return match.group(1) if match else None
+
+
+def exclude_posted(stories: list[XNewsStory], posted_urls: list[str]) -> tuple[list[XNewsStory], int, int]:
+    """Drop stories whose tweet or linked article was already posted.
+
+    Args:
+        stories: Candidate stories.
+        posted_urls: URLs found in the channel's recent posts (see SlackPoster.fetch_recent_urls).
+
+    Returns:
+        (remaining stories, stories skipped for a posted tweet, stories
+        skipped for a posted linked article).
+    """
+    posted_tweets = {tweet_id for tweet_id in map(status_id, posted_urls) if tweet_id}
+    posted_links = {normalize_url(url) for url in posted_urls}
+    kept: list[XNewsStory] = []
+    skipped_tweets = skipped_links = 0
+    for story in stories:
+        if story.tweet_id in posted_tweets:
+            skipped_tweets += 1
+        elif any(normalize_url(url) in posted_links for url in story.urls):
+            skipped_links += 1
+        else:
+            kept.append(story)
+    return kept, skipped_tweets, skipped_links
+
+
 class XNewsClient:
     """Fetches recent tweets from X API v2 to use as news sources."""
 
     MIN_LIKES = 10  # public_metrics のいいね数フィルタ閾値
 
-    def __init__(self, bearer_token: str):
+    def __init__(
+        self,
+        bearer_token: str,
+        extract_processes: int = 0,
+        transport: httpx.BaseTransport | None = None,
+        async_transport: httpx.AsyncBaseTransport | None = None,
+    ):
+        """Initialize the client.
+
+        Args:
+            bearer_token: X API bearer token.
+            extract_processes: Worker processes for HTML text extraction.
+                0 (the default) extracts in the fetching threads.
+            transport: httpx transport for the sync clients (e.g. a local stand-in).
+            async_transport: httpx transport for the async clients.
+        """
         self.bearer_token = bearer_token
         self.headers = {"Authorization": f"Bearer {bearer_token}"}
-
-    def search(self, query: str, max_results: int = 20, min_likes: int | None = None) -> list[XNewsStory]:
+        self._async_transport = async_transport
+        # 接続プールを保持し、TLS ハンドシェイクを複数回の検索・ページ取得で使い回す
+        self._api_client = httpx.Client(timeout=SEARCH_TIMEOUT, transport=transport)
+        self._page_client = httpx.Client(timeout=PAGE_FETCH_TIMEOUT, follow_redirects=True, transport=transport)
+        # 非同期版はイベントループに紐づくため、初回利用時に作成し aclose で閉じる
+        self._async_client: httpx.AsyncClient | None = None
+        self.extract_processes = extract_processes
+        self._extract_pool: ProcessPoolExecutor | None = None
+
+    def close(self):
+        """Close pooled sync HTTP connections and the extraction process pool (see aclose for async)."""
+        self._api_client.close()
+        self._page_client.close()
+        if self._extract_pool is not None:
+            self._extract_pool.shutdown(cancel_futures=True)
+            self._extract_pool = None
+
+    async def aclose(self):
+        """Close the pooled AsyncClient (call on the event loop that used it)."""
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+
+    def _get_async_client(self) -> httpx.AsyncClient:
+        """Pooled AsyncClient shared by async searches and page fetches, created on first use."""
+        if self._async_client is None:
+            self._async_client = httpx.AsyncClient(timeout=SEARCH_TIMEOUT, transport=self._async_transport)
+        return self._async_client
+
+    def _get_extract_pool(self) -> ProcessPoolExecutor | None:
+        """Lazily start the HTML extraction process pool (None when disabled)."""
+        if self.extract_processes < 1:
+            return None
+        if self._extract_pool is None:
+            self._extract_pool = ProcessPoolExecutor(
+                max_workers=self.extract_processes, mp_context=_process_pool_context()
+            )
+        return self._extract_pool
+
+    def _submit_extract(self, body: PageBody) -> "Future[str]":
+        """Hand a fetched page body to the extraction stage.
+
+        HTMLParser による抽出は CPU 処理で GIL を握るため、ページ取得スレッドとは別プロセスで行う。
+        プロセスプールを使う場合、本文のバイト列は pickle してワーカーにコピーされる。
+        """
+        pool = self._get_extract_pool()
+        if pool is not None:
+            try:
+                return pool.submit(_extract_page_text, *body)
+            except (BrokenProcessPool, RuntimeError) as e:
+                logger.warning(f"HTML extraction pool unavailable, extracting in-thread: {e}")
+                self.extract_processes = 0
+                self._extract_pool = None
+        future: Future[str] = Future()
+        future.set_result(_extract_page_text(*body))
+        return future
+
+    @staticmethod
+    def _extract_result(future: "Future[str] | None", url: str) -> str:
+        if future is None:
+            return ""
+        try:
+            return future.result()
+        except Exception as e:
+            logger.debug(f"Failed to extract text from {url}: {e}")
+            return ""
+
+    def search(
+        self,
+        query: str,
+        max_results: int = 20,
+        min_likes: int | None = None,
+        deadline: Deadline | None = None,
+        fetch_pages: bool = True,
+    ) -> list[XNewsStory]:
         """Search tweets matching a query using full-archive search.
 
         Uses `/2/tweets/search/all` with `sort_order=relevancy` to get
@@ -114,49 +375,209 @@ class XNewsClient:
 
         Args:
             query: Search query string (topic keywords).
-            max_results: Number of tweets to request from API (10-100).
+            max_results: Number of tweets to request from API (10-500).
             min_likes: Minimum like count to include. Defaults to MIN_LIKES.
+            deadline: Time budget for the search and page fetching.
+            fetch_pages: Whether to fetch linked page content. Pass False to
+                select stories first and fetch only theirs with fetch_story_pages.
 
         Returns:
-            List of XNewsStory objects with linked page content fetched.
+            List of XNewsStory objects (with linked page content if fetched).
         """
-        min_likes = min_likes if min_likes is not None else self.MIN_LIKES
-        full_query = f"({query}) -is:retweet"
-        params = {
-            "query": full_query,
-            "max_results": max(10, min(max_results, 100)),
-            "sort_order": "relevancy",
-            "tweet.fields": "text,entities,created_at,public_metrics,author_id",
-            "expansions": "author_id",
-            "user.fields": "username",
-        }
+        data = self._search_request(query, max_results, deadline)
+        stories = self._stories_from_response(data, min_likes)
+
+        # リンク先ページを並列取得
+        if fetch_pages:
+            self._fetch_all_pages(stories, deadline)
+
+        return stories
+
+    async def search_async(
+        self,
+        query: str,
+        max_results: int = 20,
+        min_likes: int | None = None,
+        deadline: Deadline | None = None,
+        fetch_pages: bool = True,
+    ) -> list[XNewsStory]:
+        """Async variant of search using httpx.AsyncClient."""
+        data = await self._search_request_async(query, max_results, deadline)
+        stories = self._stories_from_response(data, min_likes)
+
+        # リンク先ページを並列取得
+        if fetch_pages:
+            await self._fetch_all_pages_async(stories, deadline)
+
+        return stories
+
+    def search_many(
+        self,
+        queries: list[str],
+        max_results: int = 20,
+        min_likes: int | None = None,
+        deadline: Deadline | None = None,
+        fetch_pages: bool = True,
+    ) -> dict[str, list[XNewsStory]]:
+        """Search several topic queries with as few API calls as possible.
+
+        Queries are packed into combined OR queries (see plan_queries) and each
+        returned tweet is routed back to every query that matches it locally.
+        Linked pages shared between topics are fetched once.
+
+        Args:
+            queries: Topic query strings.
+            max_results: Number of tweets wanted per query.
+            min_likes: Minimum like count to include. Defaults to MIN_LIKES.
+            deadline: Time budget for the searches and page fetching.
+            fetch_pages: Whether to fetch linked page content.
 
-        logger.info(f"Searching X tweets (full-archive): query={full_query!r}")
+        Returns:
+            Mapping of query -> stories. Queries whose search call failed are
+            omitted so that callers can fall back to a per-topic search.
+        """
+        results: dict[str, list[XNewsStory]] = {}
+        for group in plan_queries(queries):
+            try:
+                data = self._search_request(group.combined_query, max_results * len(group.queries), deadline)
+            except Exception as e:
+                logger.error(f"Shared X search failed for {len(group.queries)} query(ies): {e}")
+                continue
+            results.update(self._route_response(group.queries, data, min_likes))
+
+        # リンク先ページを並列取得（トピック間で共通のURLは1回だけ取得）
+        if fetch_pages:
+            self._fetch_all_pages([story for stories in results.values() for story in stories], deadline)
+
+        return results
+
+    async def search_many_async(
+        self,
+        queries: list[str],
+        max_results: int = 20,
+        min_likes: int | None = None,
+        deadline: Deadline | None = None,
+        fetch_pages: bool = True,
+    ) -> dict[str, list[XNewsStory]]:
+        """Async variant of search_many; combined queries run concurrently."""
+        groups = plan_queries(queries)
+        responses = await asyncio.gather(
+            *(
+                self._search_request_async(group.combined_query, max_results * len(group.queries), deadline)
+                for group in groups
+            ),
+            return_exceptions=True,
+        )
+
+        results: dict[str, list[XNewsStory]] = {}
+        for group, data in zip(groups, responses):
+            if isinstance(data, Exception):
+                logger.error(f"Shared X search failed for {len(group.queries)} query(ies): {data}")
+                continue
+            results.update(self._route_response(group.queries, data, min_likes))
+
+        # リンク先ページを並列取得（トピック間で共通のURLは1回だけ取得）
+        if fetch_pages:
+            await self._fetch_all_pages_async(
+                [story for stories in results.values() for story in stories], deadline
+            )
+
+        return results
+
+    def _route_response(
+        self, queries: list[str], data: dict, min_likes: int | None
+    ) -> dict[str, list[XNewsStory]]:
+        """Split a combined search response into per-query stories."""
+        if len(queries) == 1:
+            return {queries[0]: self._stories_from_response(data, min_likes)}
+
+        tweets = data.get("data", [])
+        routed: dict[str, list[XNewsStory]] = {}
+        for query in queries:
+            matcher = compile_query(query)
+            matched = [t for t in tweets if matcher(self._match_text(t))]
+            logger.info(f"Routed {len(matched)}/{len(tweets)} tweets to query={query!r}")
+            routed[query] = self._stories_from_response({**data, "data": matched}, min_likes)
+        return routed
+
+    @staticmethod
+    def _match_text(tweet: dict) -> str:
+        """Text used for local query matching (tweet text + expanded URLs)."""
+        urls = [u.get("expanded_url", "") for u in (tweet.get("entities") or {}).get("urls", [])]
+        return " ".join([tweet.get("text", ""), *urls]).lower()
+
+    def _search_request(self, query: str, max_results: int, deadline: Deadline | None = None) -> dict:
+        """Call /2/tweets/search/all and return the decoded JSON body."""
+        params = self._build_search_params(query, max_results)
+        timeout = (deadline or NO_DEADLINE).timeout(SEARCH_TIMEOUT)
+        logger.info(f"Searching X tweets (full-archive): query={params['query']!r}")
+        metrics.record(metrics.X_API_CALLS)
 
         try:
-            with httpx.Client(timeout=30) as client:
-                response = client.get(
-                    f"{X_API_BASE}/tweets/search/all",
-                    headers=self.headers,
-                    params=params,
-                )
-                response.raise_for_status()
-                data = response.json()
+            response = self._api_client.get(
+                f"{X_API_BASE}/tweets/search/all",
+                headers=self.headers,
+                params=params,
+                timeout=timeout,
+            )
+            response.raise_for_status()
+            return response.json()
         except httpx.HTTPStatusError as e:
-            status = e.response.status_code
-            if status in (401, 403):
-                raise RuntimeError(
-                    f"X API authentication failed (HTTP {status}). "
-                    "Ensure X_BEARER_TOKEN is valid and the App belongs to a Project "
-                    "(X API v2 requires Apps within Projects). "
-                    "See: https://developer.x.com/"
-                ) from e
-            logger.error(f"X API error: {status} {e.response.text}")
+            self._raise_for_search_error(e)
+        except httpx.RequestError as e:
+            logger.error(f"X API request failed: {e}")
             raise
+
+    async def _search_request_async(
+        self, query: str, max_results: int, deadline: Deadline | None = None
+    ) -> dict:
+        """Async variant of _search_request."""
+        params = self._build_search_params(query, max_results)
+        timeout = (deadline or NO_DEADLINE).timeout(SEARCH_TIMEOUT)
+        logger.info(f"Searching X tweets (full-archive): query={params['query']!r}")
+        metrics.record(metrics.X_API_CALLS)
+
+        try:
+            response = await self._get_async_client().get(
+                f"{X_API_BASE}/tweets/search/all",
+                headers=self.headers,
+                params=params,
+                timeout=timeout,
+            )
+            response.raise_for_status()
+            return response.json()
+        except httpx.HTTPStatusError as e:
+            self._raise_for_search_error(e)
         except httpx.RequestError as e:
             logger.error(f"X API request failed: {e}")
             raise
 
+    def _build_search_params(self, query: str, max_results: int) -> dict:
+        return {
+            "query": f"({query}) -is:retweet",
+            "max_results": max(10, min(max_results, MAX_SEARCH_RESULTS)),
+            "sort_order": "relevancy",
+            "tweet.fields": "text,entities,created_at,public_metrics,author_id",
+            "expansions": "author_id",
+            "user.fields": "username",
+        }
+
+    def _raise_for_search_error(self, e: httpx.HTTPStatusError) -> NoReturn:
+        status = e.response.status_code
+        if status in (401, 403):
+            raise RuntimeError(
+                f"X API authentication failed (HTTP {status}). "
+                "Ensure X_BEARER_TOKEN is valid and the App belongs to a Project "
+                "(X API v2 requires Apps within Projects). "
+                "See: https://developer.x.com/"
+            ) from e
+        logger.error(f"X API error: {status} {e.response.text}")
+        raise e
+
+    def _stories_from_response(self, data: dict, min_likes: int | None) -> list[XNewsStory]:
+        """Filter tweets in a search response and convert them to stories."""
+        min_likes = min_likes if min_likes is not None else self.MIN_LIKES
+
         tweets = data.get("data", [])
         logger.info(f"X API returned {len(tweets)} tweets")
 
@@ -182,12 +603,7 @@ class XNewsClient:
             logger.info(f"Deduplicated to {len(diverse_tweets)} tweets (max {max_per_author}/author)")
         tweets = diverse_tweets
 
-        stories = [self._tweet_to_story(t, users) for t in tweets]
-
-        # リンク先ページを並列取得
-        self._fetch_all_pages(stories)
-
-        return stories
+        return [self._tweet_to_story(t, users) for t in tweets]
 
     def _tweet_to_story(self, tweet: dict, users: dict[str, str]) -> XNewsStory:
         """Convert a tweet dict to XNewsStory."""
@@ -195,6 +611,7 @@ class XNewsClient:
         author_id = tweet.get("author_id", "")
         username = users.get(author_id, "")
         urls = []
+        previews = {}
         for url_entity in (tweet.get("entities") or {}).get("urls", []):
             expanded = url_entity.get("expanded_url", "")
             if not expanded:
@@ -202,28 +619,108 @@ class XNewsClient:
             if any(domain in expanded for domain in ("twitter.com", "x.com", "t.co")):
                 continue
             urls.append(expanded)
-        return XNewsStory(
+            # URL のカード情報がある場合のみ返される
+            preview = " — ".join(
+                part for part in (url_entity.get("title"), url_entity.get("description")) if part
+            )
+            if preview:
+                previews[expanded] = preview[:MAX_LINK_PREVIEW_LENGTH]
+        public_metrics = tweet.get("public_metrics") or {}
+        story = XNewsStory(
             tweet_id=tweet.get("id", ""),
             text=text,
             urls=urls,
             author=username,
+            like_count=public_metrics.get("like_count", 0),
+            retweet_count=public_metrics.get("retweet_count", 0),
+            created_at=tweet.get("created_at", ""),
         )
+        story.link_previews = previews
+        return story
+
+    def fetch_story_pages(self, stories: list[XNewsStory], deadline: Deadline | None = None):
+        """Fetch linked page content for stories that do not have it yet.
+
+        search() に fetch_pages=False を渡した場合に、選定後のストーリーだけを対象に呼び出す。
+        """
+        self._fetch_all_pages([s for s in stories if not s.page_texts], deadline)
 
-    def _fetch_all_pages(self, stories: list[XNewsStory]):
-        """Fetch linked page content for all stories in parallel."""
+    async def fetch_story_pages_async(self, stories: list[XNewsStory], deadline: Deadline | None = None):
+        """Async variant of fetch_story_pages."""
+        await self._fetch_all_pages_async([s for s in stories if not s.page_texts], deadline)
+
+    def _fetch_all_pages(self, stories: list[XNewsStory], deadline: Deadline | None = None):
+        """Fetch linked page content for all stories in parallel.
+
+        同じURLを複数のツイートが参照している場合も取得は1回だけ行う。
+        """
         stories_with_urls = [s for s in stories if s.urls]
         if not stories_with_urls:
             return
 
-        logger.info(f"Fetching linked pages for {len(stories_with_urls)} tweets...")
+        urls = list(dict.fromkeys(url for s in stories_with_urls for url in s.urls))
+        logger.info(f"Fetching {len(urls)} linked pages for {len(stories_with_urls)} tweets...")
+        metrics.record(metrics.PAGES_FETCHED, len(urls))
+
+        deadline = deadline or NO_DEADLINE
+
+        def fetch(url: str) -> "Future[str] | None":
+            # 予算切れのURLは取得せずにスキップする
+            try:
+                timeout = deadline.timeout(PAGE_FETCH_TIMEOUT)
+            except DeadlineExceeded:
+                return None
+            body = _fetch_page_body(url, self._page_client, timeout)
+            # 取得できたものから順に抽出プロセスへ渡し、取得と抽出を重ねる
+            return self._submit_extract(body) if body else None
+
+        with ThreadPoolExecutor(max_workers=PAGE_FETCH_CONCURRENCY) as executor:
+            extractions = list(executor.map(fetch, urls))
 
-        with ThreadPoolExecutor(max_workers=5) as executor:
-            futures = {executor.submit(s.fetch_linked_pages): s for s in stories_with_urls}
-            for future in as_completed(futures):
+        page_texts = {url: self._extract_result(future, url) for url, future in zip(urls, extractions)}
+        self._assign_page_texts(stories_with_urls, page_texts)
+
+    async def _fetch_all_pages_async(self, stories: list[XNewsStory], deadline: Deadline | None = None):
+        """Async variant of _fetch_all_pages using the pooled AsyncClient."""
+        stories_with_urls = [s for s in stories if s.urls]
+        if not stories_with_urls:
+            return
+
+        urls = list(dict.fromkeys(url for s in stories_with_urls for url in s.urls))
+        logger.info(f"Fetching {len(urls)} linked pages for {len(stories_with_urls)} tweets...")
+        metrics.record(metrics.PAGES_FETCHED, len(urls))
+
+        deadline = deadline or NO_DEADLINE
+        semaphore = asyncio.Semaphore(PAGE_FETCH_CONCURRENCY)
+
+        async def fetch(client: httpx.AsyncClient, url: str) -> str:
+            async with semaphore:
+                # 予算切れのURLは取得せずにスキップする
                 try:
-                    future.result()
-                except Exception as e:
-                    logger.debug(f"Page fetch error: {e}")
+                    timeout = deadline.timeout(PAGE_FETCH_TIMEOUT)
+                except DeadlineExceeded:
+                    return ""
+                body = await _fetch_page_body_async(client, url, timeout)
+            if not body:
+                return ""
+            # 抽出はイベントループを塞がないよう抽出プロセスで行う（セマフォは取得のみに適用）
+            try:
+                return await asyncio.wrap_future(self._submit_extract(body))
+            except Exception as e:
+                logger.debug(f"Failed to extract text from {url}: {e}")
+                return ""
+
+        client = self._get_async_client()
+        texts = await asyncio.gather(*(fetch(client, url) for url in urls))
+
+        self._assign_page_texts(stories_with_urls, dict(zip(urls, texts)))
+
+    def _assign_page_texts(self, stories: list[XNewsStory], page_texts: dict[str, str]):
+        for story in stories:
+            for url in story.urls:
+                if page_texts.get(url):
+                    story.page_texts[url] = page_texts[url]
 
+        metrics.record(metrics.PAGES_EXTRACTED, sum(1 for text in page_texts.values() if text))
         fetched = sum(1 for s in stories if s.page_texts)
         logger.info(f"Successfully fetched page content for {fetched} tweets")
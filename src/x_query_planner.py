@@ -0,0 +1,190 @@
+import logging
+import re
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
+
+# /2/tweets/search/all のクエリ長上限（-is:retweet などの付加分を含む）
+MAX_QUERY_LENGTH = 512
+# search() が付加する "(...) -is:retweet" の分
+QUERY_WRAPPER_LENGTH = len("() -is:retweet")
+
+_TOKEN_PATTERN = re.compile(r'-?"[^"]*"|\(|\)|[^\s()]+')
+# 英数字の語は前後が英数字でない位置でのみ一致させる（"ai" が "said" に一致しないように）
+_WORD_CHARS = "0-9a-z_"
+
+Matcher = Callable[[str], bool]
+
+
+class _UnsupportedQuery(Exception):
+    """Raised when a query uses syntax that cannot be evaluated locally."""
+
+
+def _parse_query(query: str) -> Matcher:
+    """Parse a subset of X search syntax into a local text matcher.
+
+    Supported: implicit AND, OR, parentheses, "exact phrases" and -negation.
+    Operators such as `lang:ja` or `from:user` cannot be evaluated on tweet
+    text, so queries containing them raise _UnsupportedQuery.
+    """
+    tokens = _TOKEN_PATTERN.findall(query)
+    pos = 0
+
+    def peek() -> str | None:
+        return tokens[pos] if pos < len(tokens) else None
+
+    def parse_or() -> Matcher:
+        nonlocal pos
+        matchers = [parse_and()]
+        while peek() == "OR":
+            pos += 1
+            matchers.append(parse_and())
+        if len(matchers) == 1:
+            return matchers[0]
+        return lambda text: any(m(text) for m in matchers)
+
+    def parse_and() -> Matcher:
+        matchers = []
+        while peek() not in (None, ")", "OR"):
+            matchers.append(parse_unary())
+        if not matchers:
+            raise _UnsupportedQuery("empty expression")
+        if len(matchers) == 1:
+            return matchers[0]
+        return lambda text: all(m(text) for m in matchers)
+
+    def parse_unary() -> Matcher:
+        nonlocal pos
+        token = tokens[pos]
+        if token == "-":
+            # -(a OR b) のようなグループの否定
+            pos += 1
+            if peek() != "(":
+                raise _UnsupportedQuery("dangling '-'")
+            inner = parse_unary()
+            return lambda text: not inner(text)
+        if token.startswith("-"):
+            pos += 1
+            body = token[1:]
+            inner = _term_matcher(body[1:-1] if body.startswith('"') else body)
+            return lambda text: not inner(text)
+        if token == "(":
+            pos += 1
+            inner = parse_or()
+            if peek() != ")":
+                raise _UnsupportedQuery("unbalanced parentheses")
+            pos += 1
+            return inner
+        pos += 1
+        if token.startswith('"'):
+            return _term_matcher(token[1:-1])
+        return _term_matcher(token)
+
+    matcher = parse_or()
+    if pos != len(tokens):
+        raise _UnsupportedQuery("unexpected token")
+    return matcher
+
+
+@lru_cache(maxsize=1024)
+def _term_pattern(term: str) -> re.Pattern | None:
+    """Whole-word pattern for an ASCII term, or None for terms matched as substrings.
+
+    日本語などの分かち書きしない言語は語の境界を判定できないため、部分一致のままとする。
+    """
+    if not term.isascii():
+        return None
+    return re.compile(rf"(?<![{_WORD_CHARS}]){re.escape(term)}(?![{_WORD_CHARS}])")
+
+
+def contains_term(text: str, term: str) -> bool:
+    """Whether lowercased text contains a lowercased query term.
+
+    ASCII terms must match whole words; other terms (e.g. Japanese) match as substrings.
+    """
+    pattern = _term_pattern(term)
+    return term in text if pattern is None else pattern.search(text) is not None
+
+
+def _term_matcher(term: str) -> Matcher:
+    if not term or ":" in term:
+        raise _UnsupportedQuery(f"operator {term!r}")
+    needle = term.lower()
+    return lambda text: contains_term(text, needle)
+
+
+def compile_query(query: str) -> Matcher | None:
+    """Compile a topic query into a matcher over lowercased tweet text.
+
+    Returns:
+        A callable returning True when the text matches, or None when the
+        query cannot be evaluated locally (it is then searched on its own).
+    """
+    try:
+        return _parse_query(query)
+    except (_UnsupportedQuery, IndexError) as e:
+        logger.debug(f"Query {query!r} is not locally matchable: {e}")
+        return None
+
+
+def query_terms(query: str) -> list[str]:
+    """Lowercased positive search terms of a query (operators, OR and negations removed)."""
+    terms = []
+    for token in _TOKEN_PATTERN.findall(query):
+        if token in ("(", ")", "OR", "AND") or token.startswith("-"):
+            continue
+        term = token[1:-1] if token.startswith('"') and len(token) > 1 else token
+        if term and ":" not in term:
+            terms.append(term.lower())
+    return list(dict.fromkeys(terms))
+
+
+@dataclass
+class QueryGroup:
+    """A set of topic queries served by one X search call."""
+
+    queries: list[str] = field(default_factory=list)
+
+    @property
+    def combined_query(self) -> str:
+        if len(self.queries) == 1:
+            return self.queries[0]
+        return " OR ".join(f"({q})" for q in self.queries)
+
+
+def plan_queries(queries: list[str], max_length: int = MAX_QUERY_LENGTH) -> list[QueryGroup]:
+    """Pack topic queries into as few combined OR queries as possible.
+
+    Queries are packed greedily in order. Queries that cannot be matched
+    locally, or that alone exceed the length limit, get their own group.
+
+    Args:
+        queries: Topic queries (duplicates are merged).
+        max_length: Maximum length of the final X query string.
+
+    Returns:
+        List of QueryGroup objects covering every distinct query.
+    """
+    budget = max_length - QUERY_WRAPPER_LENGTH
+    groups: list[QueryGroup] = []
+    current = QueryGroup()
+
+    for query in dict.fromkeys(queries):
+        if compile_query(query) is None:
+            groups.append(QueryGroup([query]))
+            continue
+
+        candidate = QueryGroup(current.queries + [query])
+        if current.queries and len(candidate.combined_query) > budget:
+            groups.append(current)
+            current = QueryGroup([query])
+        else:
+            current = candidate
+
+    if current.queries:
+        groups.append(current)
+
+    logger.info(f"Planned {len(groups)} X search call(s) for {len(set(queries))} distinct query(ies)")
+    return groups
@@ -0,0 +1,31 @@
+import pytest
+
+from src.config import Config, NewsSource
+from src.news_curator import NewsCurator
+from src.resilience import ResilientCaller
+
+
+@pytest.fixture
+def config():
+    return Config(
+        gcp_project_id="project",
+        gcp_location="asia-northeast1",
+        model_name="gemini-2.5-pro",
+        slack_bot_token="xoxb-test",
+        x_bearer_token=None,
+        news_source=NewsSource.GOOGLE_SEARCH,
+        topics=[],
+        use_emoji_names=False,
+        max_sources_per_item=2,
+        source_min_confidence=0.5,
+        llm_cache_dir=None,
+        context_cache_ttl=None,
+        state_dir=None,
+        report_dir=None,
+    )
+
+
+@pytest.fixture
+def curator(config):
+    client = object()
+    return NewsCurator(config, client=client, caller=ResilientCaller([("asia-northeast1", client)]))
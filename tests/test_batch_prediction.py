@@ -0,0 +1,153 @@
+import threading
+import time
+from contextlib import ExitStack
+
+from google.genai import types
+
+from src.batch_prediction import REQUEST_KEY_LABEL, BatchPredictionQueue, parse_result_line, request_line
+from src.deadline import NO_DEADLINE, Deadline
+from src.resilience import CallKind
+
+CONFIG = types.GenerateContentConfig(system_instruction="persona", temperature=0.2)
+
+
+def _response(text: str) -> types.GenerateContentResponse:
+    return types.GenerateContentResponse(
+        candidates=[types.Candidate(content=types.Content(role="model", parts=[types.Part(text=text)]))]
+    )
+
+
+class FakeBatchClient:
+    """Batch prediction client answering each request with the text of its prompt."""
+
+    def __init__(self, states: list[types.JobState] | None = None, failed_keys: set[str] = frozenset()):
+        self.states = list(states or [types.JobState.JOB_STATE_SUCCEEDED])
+        self.failed_keys = failed_keys
+        self.jobs: list[tuple[str, list[dict]]] = []
+        self.cancelled: list[str] = []
+
+    def submit(self, model: str, lines: list[dict]) -> str:
+        self.jobs.append((model, lines))
+        return f"job-{len(self.jobs)}"
+
+    def state(self, name: str) -> types.JobState:
+        return self.states.pop(0) if len(self.states) > 1 else self.states[0]
+
+    def results(self, name: str) -> list[dict]:
+        _, lines = self.jobs[int(name.removeprefix("job-")) - 1]
+        results = []
+        for line in lines:
+            request = line["request"]
+            if request["labels"][REQUEST_KEY_LABEL] in self.failed_keys:
+                results.append({"request": request, "status": "INTERNAL"})
+                continue
+            text = request["contents"][0]["parts"][0]["text"]
+            response = _response(f"answer to {text}").model_dump(mode="json", by_alias=True, exclude_none=True)
+            results.append({"request": request, "response": response})
+        return results
+
+    def cancel(self, name: str):
+        self.cancelled.append(name)
+
+
+def _generate_all(queue: BatchPredictionQueue, prompts: list[str], participants: int | None = None) -> dict:
+    """Call queue.generate for each prompt from its own thread, as flagged topics do."""
+    results = {}
+
+    def run(prompt: str):
+        response = queue.generate("model", prompt, CONFIG, NO_DEADLINE)
+        results[prompt] = None if response is None else response.text
+
+    with ExitStack() as stack:
+        for _ in range(participants or len(prompts)):
+            stack.enter_context(queue.participant())
+        threads = [threading.Thread(target=run, args=(prompt,)) for prompt in prompts]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=5)
+    return results
+
+
+def test_request_line_round_trip():
+    line = request_line("r1", "prompt", CONFIG)
+    assert line["request"]["labels"] == {REQUEST_KEY_LABEL: "r1"}
+    assert line["request"]["systemInstruction"] == {"parts": [{"text": "persona"}]}
+    assert line["request"]["generationConfig"] == {"temperature": 0.2}
+    response = _response("text").model_dump(mode="json", by_alias=True, exclude_none=True)
+    key, parsed = parse_result_line({"request": line["request"], "response": response})
+    assert (key, parsed.text) == ("r1", "text")
+    assert parse_result_line({"request": line["request"], "status": "INTERNAL"}) == ("r1", None)
+
+
+def test_waiting_topics_share_one_job():
+    client = FakeBatchClient()
+    queue = BatchPredictionQueue(client, poll_interval=0.01, linger=10)
+    results = _generate_all(queue, ["a", "b", "c"])
+    assert results == {"a": "answer to a", "b": "answer to b", "c": "answer to c"}
+    assert len(client.jobs) == 1
+    assert len(client.jobs[0][1]) == 3
+
+
+def test_job_is_submitted_after_linger():
+    client = FakeBatchClient()
+    queue = BatchPredictionQueue(client, poll_interval=0.01, linger=0.2)
+    start = time.monotonic()
+    # もう1件のフラグ付きトピックは処理中のまま合流しないため、待ち時間の経過後に1件だけで送る
+    results = _generate_all(queue, ["a"], participants=2)
+    assert time.monotonic() - start >= 0.2
+    assert results == {"a": "answer to a"}
+    assert [len(lines) for _, lines in client.jobs] == [1]
+
+
+def test_failed_job_returns_none():
+    client = FakeBatchClient([types.JobState.JOB_STATE_RUNNING, types.JobState.JOB_STATE_FAILED])
+    queue = BatchPredictionQueue(client, poll_interval=0.01, linger=10)
+    assert _generate_all(queue, ["a", "b"]) == {"a": None, "b": None}
+
+
+def test_failed_request_returns_none_for_that_request_only():
+    client = FakeBatchClient(failed_keys={"r2"})
+    queue = BatchPredictionQueue(client, poll_interval=0.01, linger=10)
+    results = {}
+    with queue.participant():
+        results["a"] = queue.generate("model", "a", CONFIG, NO_DEADLINE)
+    with queue.participant():
+        results["b"] = queue.generate("model", "b", CONFIG, NO_DEADLINE)
+    assert results["a"].text == "answer to a"
+    assert results["b"] is None
+
+
+def test_deadline_cuts_the_wait_short():
+    client = FakeBatchClient([types.JobState.JOB_STATE_RUNNING])
+    queue = BatchPredictionQueue(client, poll_interval=0.05, timeout=60, reserve=0.3, linger=10)
+    start = time.monotonic()
+    with queue.participant():
+        response = queue.generate("model", "a", CONFIG, Deadline.after(0.5))
+    elapsed = time.monotonic() - start
+    # オンライン生成のための reserve を残して待つのをやめ、ジョブをキャンセルする
+    assert response is None
+    assert 0.15 <= elapsed < 0.4
+    assert client.cancelled == ["job-1"]
+
+
+def test_failed_job_falls_back_to_online_generation(curator):
+    online = []
+
+    def generate_online(model, prompt, config, deadline, kind):
+        online.append((prompt, kind))
+        return _response("online answer")
+
+    curator._generate_online = generate_online
+    client = FakeBatchClient([types.JobState.JOB_STATE_FAILED])
+    queue = BatchPredictionQueue(client, poll_interval=0.01, linger=10)
+    with queue.participant():
+        response = curator._generate_batched(queue, "model", "prompt", CONFIG, NO_DEADLINE)
+    assert response.text == "online answer"
+    assert online == [("prompt", CallKind.SOLO)]
+
+    client.states = [types.JobState.JOB_STATE_SUCCEEDED]
+    with queue.participant():
+        response = curator._generate_batched(queue, "model", "prompt", CONFIG, NO_DEADLINE)
+    assert response.text == "answer to prompt"
+    assert len(online) == 1
@@ -0,0 +1,164 @@
+import asyncio
+import re
+import threading
+from contextlib import AsyncExitStack, ExitStack
+from types import SimpleNamespace
+
+import pytest
+
+from src.batching import AsyncGenerationBatcher, GenerationBatcher, _BatchPlanner, _Request
+from src.config import TopicConfig
+from src.deadline import NO_DEADLINE
+from src.news_curator import NewsItem
+from src.pipeline import TopicPipeline
+from src.x_news_client import XNewsStory
+
+TOPICS = [TopicConfig(name, f"C{name}", name, name) for name in ("alpha", "beta", "gamma")]
+
+
+def _stories(topic: TopicConfig) -> list[XNewsStory]:
+    return [XNewsStory(topic.name, f"{topic.name} news", [])]
+
+
+def _request(tokens: int = 10) -> _Request:
+    return _Request("topic", [], NO_DEADLINE, tokens)
+
+
+def test_planner_waits_for_active_topics():
+    planner = _BatchPlanner(max_size=4, max_tokens=1000)
+    planner.active = 3
+    planner.pending = [_request(), _request()]
+    assert planner.take() == []
+    planner.pending.append(_request())
+    assert len(planner.take()) == 3
+    assert planner.pending == []
+
+
+def test_planner_limits_size_and_tokens():
+    planner = _BatchPlanner(max_size=2, max_tokens=25)
+    planner.active = 5
+    planner.pending = [_request(), _request(), _request()]
+    assert len(planner.take()) == 2
+    planner.pending = [_request(20), _request(20), _request(20)]
+    # トークン数の上限を超えるため、1件ずつ送る
+    assert len(planner.take()) == 1
+    assert len(planner.pending) == 2
+
+
+def test_planner_force_sends_what_is_pending():
+    planner = _BatchPlanner(max_size=4, max_tokens=1000)
+    planner.active = 3
+    planner.pending = [_request()]
+    assert planner.take() == []
+    assert len(planner.take(force=True)) == 1
+
+
+def _batched_response(prompt: str) -> SimpleNamespace:
+    """Sections for every topic of the prompt but gamma, in reverse order."""
+    sections = re.findall(r"^# トピック(\d+): (\S+)$", prompt, re.MULTILINE)
+    text = "\n".join(
+        f"=== トピック{number} ===\n{name} のニュース\n---\n{name} の感想"
+        for number, name in reversed(sections)
+        if name != "gamma"
+    )
+    return SimpleNamespace(text=text)
+
+
+@pytest.fixture
+def solo_topics() -> list[str]:
+    return []
+
+
+@pytest.fixture
+def pipeline(config, curator, solo_topics):
+
+    def generate(model, prompt, config, deadline=NO_DEADLINE, kind=None):
+        return _batched_response(prompt)
+
+    async def generate_async(model, prompt, config, deadline=NO_DEADLINE, kind=None):
+        return _batched_response(prompt)
+
+    def fetch_news_from_articles(topic, stories, **kwargs):
+        solo_topics.append(topic)
+        return [NewsItem(f"{topic} の単独生成", [])]
+
+    async def fetch_news_from_articles_async(topic, stories, **kwargs):
+        return fetch_news_from_articles(topic, stories, **kwargs)
+
+    curator._generate = generate
+    curator._generate_async = generate_async
+    curator.fetch_news_from_articles = fetch_news_from_articles
+    curator.fetch_news_from_articles_async = fetch_news_from_articles_async
+    return TopicPipeline(config, curator)
+
+
+def _texts(results: dict[str, list[NewsItem]]) -> dict[str, list[str]]:
+    return {topic: [item.text for item in items] for topic, items in results.items()}
+
+
+EXPECTED = {
+    "alpha": ["alpha のニュース", "alpha の感想"],
+    "beta": ["beta のニュース", "beta の感想"],
+    "gamma": ["gamma の単独生成"],
+}
+
+
+def test_missing_section_falls_back_for_that_topic_only(pipeline, curator, solo_topics):
+    batcher = GenerationBatcher(curator, max_size=3, max_tokens=100_000, linger=10)
+    results = {}
+
+    def run(topic: TopicConfig):
+        results[topic.name] = pipeline._format_stories(topic, _stories(topic), NO_DEADLINE, None, batcher, None)
+
+    # 全トピックを先に処理中として数え、3件揃ってからまとめて送らせる
+    with ExitStack() as stack:
+        for _ in TOPICS:
+            stack.enter_context(batcher.participant())
+        threads = [threading.Thread(target=run, args=(topic,)) for topic in TOPICS]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=5)
+
+    assert _texts(results) == EXPECTED
+    assert solo_topics == ["gamma"]
+
+
+def test_missing_section_falls_back_for_that_topic_only_async(pipeline, curator, solo_topics):
+    batcher = AsyncGenerationBatcher(curator, max_size=3, max_tokens=100_000, linger=10)
+
+    async def run(topic: TopicConfig):
+        return await pipeline._format_stories_async(topic, _stories(topic), NO_DEADLINE, None, batcher, None)
+
+    async def run_all():
+        async with AsyncExitStack() as stack:
+            for _ in TOPICS:
+                await stack.enter_async_context(batcher.participant())
+            return await asyncio.wait_for(asyncio.gather(*(run(topic) for topic in TOPICS)), timeout=5)
+
+    results = asyncio.run(run_all())
+    assert _texts(dict(zip([t.name for t in TOPICS], results))) == EXPECTED
+    assert solo_topics == ["gamma"]
+
+
+def test_failed_batch_falls_back_for_every_topic(pipeline, curator, solo_topics):
+    def fail(*args, **kwargs):
+        raise RuntimeError("batched call failed")
+
+    curator._generate = fail
+    batcher = GenerationBatcher(curator, max_size=2, max_tokens=100_000, linger=10)
+    results = {}
+
+    def run(topic: TopicConfig):
+        results[topic.name] = pipeline._format_stories(topic, _stories(topic), NO_DEADLINE, None, batcher, None)
+
+    with ExitStack() as stack:
+        for _ in TOPICS[:2]:
+            stack.enter_context(batcher.participant())
+        threads = [threading.Thread(target=run, args=(topic,)) for topic in TOPICS[:2]]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=5)
+
+    assert sorted(solo_topics) == ["alpha", "beta"]
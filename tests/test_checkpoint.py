@@ -0,0 +1,204 @@
+import pytest
+
+from src.checkpoint import (
+    STAGE_FILTERED,
+    STAGE_ITEMS,
+    STAGE_POSTED,
+    STAGE_RECENT_URLS,
+    STAGE_STORIES,
+    CheckpointStore,
+    TopicCheckpoint,
+)
+from src.config import NewsSource, TopicConfig
+from src.news_curator import NewsItem
+from src.pipeline import TopicPipeline
+from src.x_news_client import XNewsStory
+
+TOPIC = TopicConfig("AI ニュース", "C123", "AI ニュース", "AI")
+
+
+def _stories() -> list[XNewsStory]:
+    return [XNewsStory(str(i), f"news {i}", [f"https://example.com/{i}"]) for i in range(4)]
+
+
+class FakeSlackClient:
+    def __init__(self):
+        self.posted: list[dict] = []
+        self.history_calls = 0
+
+    def chat_postMessage(self, **kwargs):
+        self.posted.append(kwargs)
+        return {"ok": True, "ts": f"{len(self.posted)}.0"}
+
+    def conversations_history(self, **kwargs):
+        self.history_calls += 1
+        return {"ok": True, "messages": []}
+
+
+class FakeXClient:
+    def __init__(self):
+        self.searches: list[str] = []
+
+    def search(self, query: str, **kwargs) -> list[XNewsStory]:
+        self.searches.append(query)
+        return _stories()
+
+    def fetch_story_pages(self, stories: list[XNewsStory], deadline=None):
+        for story in stories:
+            for url in story.urls:
+                story.page_texts[url] = f"page of {url}"
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def calls() -> dict[str, list]:
+    return {"filter": [], "generate": []}
+
+
+@pytest.fixture
+def store(tmp_path) -> CheckpointStore:
+    return CheckpointStore(tmp_path, "20260101T000000-aaaaaa")
+
+
+@pytest.fixture
+def pipeline(config, curator, store, calls):
+    config.news_source = NewsSource.X_NEWS
+
+    def filter_stories(topic, stories, **kwargs):
+        calls["filter"].append([story.tweet_id for story in stories])
+        return stories[:2]
+
+    def fetch_news_from_articles(topic, stories, **kwargs):
+        calls["generate"].append([story.tweet_id for story in stories])
+        return [NewsItem(f"item about {story.text}", story.sources) for story in stories]
+
+    curator.filter_stories = filter_stories
+    curator.fetch_news_from_articles = fetch_news_from_articles
+    return TopicPipeline(config, curator, x_client=FakeXClient(), slack_client=FakeSlackClient(), checkpoints=store)
+
+
+def test_topic_checkpoint_round_trip(tmp_path):
+    path = tmp_path / "topic.json"
+    checkpoint = TopicCheckpoint(path)
+    stories = _stories()
+    stories[0].page_texts[stories[0].urls[0]] = "page"
+    checkpoint.save_stories(stories)
+    checkpoint.save_filtered([stories[2], stories[0]])
+    checkpoint.save_items([NewsItem("item", stories[0].sources), NewsItem("感想", [], is_impression=True)])
+
+    reloaded = TopicCheckpoint(path)
+    restored = reloaded.stories()
+    assert [story.to_dict() for story in restored] == [story.to_dict() for story in stories]
+    assert [story.tweet_id for story in reloaded.filtered(restored)] == ["2", "0"]
+    # 選択結果は渡したストーリーに含まれるものだけを返す
+    assert [story.tweet_id for story in reloaded.filtered(restored[:1])] == ["0"]
+    assert [(item.text, item.is_impression) for item in reloaded.items()] == [("item", False), ("感想", True)]
+
+
+def test_unreadable_checkpoint_starts_over(tmp_path):
+    path = tmp_path / "topic.json"
+    path.write_text("{broken", encoding="utf-8")
+    checkpoint = TopicCheckpoint(path)
+    assert not checkpoint.has(STAGE_STORIES)
+    assert checkpoint.items() is None
+
+
+def test_latest_and_topic_paths(tmp_path):
+    assert CheckpointStore.latest(tmp_path) is None
+    for run_id in ("20260101T000000-bbbbbb", "20260102T000000-aaaaaa"):
+        CheckpointStore(tmp_path, run_id).topic("a/b c").save(STAGE_POSTED, "1.0")
+    latest = CheckpointStore.latest(tmp_path)
+    assert latest.run_id == "20260102T000000-aaaaaa"
+    assert latest.topic("a/b c").path.name == "a_b_c.json"
+    assert latest.topic("a/b c").get(STAGE_POSTED) == "1.0"
+
+
+def test_prune_keeps_newest_runs_and_the_current_one(tmp_path):
+    run_ids = [f"2026010{i}T000000-aaaaaa" for i in range(1, 6)]
+    for run_id in run_ids:
+        CheckpointStore(tmp_path, run_id).topic("topic").save(STAGE_POSTED, "1.0")
+
+    CheckpointStore(tmp_path, run_ids[0]).prune(keep=2)
+    # 実行中（再開中）の run は古くても削除しない
+    assert CheckpointStore.list_runs(tmp_path) == [run_ids[0], *run_ids[3:]]
+    CheckpointStore(tmp_path, run_ids[-1]).prune(keep=1)
+    assert CheckpointStore.list_runs(tmp_path) == [run_ids[-1]]
+
+
+def test_rerun_does_not_post_twice(pipeline, store, calls):
+    assert pipeline.run_topics([TOPIC])[0].success
+    checkpoint = store.topic(TOPIC.name)
+    for stage in (STAGE_RECENT_URLS, STAGE_STORIES, STAGE_FILTERED, STAGE_ITEMS, STAGE_POSTED):
+        assert checkpoint.has(stage)
+
+    assert pipeline.run_topics([TOPIC])[0].success
+    assert len(pipeline.slack_client.posted) == 1
+    assert pipeline.slack_client.history_calls == 1
+    assert pipeline.x_client.searches == ["AI"]
+    assert calls == {"filter": [["0", "1", "2", "3"]], "generate": [["0", "1"]]}
+
+
+def test_failed_generation_resumes_from_the_selection(pipeline, store, curator, calls):
+    generate = curator.fetch_news_from_articles
+
+    def fail(topic, stories, **kwargs):
+        raise RuntimeError("generation failed")
+
+    curator.fetch_news_from_articles = fail
+    assert not pipeline.run_topics([TOPIC])[0].success
+    assert not store.topic(TOPIC.name).has(STAGE_ITEMS)
+    assert pipeline.slack_client.posted == []
+
+    curator.fetch_news_from_articles = generate
+    assert pipeline.run_topics([TOPIC])[0].success
+    assert pipeline.x_client.searches == ["AI"]
+    assert calls == {"filter": [["0", "1", "2", "3"]], "generate": [["0", "1"]]}
+    # 取得済みのリンク先は再開時に取り直さない
+    assert all(story.page_texts for story in store.topic(TOPIC.name).filtered(store.topic(TOPIC.name).stories()))
+    assert len(pipeline.slack_client.posted) == 1
+
+
+@pytest.mark.parametrize(
+    "saved, searched, filtered, generated, history",
+    [
+        # (再開時に保存済みのステージ, X 検索, filter_stories, 生成, Slack 履歴取得)
+        ([STAGE_RECENT_URLS], True, True, True, False),
+        ([STAGE_RECENT_URLS, STAGE_STORIES], False, True, True, False),
+        ([STAGE_RECENT_URLS, STAGE_STORIES, STAGE_FILTERED], False, False, True, False),
+        ([STAGE_RECENT_URLS, STAGE_STORIES, STAGE_FILTERED, STAGE_ITEMS], False, False, False, False),
+    ],
+)
+def test_resume_from_each_stage(pipeline, store, calls, saved, searched, filtered, generated, history):
+    stories = _stories()
+    checkpoint = store.topic(TOPIC.name)
+    values = {
+        # 1件目のリンク先は投稿済み
+        STAGE_RECENT_URLS: lambda: checkpoint.save(STAGE_RECENT_URLS, [stories[0].urls[0]]),
+        STAGE_STORIES: lambda: checkpoint.save_stories(stories),
+        STAGE_FILTERED: lambda: checkpoint.save_filtered([stories[3]]),
+        STAGE_ITEMS: lambda: checkpoint.save_items([NewsItem("checkpointed item", [])]),
+    }
+    for stage in saved:
+        values[stage]()
+
+    assert pipeline.run_topics([TOPIC])[0].success
+    assert pipeline.x_client.searches == (["AI"] if searched else [])
+    assert pipeline.slack_client.history_calls == (1 if history else 0)
+    assert calls["filter"] == ([["1", "2", "3"]] if filtered else [])
+    if generated:
+        assert calls["generate"] == [["1", "2"] if filtered else ["3"]]
+    else:
+        assert calls["generate"] == []
+        assert "checkpointed item" in str(pipeline.slack_client.posted[0]["blocks"])
+    assert len(pipeline.slack_client.posted) == 1
+    assert store.topic(TOPIC.name).get(STAGE_POSTED) == "1.0"
+
+
+def test_posted_topic_is_skipped(pipeline, store, calls):
+    store.topic(TOPIC.name).save(STAGE_POSTED, "9.0")
+    assert pipeline.run_topics([TOPIC])[0].success
+    assert pipeline.slack_client.posted == []
+    assert pipeline.slack_client.history_calls == 0
+    assert calls == {"filter": [], "generate": []}
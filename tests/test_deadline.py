@@ -0,0 +1,56 @@
+import pytest
+
+from src.deadline import NO_DEADLINE, Deadline, DeadlineExceeded
+
+
+def test_unbounded_deadline():
+    assert not NO_DEADLINE.bounded
+    assert NO_DEADLINE.remaining() is None
+    assert not NO_DEADLINE.expired()
+    assert NO_DEADLINE.has_at_least(10**9)
+    assert NO_DEADLINE.timeout() is None
+    assert NO_DEADLINE.timeout(30) == 30
+    assert Deadline.after(None).expires_at is None
+
+
+def test_bounded_deadline():
+    deadline = Deadline.after(60)
+    assert deadline.bounded
+    assert 59 < deadline.remaining() <= 60
+    assert deadline.has_at_least(30)
+    assert not deadline.has_at_least(120)
+
+
+def test_timeout_is_capped_by_default():
+    deadline = Deadline.after(60)
+    assert deadline.timeout(10) == 10
+    assert 59 < deadline.timeout() <= 60
+    assert 59 < deadline.timeout(120) <= 60
+
+
+def test_timeout_ms_rounds_up():
+    assert Deadline.after(60).timeout_ms(1.0001) == 1001
+    assert NO_DEADLINE.timeout_ms() is None
+
+
+def test_expired_deadline_raises():
+    deadline = Deadline.after(-1)
+    assert deadline.expired()
+    assert deadline.remaining() == 0.0
+    with pytest.raises(DeadlineExceeded):
+        deadline.timeout(10)
+
+
+def test_child_never_outlives_parent():
+    parent = Deadline.after(60)
+    assert parent.child(None).expires_at == parent.expires_at
+    assert parent.child(120).expires_at == parent.expires_at
+    assert parent.child(10).expires_at < parent.expires_at
+
+
+def test_child_reserve():
+    parent = Deadline.after(60)
+    child = parent.child(None, reserve=20)
+    assert child.expires_at == pytest.approx(parent.expires_at - 20)
+    assert NO_DEADLINE.child(None, reserve=20).expires_at is None
+    assert NO_DEADLINE.child(5).bounded
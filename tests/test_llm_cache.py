@@ -0,0 +1,97 @@
+import json
+import os
+import time
+
+import pytest
+from google.genai import types
+
+from src.llm_cache import ResponseCache, cache_key
+
+CONFIG = types.GenerateContentConfig(system_instruction="persona", temperature=0.2)
+
+
+def _response(text: str) -> types.GenerateContentResponse:
+    return types.GenerateContentResponse(
+        candidates=[types.Candidate(content=types.Content(role="model", parts=[types.Part(text=text)]))]
+    )
+
+
+def _age(cache: ResponseCache, key: str, seconds: float):
+    """Make an entry look `seconds` old (both its creation time and its last use)."""
+    path = cache.cache_dir / f"{key}.json"
+    entry = json.loads(path.read_text(encoding="utf-8"))
+    entry["created_at"] -= seconds
+    path.write_text(json.dumps(entry), encoding="utf-8")
+    past = time.time() - seconds
+    os.utime(path, (past, past))
+
+
+@pytest.mark.parametrize(
+    "update",
+    [
+        {"temperature": 0.0},
+        {"tools": [types.Tool(google_search=types.GoogleSearch())]},
+        {"system_instruction": "another persona"},
+        {"response_mime_type": "application/json"},
+    ],
+)
+def test_cache_key_changes_with_generation_settings(update):
+    assert cache_key("model", "prompt", CONFIG) != cache_key("model", "prompt", CONFIG.model_copy(update=update))
+
+
+def test_cache_key_changes_with_model_and_prompt():
+    key = cache_key("model", "prompt", CONFIG)
+    assert cache_key("other-model", "prompt", CONFIG) != key
+    assert cache_key("model", "other prompt", CONFIG) != key
+
+
+def test_cache_key_ignores_http_options():
+    with_timeout = CONFIG.model_copy(update={"http_options": types.HttpOptions(timeout=30_000)})
+    assert cache_key("model", "prompt", with_timeout) == cache_key("model", "prompt", CONFIG)
+
+
+def test_put_and_get(tmp_path):
+    cache = ResponseCache(tmp_path)
+    assert cache.get("key") is None
+    cache.put("key", _response("cached text"))
+    assert cache.get("key").text == "cached text"
+
+
+def test_expired_entry_is_evicted_on_get(tmp_path):
+    cache = ResponseCache(tmp_path, ttl_seconds=60)
+    cache.put("key", _response("old"))
+    _age(cache, "key", 120)
+    assert cache.get("key") is None
+    assert not (tmp_path / "key.json").exists()
+
+
+def test_expired_entries_are_evicted_on_put(tmp_path):
+    cache = ResponseCache(tmp_path, ttl_seconds=60)
+    cache.put("old", _response("old"))
+    _age(cache, "old", 120)
+    cache.put("new", _response("new"))
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["new.json"]
+
+
+def test_least_recently_used_entries_are_evicted_beyond_max_bytes(tmp_path):
+    cache = ResponseCache(tmp_path)
+    cache.put("a", _response("a" * 100))
+    entry_size = (tmp_path / "a.json").stat().st_size
+    cache.max_bytes = entry_size * 2
+    cache.put("b", _response("b" * 100))
+    _age(cache, "a", 20)
+    _age(cache, "b", 10)
+    # a を参照すると、b が最も長く使われていないエントリになる
+    assert cache.get("a") is not None
+    cache.put("c", _response("c" * 100))
+    assert cache.get("b") is None
+    assert cache.get("a").text == "a" * 100
+    assert cache.get("c").text == "c" * 100
+
+
+def test_unreadable_entry_is_ignored(tmp_path):
+    cache = ResponseCache(tmp_path)
+    (tmp_path / "key.json").write_text("{not json", encoding="utf-8")
+    assert cache.get("key") is None
+    cache.put("key", _response("fresh"))
+    assert cache.get("key").text == "fresh"
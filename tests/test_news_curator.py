@@ -0,0 +1,299 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from src.news_curator import (
+    MIN_PAGE_TOKENS,
+    SUMMARY_HEADING,
+    TRUNCATION_MARK,
+    _pack_stories,
+    _part_spans,
+)
+from src.tokens import estimate_tokens
+from src.x_news_client import XNewsStory
+
+TEXT = "最初のニュース本文です。\n---\nSecond news item about AI chips.\n---\n感想です"
+
+
+def _segment(text: str, segment_text: str) -> dict:
+    """Grounding segment with the UTF-8 byte offsets of segment_text in text."""
+    start = text.encode("utf-8").index(segment_text.encode("utf-8"))
+    return {"start_index": start, "end_index": start + len(segment_text.encode("utf-8")), "text": segment_text}
+
+
+def _chunks(n: int) -> list[dict]:
+    return [{"uri": f"https://example.com/{i}", "title": f"source {i}"} for i in range(n)]
+
+
+def test_part_spans_uses_byte_offsets():
+    spans = _part_spans(TEXT, "---")
+    assert [text for text, _, _ in spans] == ["最初のニュース本文です。", "Second news item about AI chips.", "感想です"]
+    encoded = TEXT.encode("utf-8")
+    for text, start, end in spans:
+        assert encoded[start:end].decode("utf-8") == text
+
+
+def test_attribute_supports_by_offsets(curator):
+    spans = _part_spans(TEXT, "---")
+    supports = [
+        {"segment": _segment(TEXT, "ニュース本文"), "chunk_indices": [0], "confidence_scores": [0.9]},
+        {"segment": _segment(TEXT, "news item"), "chunk_indices": [1, 2], "confidence_scores": [0.8, 0.7]},
+    ]
+    scores = curator._attribute_supports(TEXT, spans, _chunks(3), supports)
+    assert scores == [{0: [0.9]}, {1: [0.8], 2: [0.7]}, {}]
+
+
+def test_attribute_supports_segment_spanning_parts(curator):
+    spans = _part_spans(TEXT, "---")
+    supports = [{"segment": _segment(TEXT, "です。\n---\nSecond"), "chunk_indices": [0], "confidence_scores": [0.6]}]
+    scores = curator._attribute_supports(TEXT, spans, _chunks(1), supports)
+    assert scores == [{0: [0.6]}, {0: [0.6]}, {}]
+
+
+def test_attribute_supports_falls_back_to_text_match(curator):
+    spans = _part_spans(TEXT, "---")
+    supports = [
+        # オフセットが本文と一致しない: テキストの包含で判定する
+        {"segment": {"start_index": 0, "end_index": 5, "text": "news item about AI"}, "chunk_indices": [0]},
+        # オフセットがなく短すぎるテキストは判定しない
+        {"segment": {"text": "AI"}, "chunk_indices": [1], "confidence_scores": [0.9]},
+    ]
+    scores = curator._attribute_supports(TEXT, spans, _chunks(2), supports)
+    assert scores == [{}, {0: [None]}, {}]
+
+
+def test_attribute_supports_ignores_unknown_chunks(curator):
+    spans = _part_spans(TEXT, "---")
+    supports = [{"segment": _segment(TEXT, "Second"), "chunk_indices": [5], "confidence_scores": [0.9]}]
+    assert curator._attribute_supports(TEXT, spans, _chunks(1), supports) == [{}, {}, {}]
+
+
+def test_rank_sources_orders_filters_and_caps(curator):
+    chunks = _chunks(4) + [{"uri": "https://example.com/0", "title": "duplicate"}]
+    scores = {
+        0: [0.6],
+        1: [0.9, 0.8],  # 複数のセグメントで裏付けられたものが上位
+        2: [0.3],  # SOURCE_MIN_CONFIDENCE 未満
+        3: [None],  # 信頼度なしは 1.0 として数える
+        4: [0.99, 0.99],  # 0 と同じ URI
+    }
+    sources = curator._rank_sources(chunks, scores)
+    assert [source["title"] for source in sources] == ["duplicate", "source 1"]
+
+
+def test_parse_news_items_attaches_sources_per_part(curator):
+    supports = [
+        {"segment": _segment(TEXT, "ニュース本文"), "chunk_indices": [0], "confidence_scores": [0.9]},
+        {"segment": _segment(TEXT, "AI chips"), "chunk_indices": [1], "confidence_scores": [0.8]},
+        {"segment": _segment(TEXT, "感想"), "chunk_indices": [2], "confidence_scores": [0.9]},
+    ]
+    items = curator._parse_news_items(TEXT, _chunks(3), supports)
+    assert [item.text for item in items] == ["最初のニュース本文です。", "Second news item about AI chips.", "感想です"]
+    assert [[source["uri"] for source in item.sources] for item in items] == [
+        ["https://example.com/0"],
+        ["https://example.com/1"],
+        [],
+    ]
+    assert [item.is_impression for item in items] == [False, False, True]
+
+
+def _story(i: int, text: str = "news", page_chars: int = 0) -> XNewsStory:
+    url = f"https://example.com/{i}"
+    story = XNewsStory(str(i), f"{text} {i}", [url])
+    if page_chars:
+        story.page_texts[url] = "x" * page_chars
+    return story
+
+
+def _prompt_tokens(stories: list[XNewsStory]) -> int:
+    return estimate_tokens("\n\n".join(story.to_prompt_text(i + 1) for i, story in enumerate(stories)))
+
+
+def test_pack_stories_keeps_stories_within_budget():
+    stories = [_story(i, page_chars=400) for i in range(3)]
+    packed, trimmed, dropped = _pack_stories(stories, 10_000)
+    assert packed == stories
+    assert all(a is b for a, b in zip(packed, stories))
+    assert (trimmed, dropped) == (0, 0)
+
+
+def test_pack_stories_drops_lowest_ranked_stories():
+    stories = [_story(i, text="x" * 400) for i in range(5)]
+    packed, trimmed, dropped = _pack_stories(stories, 330)
+    assert [story.tweet_id for story in packed] == ["0", "1", "2"]
+    assert (trimmed, dropped) == (0, 2)
+    assert _prompt_tokens(packed) <= 330
+
+
+def test_pack_stories_gives_more_page_text_to_higher_ranked_stories():
+    stories = [_story(i, page_chars=4000) for i in range(3)]
+    packed, trimmed, dropped = _pack_stories(stories, 1000)
+    assert dropped == 0
+    assert [story.tweet_id for story in packed] == ["0", "1", "2"]
+    pages = [story.page_texts[story.urls[0]] for story in packed]
+    assert all(page.endswith(TRUNCATION_MARK) for page in pages)
+    assert len(pages[0]) > len(pages[1]) > len(pages[2])
+    assert trimmed > 0
+    assert _prompt_tokens(packed) <= 1000
+    # 切り詰めたストーリーはコピーで、元のストーリーは変更しない
+    assert all(len(story.page_texts[story.urls[0]]) == 4000 for story in stories)
+
+
+def test_pack_stories_passes_unused_allotment_on():
+    stories = [_story(0, page_chars=40), _story(1, page_chars=4000)]
+    packed, _, _ = _pack_stories(stories, 600)
+    assert packed[0] is stories[0]
+    # 1件目が使い切らなかった割り当ては2件目のリンク先に回る
+    assert estimate_tokens(packed[1].page_texts[stories[1].urls[0]]) > 600 // 2
+    assert _prompt_tokens(packed) <= 600
+
+
+def test_pack_stories_omits_pages_below_min_tokens():
+    stories = [_story(0, page_chars=4000)]
+    base = estimate_tokens(stories[0].to_prompt_text(1, include_pages=False)) + 1
+    packed, trimmed, _ = _pack_stories(stories, base + MIN_PAGE_TOKENS // 2)
+    assert packed[0].page_texts == {}
+    assert trimmed == estimate_tokens(f"\n  リンク先 ({stories[0].urls[0]}): " + "x" * 4000)
+
+
+def test_pack_stories_keeps_a_single_story_over_budget():
+    stories = [_story(0, text="x" * 4000, page_chars=4000), _story(1)]
+    packed, trimmed, dropped = _pack_stories(stories, 100)
+    # 最優先のストーリーは予算を超えても本文だけは残す
+    assert [story.tweet_id for story in packed] == ["0"]
+    assert packed[0].text == stories[0].text
+    assert packed[0].page_texts == {}
+    assert trimmed > 0
+    assert dropped == 1
+
+
+STRUCTURED = {
+    "items": [
+        {
+            "title": "*AI チップの新製品*",
+            "lines": [{"speaker": "ずんだもん", "text": "新しいチップなのだ"}, {"speaker": "四国めたん", "text": "速いわね"}],
+            "refs": [2, 1],
+        },
+        {"title": "規制の動き", "lines": [{"speaker": "あんこもん", "text": "気になるもん"}], "refs": [3]},
+    ],
+    "summary": [{"speaker": "東北きりたん", "text": "まとめです"}],
+}
+
+
+def test_parse_structured_items(curator):
+    stories = [_story(i) for i in range(3)]
+    items = curator._parse_structured_items(json.dumps(STRUCTURED, ensure_ascii=False), stories)
+    assert [item.text for item in items] == [
+        "*AI チップの新製品*\n\nずんだもん: 新しいチップなのだ\n四国めたん: 速いわね",
+        "*規制の動き*\n\nあんこもん: 気になるもん",
+        f"{SUMMARY_HEADING}\n東北きりたん: まとめです",
+    ]
+    assert [source["uri"] for source in items[0].sources] == [stories[1].x_url, stories[0].x_url]
+    assert [source["uri"] for source in items[1].sources] == [stories[2].x_url]
+    assert [item.is_impression for item in items] == [False, False, True]
+
+
+def test_parse_structured_items_tolerates_missing_fields(curator):
+    stories = [_story(0)]
+    data = {
+        "items": [
+            {"lines": [{"speaker": "ずんだもん", "text": "タイトルなし"}], "refs": [1]},
+            {"title": "発言なし"},
+            {"title": "", "lines": [{"speaker": "ずんだもん", "text": " "}]},
+            {"title": "不正な参照", "refs": [0, 5, "1", None]},
+            "not an entry",
+        ]
+    }
+    items = curator._parse_structured_items(json.dumps(data, ensure_ascii=False), stories)
+    assert [item.text for item in items] == ["ずんだもん: タイトルなし", "*発言なし*", "*不正な参照*"]
+    assert [len(item.sources) for item in items] == [1, 0, 0]
+    assert not any(item.is_impression for item in items)
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "ずんだもん: JSON ではないのだ [ref:1]\n---\n感想です",
+        '["ずんだもん: JSON ではないのだ [ref:1]", "感想です"]',
+        '{"items": [{"title": "閉じていない"',
+    ],
+)
+def test_parse_structured_items_falls_back_to_text(curator, text):
+    stories = [_story(0)]
+    items = curator._parse_structured_items(text, stories)
+    expected = curator._parse_x_news_items(text, stories)
+    assert [(i.text, i.sources, i.is_impression) for i in items] == [
+        (i.text, i.sources, i.is_impression) for i in expected
+    ]
+
+
+def test_parse_structured_items_falls_back_to_separator_format(curator):
+    stories = [_story(0)]
+    items = curator._parse_structured_items("ずんだもん: JSON ではないのだ [ref:1]\n---\n感想です", stories)
+    assert [item.text for item in items] == ["ずんだもん: JSON ではないのだ", "感想です"]
+    assert [source["uri"] for source in items[0].sources] == [stories[0].x_url]
+    assert items[1].is_impression
+
+
+def test_completed_json_items_from_partial_stream(curator):
+    stories = [_story(i) for i in range(3)]
+    text = json.dumps(STRUCTURED, ensure_ascii=False)
+    second = text.index('{"title": "規制の動き"')
+    assert curator._completed_json_items(text[: text.index('"items"')], stories) == []
+    assert curator._completed_json_items(text[: text.index("[", text.index('"items"')) + 1], stories) == []
+    # 2件目が閉じるまでは1件目だけを返す
+    partial = curator._completed_json_items(text[: second + 20], stories)
+    assert [item.text.splitlines()[0] for item in partial] == ["*AI チップの新製品*"]
+    complete = curator._completed_json_items(text[: text.index('"summary"')], stories)
+    assert [item.text.splitlines()[0] for item in complete] == ["*AI チップの新製品*", "*規制の動き*"]
+    assert [source["uri"] for source in complete[1].sources] == [stories[2].x_url]
+
+
+def _batch_requests() -> list[tuple[str, list[XNewsStory]]]:
+    return [(topic, [_story(i)]) for i, topic in enumerate(["alpha", "beta", "gamma"])]
+
+
+def test_text_batch_sections_out_of_order_and_missing(curator):
+    text = (
+        "前置き\n"
+        "=== トピック2 ===\nニュースB [ref:1]\n---\n感想B\n---\n"
+        "=== トピック1 ===\nニュースA [ref:1]\n---\n感想A\n"
+        "=== トピック1 ===\n重複したセクション\n"
+        "=== トピック9 ===\n範囲外のセクション\n"
+        "=== トピック3 ===\n"
+    )
+    requests = _batch_requests()
+    results = curator._handle_batch_response(SimpleNamespace(text=text), requests, "model")
+    assert [item.text for item in results[0]] == ["ニュースA", "感想A"]
+    assert [item.text for item in results[1]] == ["ニュースB", "感想B"]
+    # 見出しだけで本文のないトピックは単独で生成し直す
+    assert results[2] is None
+    assert results[1][0].sources == requests[1][1][0].sources
+    assert results[1][1].is_impression
+    assert all(item.model == "model" for items in results[:2] for item in items)
+
+
+def test_json_batch_sections_out_of_order_and_missing(curator, config):
+    config.structured_output = True
+    data = {
+        "topics": [
+            {"topic": 3, "items": [{"title": "ガンマ", "refs": [1]}], "summary": []},
+            {"topic": 1, "items": [{"title": "アルファ"}], "summary": [{"speaker": "東北きりたん", "text": "まとめ"}]},
+            {"topic": 2, "items": []},
+            {"topic": "1", "items": [{"title": "番号が文字列"}]},
+        ]
+    }
+    requests = _batch_requests()
+    response = SimpleNamespace(text=json.dumps(data, ensure_ascii=False))
+    results = curator._handle_batch_response(response, requests, "model")
+    assert [item.text for item in results[0]] == ["*アルファ*", f"{SUMMARY_HEADING}\n東北きりたん: まとめ"]
+    assert results[1] is None
+    assert [item.text for item in results[2]] == ["*ガンマ*"]
+    assert results[2][0].sources == requests[2][1][0].sources
+
+
+def test_json_batch_sections_malformed(curator, config):
+    config.structured_output = True
+    response = SimpleNamespace(text='{"topics": [{"topic": 1, "items": [')
+    assert curator._handle_batch_response(response, _batch_requests(), "model") == [None, None, None]
@@ -0,0 +1,145 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+from google.genai import errors
+
+from src.resilience import (
+    MIN_LATENCY_SAMPLES,
+    CallKind,
+    LatencyTracker,
+    ResilientCaller,
+    RetryPolicy,
+    is_retryable,
+    retry_after,
+)
+
+
+def _api_error(code: int, details: list[dict] | None = None) -> errors.APIError:
+    body = {"error": {"code": code, "message": "error", "status": "ERROR", "details": details or []}}
+    return errors.APIError(code, body)
+
+
+@pytest.mark.parametrize("code", [408, 429, 500, 502, 503, 504])
+def test_retryable_status(code):
+    assert is_retryable(_api_error(code))
+
+
+@pytest.mark.parametrize("code", [400, 401, 403, 404])
+def test_client_errors_are_not_retried(code):
+    assert not is_retryable(_api_error(code))
+
+
+def test_transport_errors():
+    assert is_retryable(httpx.ConnectError("refused"))
+    # タイムアウトは時間予算を使い切った結果なので再試行しない
+    assert not is_retryable(httpx.ReadTimeout("timed out"))
+    assert not is_retryable(ValueError("bad"))
+
+
+def test_retry_after_from_retry_info():
+    details = [{"@type": "type.googleapis.com/google.rpc.RetryInfo", "retryDelay": "7s"}]
+    assert retry_after(_api_error(429, details)) == 7.0
+    assert retry_after(_api_error(429)) is None
+
+
+def test_policy_delay_is_jittered_exponential_backoff():
+    policy = RetryPolicy(base_delay=1.0, max_delay=5.0)
+    error = _api_error(503)
+    for attempt, cap in [(1, 1.0), (2, 2.0), (3, 4.0), (4, 5.0), (10, 5.0)]:
+        for _ in range(20):
+            assert 0 <= policy.delay(attempt, error) <= cap
+
+
+def test_policy_delay_honours_retry_after():
+    details = [{"@type": "type.googleapis.com/google.rpc.RetryInfo", "retryDelay": "10s"}]
+    error = _api_error(429, details)
+    for _ in range(20):
+        assert 10.0 <= RetryPolicy(max_delay=1.0).delay(1, error) <= 12.0
+
+
+def test_latency_tracker_needs_min_samples():
+    tracker = LatencyTracker()
+    for _ in range(MIN_LATENCY_SAMPLES - 1):
+        tracker.record("model", 1.0)
+    assert tracker.percentile("model", 0.5) is None
+    tracker.record("model", 1.0)
+    assert tracker.percentile("model", 0.5) == 1.0
+
+
+def test_latency_tracker_percentile_and_window():
+    tracker = LatencyTracker(window=10)
+    for seconds in range(1, 21):
+        tracker.record("model", float(seconds))
+    # 直近10件（11〜20秒）のみが残る
+    assert tracker.percentile("model", 0.0) == 11.0
+    assert tracker.percentile("model", 0.5) == 15.0
+    assert tracker.percentile("model", 0.95) == 20.0
+
+
+def test_latency_tracker_separates_call_kinds():
+    tracker = LatencyTracker()
+    for _ in range(MIN_LATENCY_SAMPLES):
+        tracker.record("model", 1.0)
+        tracker.record("model", 50.0, CallKind.BATCHED)
+    assert tracker.percentile("model", 0.95) == 1.0
+    assert tracker.percentile("model", 0.95, CallKind.BATCHED) == 50.0
+    assert tracker.percentile("model", 0.95, CallKind.STREAM) is None
+    assert tracker.percentile("other", 0.95) is None
+
+
+def _hedging_caller() -> ResilientCaller:
+    tracker = LatencyTracker()
+    for _ in range(MIN_LATENCY_SAMPLES):
+        tracker.record("model", 0.01)
+    return ResilientCaller([("primary", "primary"), ("fallback", "fallback")], hedge_percentile=0.5, tracker=tracker)
+
+
+def test_sync_call_never_hedges():
+    caller = _hedging_caller()
+    used = []
+
+    def fn(client, primary):
+        used.append(client)
+        time.sleep(0.1)
+        return client
+
+    assert caller.call("model", fn) == "primary"
+    assert used == ["primary"]
+
+
+def test_async_call_hedges_and_cancels_the_loser():
+    caller = _hedging_caller()
+    cancelled = []
+
+    async def fn(client, primary):
+        if primary:
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.append(client)
+                raise
+        return client
+
+    async def run():
+        result = await caller.call_async("model", fn)
+        await asyncio.sleep(0)
+        return result
+
+    assert asyncio.run(run()) == "fallback"
+    assert cancelled == ["primary"]
+
+
+def test_call_retries_in_the_next_region():
+    caller = ResilientCaller([("primary", "primary"), ("fallback", "fallback")], policy=RetryPolicy(base_delay=0.01))
+    used = []
+
+    def fn(client, primary):
+        used.append(client)
+        if primary:
+            raise _api_error(503)
+        return client
+
+    assert caller.call("model", fn) == "fallback"
+    assert used == ["primary", "fallback"]
@@ -0,0 +1,77 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from src.story_ranking import prerank, score_story
+from src.x_news_client import XNewsStory
+
+NOW = datetime(2025, 1, 1, 12, 0, tzinfo=timezone.utc)
+
+
+def _story(tweet_id: str, text: str, likes: int = 0, urls: list[str] | None = None, hours_ago: float | None = None):
+    created_at = "" if hours_ago is None else (NOW - timedelta(hours=hours_ago)).isoformat()
+    return XNewsStory(tweet_id, text, urls or [], like_count=likes, created_at=created_at)
+
+
+@pytest.fixture
+def stories():
+    return {
+        # 反応数最大・2語一致・投稿直後・リンクあり: 1.0
+        "winner": _story("1", "AI compiler written in Rust", likes=100, urls=["https://example.com/a"], hours_ago=0),
+        # 反応数 1/4・1語一致・投稿日時不明・リンクあり: 0.2 + 0.15 + 0.1 + 0.1
+        "candidate": _story("2", "New AI model", likes=25, urls=["https://example.com/b"]),
+        # 反応なし・一致なし・48時間前・リンクなし
+        "loser": _story("3", "lunch photo", hours_ago=48),
+    }
+
+
+def test_score_story(stories):
+    terms = ["ai", "rust"]
+    assert score_story(stories["winner"], terms, 100, NOW) == pytest.approx(1.0)
+    assert score_story(stories["candidate"], terms, 100, NOW) == pytest.approx(0.55)
+    assert score_story(stories["loser"], terms, 100, NOW) == pytest.approx(0.2 * 0.5**4)
+
+
+def test_score_story_keyword_needs_whole_words():
+    story = _story("1", "He said the trust fund grew")
+    assert score_story(story, ["ai", "rust"], 0, NOW) == pytest.approx(0.1)
+
+
+def test_score_story_reposts_count_double():
+    reposted = XNewsStory("1", "", [], like_count=0, retweet_count=50, created_at=NOW.isoformat())
+    liked = XNewsStory("2", "", [], like_count=100, created_at=NOW.isoformat())
+    assert score_story(reposted, [], 100, NOW) == pytest.approx(score_story(liked, [], 100, NOW))
+
+
+def test_prerank_splits_stories(stories):
+    ranking = prerank(list(stories.values()), "AI Rust", max_candidates=10, max_winners=5, now=NOW)
+    assert ranking.winners == [stories["winner"]]
+    assert ranking.candidates == [stories["candidate"]]
+    assert ranking.dropped == [stories["loser"]]
+    assert ranking.ranked == [stories["winner"], stories["candidate"]]
+
+
+def test_prerank_caps_winners(stories):
+    ranking = prerank(list(stories.values()), "AI Rust", max_candidates=10, max_winners=0, now=NOW)
+    assert ranking.winners == []
+    assert ranking.candidates == [stories["winner"], stories["candidate"]]
+
+
+def test_prerank_caps_candidates_including_winners(stories):
+    ranking = prerank(list(stories.values()), "AI Rust", max_candidates=1, max_winners=5, now=NOW)
+    assert ranking.winners == [stories["winner"]]
+    assert ranking.candidates == []
+    assert ranking.dropped == [stories["candidate"], stories["loser"]]
+
+
+def test_prerank_keeps_top_stories_when_all_score_low():
+    low = [_story(str(i), "nothing relevant", hours_ago=48 + i) for i in range(5)]
+    ranking = prerank(low, "AI", max_candidates=3, max_winners=5, now=NOW)
+    assert ranking.winners == []
+    assert ranking.candidates == low[:3]
+    assert ranking.dropped == low[3:]
+
+
+def test_prerank_empty():
+    ranking = prerank([], "AI", max_candidates=3, max_winners=5, now=NOW)
+    assert ranking.ranked == [] and ranking.dropped == []
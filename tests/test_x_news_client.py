@@ -0,0 +1,52 @@
+import pytest
+
+from src.x_news_client import XNewsStory, exclude_posted, normalize_url, status_id
+
+
+@pytest.mark.parametrize(
+    ("url", "expected"),
+    [
+        ("https://www.example.com/news/1/", "example.com/news/1"),
+        ("http://Example.com/news/1#comments", "example.com/news/1"),
+        ("https://example.com/a?utm_source=x&utm_medium=social&id=3", "example.com/a?id=3"),
+        ("https://example.com/a?fbclid=abc&gclid=def&ref_src=twsrc", "example.com/a"),
+        # s / t / ref は x.com / twitter.com 以外では意味を持つことがあるため残す
+        ("https://example.com/search?s=python&t=10&ref=main", "example.com/search?s=python&t=10&ref=main"),
+        ("https://x.com/user/status/123?s=20&t=abc&ref=share", "x.com/user/status/123"),
+        ("https://twitter.com/user/status/123?s=46", "twitter.com/user/status/123"),
+        ("  https://example.com/a  ", "example.com/a"),
+    ],
+)
+def test_normalize_url(url, expected):
+    assert normalize_url(url) == expected
+
+
+def test_normalize_url_treats_variants_as_equal():
+    assert normalize_url("https://www.example.com/a/?utm_campaign=x") == normalize_url("http://example.com/a")
+
+
+@pytest.mark.parametrize(
+    ("url", "expected"),
+    [
+        ("https://x.com/user/status/123", "123"),
+        ("https://twitter.com/user/status/456?s=20", "456"),
+        ("https://mobile.twitter.com/user/status/789", "789"),
+        ("https://x.com/i/web/status/42", "42"),
+        ("https://x.com/user", None),
+        ("https://example.com/user/status/123", None),
+    ],
+)
+def test_status_id(url, expected):
+    assert status_id(url) == expected
+
+
+def test_exclude_posted():
+    by_tweet = XNewsStory("100", "posted tweet", ["https://example.com/new"])
+    by_link = XNewsStory("200", "posted article", ["https://www.example.com/old/?utm_source=x"])
+    fresh = XNewsStory("300", "fresh", ["https://example.com/fresh"])
+    posted = ["https://x.com/someone/status/100?s=20", "https://example.com/old"]
+
+    kept, skipped_tweets, skipped_links = exclude_posted([by_tweet, by_link, fresh], posted)
+
+    assert kept == [fresh]
+    assert (skipped_tweets, skipped_links) == (1, 1)
@@ -0,0 +1,72 @@
+import pytest
+
+from src.x_query_planner import (
+    QUERY_WRAPPER_LENGTH,
+    compile_query,
+    contains_term,
+    plan_queries,
+    query_terms,
+)
+
+
+@pytest.mark.parametrize(
+    ("text", "term", "expected"),
+    [
+        ("new ai model", "ai", True),
+        ("he said so", "ai", False),
+        ("openai.com", "ai", False),
+        ("#ai news", "ai", True),
+        ("ai-powered search", "ai", True),
+        ("aiの進化", "ai", True),
+        ("c++ rocks", "c++", True),
+        ("gpt-5 released", "gpt-5", True),
+        ("gpt-50 released", "gpt-5", False),
+        # 日本語は語の境界がないため部分一致
+        ("生成aiの話題", "生成ai", True),
+        ("量子コンピュータ", "コンピュータ", True),
+    ],
+)
+def test_contains_term(text, term, expected):
+    assert contains_term(text, term) is expected
+
+
+def test_compile_query_boolean_syntax():
+    matcher = compile_query('("machine learning" OR AI) -crypto')
+    assert matcher("new ai model released")
+    assert matcher("advances in machine learning")
+    assert not matcher("ai crypto coin")
+    assert not matcher("he said machine")
+
+
+def test_compile_query_implicit_and():
+    matcher = compile_query("Rust compiler")
+    assert matcher("the rust compiler got faster")
+    assert not matcher("rust belt")
+
+
+def test_compile_query_group_negation():
+    matcher = compile_query("python -(snake OR zoo)")
+    assert matcher("python 3.14 released")
+    assert not matcher("python snake at the zoo")
+
+
+@pytest.mark.parametrize("query", ["lang:ja AI", "from:user news", "(AI", "AI OR", ""])
+def test_compile_query_rejects_unsupported(query):
+    assert compile_query(query) is None
+
+
+def test_query_terms():
+    assert query_terms('("Machine Learning" OR AI) -crypto lang:en AI') == ["machine learning", "ai"]
+
+
+def test_plan_queries_packs_and_isolates():
+    groups = plan_queries(["AI", "Rust", "lang:ja ニュース", "AI"])
+    assert [g.queries for g in groups] == [["lang:ja ニュース"], ["AI", "Rust"]]
+    assert groups[1].combined_query == "(AI) OR (Rust)"
+
+
+def test_plan_queries_respects_length_limit():
+    queries = ["alpha beta", "gamma delta", "epsilon zeta"]
+    max_length = len("(alpha beta) OR (gamma delta)") + QUERY_WRAPPER_LENGTH
+    groups = plan_queries(queries, max_length=max_length)
+    assert [g.queries for g in groups] == [["alpha beta", "gamma delta"], ["epsilon zeta"]]